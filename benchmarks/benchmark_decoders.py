@@ -0,0 +1,54 @@
+"""
+Compares raw JSON decoding paths on JSON array and NDJSON payloads: the previous
+pd.read_json + pd.json_normalize path and each RawDecoder.
+
+    python -m benchmarks.benchmark_decoders --rows 1000000
+"""
+import argparse
+import io
+import time
+import orjson
+import pandas as pd
+
+from benchmarks.synthetic import make_raw_records
+from src.etl_pipeline.decoders import RawDecoder, decode_records
+
+
+def previous_path(payload: bytes) -> pd.DataFrame:
+    # TransformData before pluggable decoders: JSON arrays only, metadata flattened by json_normalize
+    df = pd.read_json(io.BytesIO(payload), lines=False)
+    metadata_df = pd.json_normalize(df["metadata"])
+    return df.drop(columns=["metadata"]).join(metadata_df)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    records = make_raw_records(args.rows)
+    payloads = {
+        "array": orjson.dumps(records),
+        "ndjson": b"\n".join(orjson.dumps(record) for record in records),
+    }
+    del records
+
+    print(f"{'decoder':<26}{'layout':<8}{'MiB':>8}{'seconds':>10}{'rows/s':>14}")
+    for layout, payload in payloads.items():
+        candidates = {f"{d.value}": (lambda p, d=d: decode_records(p, d)) for d in RawDecoder}
+        if layout == "array":
+            candidates = {"read_json+json_normalize": previous_path, **candidates}
+        for name, decode in candidates.items():
+            df, seconds = timed(decode, payload)
+            assert len(df) == args.rows and "location" in df.columns
+            print(f"{name:<26}{layout:<8}{len(payload) / 2**20:>8.1f}{seconds:>10.2f}{args.rows / seconds:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares size and encode/decode speed of the processed-zone formats.
+
+    python -m benchmarks.benchmark_formats --rows 1000000
+"""
+import argparse
+import io
+import time
+import pandas as pd
+import pyarrow.parquet as pq
+
+from benchmarks.synthetic import make_processed_batch
+from src.etl_pipeline.utils import to_processed_arrow
+
+
+def encode_json(df: pd.DataFrame, indent) -> bytes:
+    # Mirrors TransformData: timestamps are written as ISO 8601 strings
+    return df.to_json(orient="records", lines=False, indent=indent, date_format="iso", date_unit="s").encode("utf-8")
+
+
+def decode_json(payload: bytes) -> pd.DataFrame:
+    # Mirrors LoadData: parse the array, then the timestamp strings
+    df = pd.read_json(io.BytesIO(payload), lines=False, convert_dates=False)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601", utc=True, errors="coerce")
+    return df
+
+
+def encode_parquet(df: pd.DataFrame, compression: str) -> bytes:
+    buffer = io.BytesIO()
+    pq.write_table(to_processed_arrow(df), buffer, compression=compression)
+    return buffer.getvalue()
+
+
+def decode_parquet(payload: bytes) -> pd.DataFrame:
+    return pd.read_parquet(io.BytesIO(payload))
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_processed_batch(args.rows)
+    candidates = {
+        "json (indent=2)": (lambda d: encode_json(d, 2), decode_json),
+        "json (compact)": (lambda d: encode_json(d, None), decode_json),
+        "parquet (snappy)": (lambda d: encode_parquet(d, "snappy"), decode_parquet),
+        "parquet (zstd)": (lambda d: encode_parquet(d, "zstd"), decode_parquet),
+    }
+
+    print(f"{'format':<20}{'MiB':>10}{'bytes/row':>12}{'write s':>10}{'read s':>10}")
+    for name, (encode, decode) in candidates.items():
+        payload, write_seconds = timed(encode, df)
+        _, read_seconds = timed(decode, payload)
+        print(f"{name:<20}{len(payload) / 2**20:>10.1f}{len(payload) / len(df):>12.1f}"
+              f"{write_seconds:>10.2f}{read_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
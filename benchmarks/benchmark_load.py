@@ -0,0 +1,58 @@
+"""
+Compares rows/second of the per-row ORM loader against the COPY-based bulk loader.
+
+Requires a reachable PostgreSQL configured through the usual POSTGRES_* variables:
+
+    python -m benchmarks.benchmark_load --rows 20000
+"""
+import argparse
+import os
+import time
+
+# The loader only needs MinIO settings to build its client; no S3 call is made here.
+for key, default in {
+    "MINIO_ENDPOINT": "http://localhost:9000",
+    "MINIO_ACCESS_KEY": "minioadmin",
+    "MINIO_SECRET_KEY": "minioadmin",
+    "MINIO_BUCKET": "user-actions",
+    "RAW_LOCAL_FILE": "src/data/raw_logs.json",
+}.items():
+    os.environ.setdefault(key, default)
+
+from sqlalchemy import text
+from src.database.manager import init_db
+from src.database.models.base import get_engine
+from src.etl_pipeline.tasks.load_data import LoadData, LoadMode
+from benchmarks.synthetic import make_processed_batch
+
+
+def reset_tables():
+    with get_engine().begin() as connection:
+        connection.execute(text("TRUNCATE fact_user_actions, dim_users, dim_actions RESTART IDENTITY CASCADE"))
+
+
+def time_mode(mode: LoadMode, batch) -> float:
+    reset_tables()
+    loader = LoadData(mode=mode)
+    started = time.perf_counter()
+    loader.load_dataframe(batch)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--modes", nargs="+", default=[m.value for m in LoadMode])
+    args = parser.parse_args()
+
+    init_db()
+    batch = make_processed_batch(args.rows)
+    print(f"{'mode':<8}{'rows':>10}{'seconds':>12}{'rows/s':>14}")
+    for mode in map(LoadMode, args.modes):
+        elapsed = time_mode(mode, batch)
+        print(f"{mode.value:<8}{len(batch):>10}{elapsed:>12.2f}{len(batch) / elapsed:>14,.0f}")
+    reset_tables()
+
+
+if __name__ == "__main__":
+    main()
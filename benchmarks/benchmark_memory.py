@@ -0,0 +1,56 @@
+"""
+Compares the memory footprint of a processed day held as Python object strings with the compact
+dtypes the transform now emits (categorical action_type/device/location, Arrow-backed user_id),
+and times the steps that scan those columns: quality checks, dedup hashing and Parquet conversion.
+
+    python -m benchmarks.benchmark_memory --rows 1000000
+"""
+import argparse
+import time
+import pandas as pd
+
+from benchmarks.synthetic import make_raw_records
+from src.etl_pipeline.decoders import flatten_metadata
+from src.etl_pipeline.dedup import event_key_hashes
+from src.etl_pipeline.tasks.quality_checks import run_data_quality_checks
+from src.etl_pipeline.timestamps import normalize_timestamps
+from src.etl_pipeline.utils import compact_dtypes, to_processed_arrow
+
+COLUMNS = ["user_id", "action_type", "timestamp", "device", "location"]
+
+
+def processed_objects(rows: int, users: int) -> pd.DataFrame:
+    """A transformed day with every string column left as Python objects, as before."""
+    df = flatten_metadata(pd.DataFrame.from_records(make_raw_records(rows, users)))
+    timestamps, _ = normalize_timestamps(df["timestamp"])
+    return df.assign(timestamp=timestamps.dt.floor("s"))[COLUMNS]
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    args = parser.parse_args()
+
+    objects = processed_objects(args.rows, args.users)
+    frames = {"object": objects, "compact": compact_dtypes(objects)}
+
+    print(f"{'dtypes':<10}" + "".join(f"{column:>13}" for column in COLUMNS) + f"{'bytes/row':>12}"
+          f"{'quality s':>11}{'hashing s':>11}{'arrow s':>9}")
+    for name, df in frames.items():
+        per_column = df.memory_usage(deep=True, index=False) / len(df)
+        print(f"{name:<10}" + "".join(f"{per_column[column]:>13.1f}" for column in COLUMNS)
+              + f"{per_column.sum():>12.1f}"
+              f"{timed(lambda: run_data_quality_checks(df)):>11.2f}"
+              f"{timed(lambda: event_key_hashes(df)):>11.2f}"
+              f"{timed(lambda: to_processed_arrow(df)):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
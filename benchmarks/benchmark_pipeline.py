@@ -0,0 +1,144 @@
+"""
+End-to-end benchmark: generates synthetic raw logs, runs every pipeline stage on them and reports
+rows/second and peak RSS per stage.
+
+S3 is a local moto server unless MINIO_ENDPOINT is set. The load stage needs the PostgreSQL
+configured through the usual POSTGRES_* variables and, like benchmark_load, truncates the pipeline
+tables first; --skip-load runs without a database. Loader settings (LOAD_MODE, RAW_DECODER,
+PROCESSED_FORMAT, ...) are read from the environment as in the pipeline.
+
+    python -m benchmarks.benchmark_pipeline --rows 1000000 --null-rate 0.01 --duplicate-rate 0.01 \\
+        --bad-timestamp-rate 0.01
+"""
+import argparse
+import os
+import socket
+import tempfile
+import time
+
+# Bucket and source file for the run; MINIO_ENDPOINT and credentials are filled in for moto below.
+for key, default in {
+    "MINIO_BUCKET": "benchmark",
+    "RAW_LOCAL_FILE": "",
+}.items():
+    os.environ.setdefault(key, default)
+
+from sqlalchemy import text
+from src.config import pipeline_config
+from src.etl_pipeline.metrics import PeakRSS
+from src.etl_pipeline.tasks.ingest_data import IngestData
+from src.etl_pipeline.tasks.transform_data import TransformData
+from src.etl_pipeline.tasks.load_data import LoadData
+from src.etl_pipeline.tasks.quality_checks import run_data_quality_checks
+from benchmarks.synthetic import write_raw_logs
+
+PIPELINE_TABLES = "rollup_daily_actions, rollup_daily_users, fact_user_actions, dim_users, dim_actions"
+
+
+def run_stage(name: str, rows_in: int, fn, rows_out=len) -> tuple:
+    """Runs one stage, returning its result and a report row."""
+    with PeakRSS() as memory:
+        started = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - started
+    return result, {
+        "stage": name,
+        "rows_in": rows_in,
+        "rows_out": rows_out(result),
+        "seconds": seconds,
+        "rows_per_second": rows_in / seconds if seconds else float("inf"),
+        "peak_rss_mib": memory.peak / 2**20,
+    }
+
+
+def start_moto():
+    """Starts an in-process moto S3 server on a free port and points the MinIO settings at it."""
+    from moto.server import ThreadedMotoServer
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    os.environ.update(MINIO_ENDPOINT=f"http://127.0.0.1:{port}", MINIO_ACCESS_KEY="benchmark",
+                      MINIO_SECRET_KEY="benchmark", AWS_DEFAULT_REGION="us-east-1")
+    return server
+
+
+def reset_tables():
+    from src.database.manager import init_db
+    from src.database.models.base import get_engine
+
+    init_db()
+    with get_engine().begin() as connection:
+        connection.execute(text(f"TRUNCATE {PIPELINE_TABLES} RESTART IDENTITY CASCADE"))
+
+
+def run(args, workdir: str) -> list:
+    raw_path = os.path.join(workdir, "raw.ndjson" if args.layout == "ndjson" else "raw.json")
+    os.environ["RAW_LOCAL_FILE"] = raw_path
+    rates = {"null_rate": args.null_rate, "duplicate_rate": args.duplicate_rate,
+             "bad_timestamp_rate": args.bad_timestamp_rate}
+
+    reports = []
+    size, report = run_stage("generate", args.rows,
+                             lambda: write_raw_logs(raw_path, args.rows, args.layout, users=args.users, **rates),
+                             rows_out=lambda size: args.rows)
+    reports.append(report)
+
+    manifest, report = run_stage("ingest", args.rows, lambda: IngestData(args.ds).ingest_raw_data(),
+                                 rows_out=lambda manifest: args.rows)
+    reports.append(report)
+    raw_keys = [part["key"] for part in manifest["parts"]]
+
+    transformer = TransformData(raw_keys=raw_keys, logical_date=args.ds)
+    df, report = run_stage("transform", args.rows, transformer.transform)
+    reports.append(report)
+
+    _, report = run_stage("save", len(df), lambda: transformer.save_processed(df), rows_out=lambda _: len(df))
+    reports.append(report)
+
+    _, report = run_stage("quality", len(df), lambda: run_data_quality_checks(df),
+                          rows_out=lambda result: len(result[0]))
+    reports.append(report)
+
+    if not args.skip_load:
+        reset_tables()
+        loader = LoadData(processed_keys=[transformer.processed_key], logical_date=args.ds)
+        # Includes reading the processed object back and LoadData's own quality pass
+        _, report = run_stage("load", len(df), loader.load, rows_out=lambda summary: summary["rows"])
+        reports.append(report)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--layout", choices=["ndjson", "array"], default="ndjson")
+    parser.add_argument("--null-rate", type=float, default=0.0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--bad-timestamp-rate", type=float, default=0.0)
+    parser.add_argument("--ds", default="2025-07-15", help="logical date the run writes under")
+    parser.add_argument("--skip-load", action="store_true", help="stop before the PostgreSQL load")
+    args = parser.parse_args()
+
+    server = start_moto() if not os.getenv("MINIO_ENDPOINT") else None
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            reports = run(args, workdir)
+    finally:
+        if server is not None:
+            server.stop()
+
+    pipeline = pipeline_config()
+    print(f"decoder={pipeline['RAW_DECODER']} format={pipeline['PROCESSED_FORMAT']} load={pipeline['LOAD_MODE']} "
+          f"s3={'moto' if server is not None else os.environ['MINIO_ENDPOINT']}")
+    print(f"{'stage':<10}{'rows in':>12}{'rows out':>12}{'seconds':>10}{'rows/s':>14}{'peak RSS MiB':>14}")
+    for r in reports:
+        print(f"{r['stage']:<10}{r['rows_in']:>12,}{r['rows_out']:>12,}{r['seconds']:>10.2f}"
+              f"{r['rows_per_second']:>14,.0f}{r['peak_rss_mib']:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Synthetic data shared by the benchmarks."""
+import numpy as np
+import pandas as pd
+
+ACTION_TYPES = ["login", "logout", "click", "view", "purchase", "scroll"]
+DEVICES = ["iOS", "Android", "Web"]
+LOCATIONS = ["Berlin", "Munich", "Hamburg", "New York"]
+
+
+def make_processed_batch(rows: int, users: int = 5000, seed: int = 42) -> pd.DataFrame:
+    """Builds a DataFrame shaped like the transform output, with a realistic spread of users and actions."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2025-07-15", tz="UTC")
+    return pd.DataFrame({
+        "user_id": [f"user_{i}" for i in rng.integers(0, users, rows)],
+        "action_type": rng.choice(ACTION_TYPES, rows),
+        "timestamp": start + pd.to_timedelta(rng.integers(0, 86_400, rows), unit="s"),
+        "device": rng.choice(DEVICES, rows),
+        "location": rng.choice(LOCATIONS, rows),
+    })
+
+
+def make_raw_timestamps(rows: int, seed: int = 42) -> pd.Series:
+    """
+    Builds a raw timestamp column mixing the formats producers send: ISO 8601 with and without
+    offsets, epoch seconds and milliseconds (as numbers and strings) and RFC 2822.
+    """
+    rng = np.random.default_rng(seed)
+    instants = pd.Timestamp("2025-07-15", tz="UTC") + pd.to_timedelta(rng.integers(0, 86_400, rows), unit="s")
+    epoch = instants.astype("int64") // 10**9
+    renderers = [
+        lambda i: instants[i].strftime("%Y-%m-%dT%H:%M:%SZ"),
+        lambda i: instants[i].tz_convert("Europe/Berlin").strftime("%Y-%m-%dT%H:%M:%S%z"),
+        lambda i: int(epoch[i]),
+        lambda i: str(epoch[i] * 1000),
+        lambda i: instants[i].strftime("%a, %d %b %Y %H:%M:%S +0000"),
+    ]
+    choices = rng.integers(0, len(renderers), rows)
+    return pd.Series([renderers[c](i) for i, c in enumerate(choices)], dtype=object)
+
+
+BAD_TIMESTAMPS = ["not-a-timestamp", "2025-13-45T99:00:00Z", "", "yesterday"]
+NULLABLE_FIELDS = ["user_id", "action_type", "timestamp", "location"]
+
+
+def make_raw_records(rows: int, users: int = 5000, seed: int = 42, null_rate: float = 0.0,
+                     duplicate_rate: float = 0.0, bad_timestamp_rate: float = 0.0) -> list:
+    """
+    Builds raw log records as ingest receives them, with nested metadata.
+
+    The rates inject the defects the pipeline has to handle: a null in one of user_id, action_type,
+    timestamp or metadata.location; an exact copy of another record; an unparseable timestamp.
+    With all rates at 0 the records are the same as without them.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2025-07-15", tz="UTC")
+    timestamps = (start + pd.to_timedelta(rng.integers(0, 86_400, rows), unit="s")).strftime("%Y-%m-%dT%H:%M:%SZ")
+    user_ids = rng.integers(0, users, rows)
+    actions = rng.choice(ACTION_TYPES, rows)
+    devices = rng.choice(DEVICES, rows)
+    locations = rng.choice(LOCATIONS, rows)
+    records = [
+        {
+            "user_id": f"user_{user_ids[i]}",
+            "action_type": str(actions[i]),
+            "timestamp": timestamps[i],
+            "metadata": {"device": str(devices[i]), "location": str(locations[i])},
+        }
+        for i in range(rows)
+    ]
+
+    # Defects come from their own generator so the clean records do not depend on the rates
+    defects = np.random.default_rng(seed + 1)
+    for i in np.flatnonzero(defects.random(rows) < bad_timestamp_rate):
+        records[i]["timestamp"] = BAD_TIMESTAMPS[i % len(BAD_TIMESTAMPS)]
+    null_rows = np.flatnonzero(defects.random(rows) < null_rate)
+    for i, field in zip(null_rows, defects.choice(NULLABLE_FIELDS, len(null_rows))):
+        if field == "location":
+            records[i]["metadata"]["location"] = None
+        else:
+            records[i][field] = None
+    duplicate_rows = np.flatnonzero(defects.random(rows) < duplicate_rate)
+    for i, source in zip(duplicate_rows, defects.integers(0, rows, len(duplicate_rows))):
+        records[i] = {**records[source], "metadata": dict(records[source]["metadata"])}
+    return records
+
+
+def write_raw_logs(path: str, rows: int, layout: str = "ndjson", chunk_size: int = 100_000, **options) -> int:
+    """
+    Writes `rows` synthetic raw records to a JSON array or NDJSON file, generating them chunk by
+    chunk so that 10M records never sit in memory at once. `options` go to make_raw_records.
+    Returns the file size in bytes.
+    """
+    import orjson
+
+    seed = options.pop("seed", 42)
+    with open(path, "wb") as out:
+        if layout == "array":
+            out.write(b"[")
+        for n, offset in enumerate(range(0, rows, chunk_size)):
+            records = make_raw_records(min(chunk_size, rows - offset), seed=seed + 2 * n, **options)
+            lines = [orjson.dumps(record) for record in records]
+            if layout == "array":
+                out.write((b"," if offset else b"") + b",\n".join(lines))
+            else:
+                out.write(b"\n".join(lines) + b"\n")
+        if layout == "array":
+            out.write(b"]")
+        return out.tell()
@@ -18,12 +18,79 @@ def load_config():
     return config
 
 def database_config():
-    user = load_env_var("POSTGRES_USER")
-    password = load_env_var("POSTGRES_PASSWORD")
-    host = load_env_var("POSTGRES_HOST")
+    """
+    PostgreSQL URI from the POSTGRES_* variables. Called when the engine is first needed, not at import;
+    a missing variable raises instead of exiting so the calling task fails with a clear error.
+    """
+    keys = ["POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_DB"]
+    missing = [key for key in keys if not os.getenv(key)]
+    if missing:
+        logger.error(f"Missing required environment variable(s): {', '.join(missing)}")
+        raise RuntimeError(f"Missing required environment variable(s): {', '.join(missing)}")
+    user, password, host, db = (os.getenv(key) for key in keys)
     port = os.getenv("POSTGRES_PORT", "5432")
-    db = load_env_var("POSTGRES_DB")
     uri=f"postgresql://{user}:{password}@{host}:{port}/{db}"
 
     logger.info("Constructed database config successfully")
     return uri
+
+def pipeline_config():
+    """Optional pipeline tuning settings. Unlike load_config, every key has a default."""
+    config = {
+        "INCREMENTAL": os.getenv("INCREMENTAL", "false").lower() == "true",
+        "SKIP_UNCHANGED": os.getenv("SKIP_UNCHANGED", "true").lower() == "true",
+        "LOAD_MODE": os.getenv("LOAD_MODE", "orm"),
+        "LOAD_SHARDS": int(os.getenv("LOAD_SHARDS", "4")),
+        "LOAD_SHARD_TASKS": os.getenv("LOAD_SHARD_TASKS", "false").lower() == "true",
+        "DIM_CACHE_MAX_SIZE": int(os.getenv("DIM_CACHE_MAX_SIZE", "100000")),
+        "DIM_CACHE_PRELOAD_ACTIONS": os.getenv("DIM_CACHE_PRELOAD_ACTIONS", "true").lower() == "true",
+        "TRANSFORM_MODE": os.getenv("TRANSFORM_MODE", "batch"),
+        "TRANSFORM_CHUNK_SIZE": int(os.getenv("TRANSFORM_CHUNK_SIZE", "50000")),
+        "TRANSFORM_WORKERS": int(os.getenv("TRANSFORM_WORKERS", str(os.cpu_count() or 1))),
+        "RAW_DECODER": os.getenv("RAW_DECODER", "orjson"),
+        "PROCESSED_FORMAT": os.getenv("PROCESSED_FORMAT", "json"),
+        "PARQUET_COMPRESSION": os.getenv("PARQUET_COMPRESSION", "snappy"),
+        "S3_MULTIPART_THRESHOLD": int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024))),
+        "S3_MULTIPART_CHUNK_SIZE": int(os.getenv("S3_MULTIPART_CHUNK_SIZE", str(8 * 1024 * 1024))),
+        "S3_MAX_CONCURRENCY": int(os.getenv("S3_MAX_CONCURRENCY", "10")),
+        "S3_OBJECT_CONCURRENCY": int(os.getenv("S3_OBJECT_CONCURRENCY", "8")),
+        "INGEST_PART_MAX_BYTES": int(os.getenv("INGEST_PART_MAX_BYTES", "0")),
+        "INGEST_UPLOAD_WORKERS": int(os.getenv("INGEST_UPLOAD_WORKERS", "4")),
+        "DQ_ALLOWED_ACTION_TYPES": [v.strip() for v in os.getenv("DQ_ALLOWED_ACTION_TYPES", "").split(",") if v.strip()],
+        "DQ_MIN_TIMESTAMP": os.getenv("DQ_MIN_TIMESTAMP", "2000-01-01"),
+        "DQ_MAX_FUTURE_SECONDS": int(os.getenv("DQ_MAX_FUTURE_SECONDS", "86400")),
+        "DQ_UNIQUE_KEY": [v.strip() for v in os.getenv("DQ_UNIQUE_KEY", "user_id,action_type,timestamp").split(",")],
+        "DQ_QUARANTINE": os.getenv("DQ_QUARANTINE", "true").lower() == "true",
+        "DEDUP_INDEX": os.getenv("DEDUP_INDEX", "off"),
+        "DEDUP_FALSE_POSITIVE_RATE": float(os.getenv("DEDUP_FALSE_POSITIVE_RATE", "0.001")),
+        "DEDUP_INITIAL_CAPACITY": int(os.getenv("DEDUP_INITIAL_CAPACITY", "1000000")),
+        "ROLLUPS": os.getenv("ROLLUPS", "true").lower() == "true",
+        "ROLLUP_HLL_PRECISION": int(os.getenv("ROLLUP_HLL_PRECISION", "14")),
+        "FACT_PARTITION_INTERVAL": os.getenv("FACT_PARTITION_INTERVAL", "month"),
+        "FACT_PARTITIONS_AHEAD": int(os.getenv("FACT_PARTITIONS_AHEAD", "1")),
+        "FACT_RETENTION_PERIODS": int(os.getenv("FACT_RETENTION_PERIODS", "0")),
+        "FACT_RETENTION_DROP": os.getenv("FACT_RETENTION_DROP", "false").lower() == "true",
+        "DB_POOL_SIZE": int(os.getenv("DB_POOL_SIZE", "5")),
+        "DB_MAX_OVERFLOW": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        "DB_POOL_TIMEOUT": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "DB_POOL_RECYCLE": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "DB_POOL_PRE_PING": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "DB_STATEMENT_TIMEOUT_MS": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),
+        "DB_EXECUTEMANY_MODE": os.getenv("DB_EXECUTEMANY_MODE", "values_plus_batch"),
+        "DB_EXECUTEMANY_PAGE_SIZE": int(os.getenv("DB_EXECUTEMANY_PAGE_SIZE", "1000")),
+        "DB_PGBOUNCER": os.getenv("DB_PGBOUNCER", "false").lower() == "true",
+        "BACKFILL_MAX_PARALLEL_DAYS": int(os.getenv("BACKFILL_MAX_PARALLEL_DAYS", "2")),
+        "METRICS_STATSD_HOST": os.getenv("METRICS_STATSD_HOST", ""),
+        "METRICS_STATSD_PORT": int(os.getenv("METRICS_STATSD_PORT", "8125")),
+        "METRICS_TEXTFILE_DIR": os.getenv("METRICS_TEXTFILE_DIR", ""),
+        "METRICS_PREFIX": os.getenv("METRICS_PREFIX", "etl"),
+        "LOAD_LOG_EVERY_ROWS": int(os.getenv("LOAD_LOG_EVERY_ROWS", "10000")),
+        "LOAD_INSERT_PAGE_ROWS": int(os.getenv("LOAD_INSERT_PAGE_ROWS", "10000")),
+        "STREAM_PREFIX": os.getenv("STREAM_PREFIX", "raw/"),
+        "STREAM_POLL_SECONDS": float(os.getenv("STREAM_POLL_SECONDS", "5")),
+        "STREAM_MAX_RECORDS": int(os.getenv("STREAM_MAX_RECORDS", "10000")),
+        "STREAM_MAX_SECONDS": float(os.getenv("STREAM_MAX_SECONDS", "30")),
+        "STREAM_QUEUE_SIZE": int(os.getenv("STREAM_QUEUE_SIZE", "8")),
+    }
+    logger.debug(f"Loaded pipeline config: {config}")
+    return config
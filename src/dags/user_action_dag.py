@@ -1,10 +1,53 @@
 from datetime import timedelta
 from airflow import DAG
+from airflow.models.baseoperator import chain
 from airflow.operators.python import PythonOperator
 from airflow.utils.dates import days_ago
 
-from src.etl_pipeline.jobs import user_action_log_job
-from src.database.manager import init_db
+from src.config import pipeline_config
+
+# The scheduler re-parses this file constantly. The ETL modules pull in pandas, pyarrow, boto3 and
+# the database layer, so they are imported inside the task callables, when a task actually runs.
+# Each ETL callable returns its stage's metrics record, which PythonOperator pushes to XCom.
+
+def init_db():
+    from src.database.manager import init_db as _init_db
+    _init_db()
+
+def _force(params) -> bool:
+    # Trigger with {"force": true} to re-run ingest and transform even when their inputs are unchanged
+    return bool((params or {}).get("force"))
+
+def run_ingest(ds=None, params=None):
+    from src.etl_pipeline.jobs import user_action_log_job
+    return user_action_log_job.run_ingest(ds=ds, force=_force(params))
+
+def run_transform(ds=None, params=None):
+    from src.etl_pipeline.jobs import user_action_log_job
+    return user_action_log_job.run_transform(ds=ds, force=_force(params))
+
+def run_load(ds=None):
+    from src.etl_pipeline.jobs import user_action_log_job
+    return user_action_log_job.run_load(ds=ds)
+
+def prepare_load_shards(ds=None):
+    from src.etl_pipeline.jobs import user_action_log_job
+    return user_action_log_job.prepare_load_shards(ds=ds, shards=LOAD_SHARDS)
+
+def run_load_shard(shard, ds=None, ti=None):
+    from src.etl_pipeline.jobs import user_action_log_job
+    plan = ti.xcom_pull(task_ids="prepare_load")
+    return user_action_log_job.run_load_shard(shard, plan, ds=ds)
+
+def finish_load_shards(ds=None, ti=None):
+    from src.etl_pipeline.jobs import user_action_log_job
+    plan = ti.xcom_pull(task_ids="prepare_load")
+    return user_action_log_job.finish_load_shards(plan, ds=ds)
+
+# With LOAD_SHARD_TASKS the load becomes prepare_load >> load_shard (mapped, one per shard) >>
+# finish_load, so Airflow schedules the shards across workers; the shard count is fixed at parse time
+LOAD_SHARD_TASKS = pipeline_config()["LOAD_SHARD_TASKS"]
+LOAD_SHARDS = pipeline_config()["LOAD_SHARDS"]
 
 default_args = {
     'owner': 'airflow',
@@ -16,9 +59,11 @@ with DAG(
     dag_id='etl_pipeline_json_logs',
     default_args=default_args,
     description='ETL pipeline to process JSON logs and load into PostgreSQL',
-    schedule_interval=None,  # Manual trigger
+    schedule_interval='@daily',  # Each run processes its logical date (`ds`)
     start_date=days_ago(1),
-    catchup=False,
+    catchup=False,  # Past days are re-run explicitly with `airflow dags backfill`
+    max_active_runs=pipeline_config()["BACKFILL_MAX_PARALLEL_DAYS"],
+    params={"force": False},
     tags=['etl', 'json', 'postgres'],
 ) as dag:
     """
@@ -27,6 +72,9 @@ with DAG(
     - Ingest JSON logs
     - Transform data
     - Load into PostgreSQL
+
+    The ETL callables accept `ds`, so Airflow hands every run its own logical date and
+    writes/reads that day's partition.
     """
 
     init_db_task = PythonOperator(
@@ -36,18 +84,33 @@ with DAG(
 
     ingest_data_task = PythonOperator(
         task_id='ingest_data',
-        python_callable=user_action_log_job.run_ingest,
+        python_callable=run_ingest,
     )
 
     transform_data_task = PythonOperator(
         task_id='transform_data',
-        python_callable=user_action_log_job.run_transform,
+        python_callable=run_transform,
     )
 
-    load_data_task = PythonOperator(
-        task_id='load_data',
-        python_callable=user_action_log_job.run_load,
-    )
+    if LOAD_SHARD_TASKS:
+        prepare_load_task = PythonOperator(
+            task_id="prepare_load",
+            python_callable=prepare_load_shards,
+        )
+        load_shard_tasks = PythonOperator.partial(
+            task_id="load_shard",
+            python_callable=run_load_shard,
+        ).expand(op_kwargs=[{"shard": shard} for shard in range(LOAD_SHARDS)])
+        finish_load_task = PythonOperator(
+            task_id="finish_load",
+            python_callable=finish_load_shards,
+        )
+        load_tasks = [prepare_load_task, load_shard_tasks, finish_load_task]
+    else:
+        load_tasks = [PythonOperator(
+            task_id='load_data',
+            python_callable=run_load,
+        )]
 
     # Define task dependencies
-    init_db_task >> ingest_data_task >> transform_data_task >> load_data_task
+    chain(init_db_task, ingest_data_task, transform_data_task, *load_tasks)
@@ -0,0 +1,176 @@
+import io
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from src.config import logger
+from src.database.partitions import ensure_partitions
+from src.database.rollups import NEW_FACTS_TABLE, CREATE_NEW_FACTS_SQL, update_rollups
+
+STAGE_TABLE = "stage_user_actions"
+STAGE_COLUMNS = ["user_id", "action_type", "timestamp", "device", "location"]
+
+CREATE_STAGE_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+        user_id VARCHAR(64) NOT NULL,
+        action_type VARCHAR(255) NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        device VARCHAR(100),
+        location VARCHAR(100)
+    ) ON COMMIT DROP
+"""
+
+# First-seen device/location wins, matching the ORM loader which never updates existing users.
+UPSERT_USERS_SQL = f"""
+    INSERT INTO dim_users (user_id, device, location)
+    SELECT DISTINCT ON (user_id) user_id, device, location
+    FROM {STAGE_TABLE}
+    ORDER BY user_id, timestamp
+    ON CONFLICT (user_id) DO NOTHING
+"""
+
+UPSERT_ACTIONS_SQL = f"""
+    INSERT INTO dim_actions (action_type)
+    SELECT DISTINCT action_type
+    FROM {STAGE_TABLE}
+    ORDER BY action_type  -- consistent lock order when several loads run at once
+    ON CONFLICT (action_type) DO NOTHING
+"""
+
+INSERT_FACTS_SQL = f"""
+    INSERT INTO fact_user_actions (user_id, action_id, timestamp)
+    SELECT DISTINCT s.user_id, a.action_id, s.timestamp
+    FROM {STAGE_TABLE} s
+    JOIN dim_actions a ON a.action_type = s.action_type
+    WHERE NOT EXISTS (
+        SELECT 1 FROM fact_user_actions f
+        WHERE f.user_id = s.user_id
+          AND f.action_id = a.action_id
+          AND f.timestamp = s.timestamp
+    )
+"""
+
+# Same insert, also recording the inserted rows for the rollups
+INSERT_FACTS_TRACKED_SQL = f"""
+    WITH inserted AS ({INSERT_FACTS_SQL}    RETURNING user_id, action_id, timestamp)
+    INSERT INTO {NEW_FACTS_TABLE} (user_id, action_id, timestamp)
+    SELECT user_id, action_id, timestamp FROM inserted
+"""
+
+
+# Exact membership check for candidate events, in one round trip per batch of keys
+EXISTING_EVENTS_SQL = """
+    SELECT c.ord
+    FROM unnest(CAST(:user_ids AS VARCHAR[]), CAST(:action_types AS VARCHAR[]), CAST(:timestamps AS TIMESTAMPTZ[]))
+         WITH ORDINALITY AS c(user_id, action_type, timestamp, ord)
+    WHERE EXISTS (
+        SELECT 1 FROM fact_user_actions f
+        JOIN dim_actions a ON a.action_id = f.action_id
+        WHERE f.user_id = c.user_id
+          AND a.action_type = c.action_type
+          AND f.timestamp = c.timestamp
+    )
+"""
+
+
+def find_loaded_events(engine, df: pd.DataFrame, batch_size: int = 50_000) -> np.ndarray:
+    """
+    Returns a boolean mask over df marking the (user_id, action_type, timestamp) events
+    already present in fact_user_actions.
+    """
+    with engine.connect() as connection:
+        return loaded_event_mask(connection, df, batch_size)
+
+
+def loaded_event_mask(connection, df: pd.DataFrame, batch_size: int = 50_000) -> np.ndarray:
+    """
+    find_loaded_events on an open Connection or Session, so the check sees the caller's transaction.
+    One set-based query per `batch_size` events.
+    """
+    found = np.zeros(len(df), dtype=bool)
+    user_ids = df["user_id"]
+    if pd.api.types.is_float_dtype(user_ids):
+        user_ids = user_ids.astype("Int64")
+    user_ids = user_ids.astype(str).tolist()
+    action_types = df["action_type"].astype(str).tolist()
+    timestamps = pd.to_datetime(df["timestamp"], utc=True).astype(object).tolist()
+    for start in range(0, len(df), batch_size):
+        end = start + batch_size
+        rows = connection.execute(text(EXISTING_EVENTS_SQL), {
+            "user_ids": user_ids[start:end],
+            "action_types": action_types[start:end],
+            "timestamps": timestamps[start:end],
+        }).fetchall()
+        found[[start + ordinal - 1 for (ordinal,) in rows]] = True
+    return found
+
+
+def copy_to_stage(connection, df: pd.DataFrame) -> int:
+    """
+    Streams the DataFrame into a transaction-scoped temp table using PostgreSQL COPY.
+    """
+    frame = df.reindex(columns=STAGE_COLUMNS)
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    connection.execute(text(CREATE_STAGE_SQL))
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {STAGE_TABLE} ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+    logger.info(f"Staged {len(frame)} rows into {STAGE_TABLE} via COPY")
+    return len(frame)
+
+
+def merge_dimensions(connection) -> dict:
+    """Upserts the staged batch's users and actions. Must run in the transaction that staged it."""
+    counts = {
+        "users_inserted": connection.execute(text(UPSERT_USERS_SQL)).rowcount,
+        "actions_inserted": connection.execute(text(UPSERT_ACTIONS_SQL)).rowcount,
+    }
+    logger.info(f"Merged staged dimensions: {counts}")
+    return counts
+
+
+def merge_facts(connection, rollups: bool = False) -> dict:
+    """
+    Inserts the staged events that are not loaded yet; their dimensions must exist already.
+    Every staged event is checked against fact_user_actions, so re-running a batch whose facts
+    were committed (e.g. a retry after a crash before the load watermark moved) inserts nothing.
+    With `rollups`, the inserted facts are also folded into the rollup tables.
+    """
+    facts_sql = INSERT_FACTS_SQL
+    if rollups:
+        connection.execute(text(CREATE_NEW_FACTS_SQL))
+        facts_sql = INSERT_FACTS_TRACKED_SQL
+    counts = {"facts_inserted": connection.execute(text(facts_sql)).rowcount}
+    logger.info(f"Merged staged facts: {counts}")
+    if rollups:
+        counts["rollups"] = update_rollups(connection)
+    return counts
+
+
+def merge_stage(connection, rollups: bool = False) -> dict:
+    """
+    Upserts dimensions and inserts new facts from the staged batch with set-based statements.
+    Must run inside the same transaction as copy_to_stage.
+    """
+    counts = merge_dimensions(connection)
+    counts.update(merge_facts(connection, rollups))
+    return counts
+
+
+def bulk_load(engine, df: pd.DataFrame, rollups: bool = False) -> dict:
+    """
+    Loads a processed batch in a single transaction: COPY into a temp table, then merge.
+    """
+    with engine.begin() as connection:
+        ensure_partitions(connection, df["timestamp"])
+        staged = copy_to_stage(connection, df)
+        counts = merge_stage(connection, rollups)
+    counts["rows_staged"] = staged
+    return counts
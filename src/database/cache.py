@@ -0,0 +1,130 @@
+from collections import OrderedDict
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from src.config import logger
+
+_MISSING = object()
+
+
+class DimensionCache:
+    """
+    Bounded LRU cache resolving a dimension's natural key to its surrogate key.
+
+    Batches resolve their distinct keys through resolve_many; each hit is one key left out of the
+    batch's lookup query, and a batch whose keys all hit sends no query at all.
+    """
+
+    def __init__(self, model, natural_key: str, surrogate_key: str, max_size: int = 100_000):
+        self.model = model
+        self.natural_key = natural_key
+        self.surrogate_key = surrogate_key
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.inserted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached surrogate key, or None if the natural key is not cached."""
+        value = self._entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Caches a natural -> surrogate key pair, evicting the least recently used entry when full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drops one natural key, or the whole cache when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def preload(self, session) -> int:
+        """
+        Loads every row of the dimension into the cache. Meant for small dimensions like dim_actions.
+        """
+        rows = session.query(
+            getattr(self.model, self.natural_key),
+            getattr(self.model, self.surrogate_key),
+        ).all()
+        for key, value in rows:
+            self.put(key, value)
+        logger.info(f"Preloaded {len(rows)} keys into {self.model.__tablename__} cache")
+        return len(rows)
+
+    def _fetch(self, session, keys: list) -> dict:
+        """Surrogate keys of the given natural keys that exist, in one `= ANY(:keys)` query."""
+        table = self.model.__tablename__
+        rows = session.execute(
+            text(f"SELECT {self.natural_key}, {self.surrogate_key} FROM {table} WHERE {self.natural_key} = ANY(:keys)"),
+            {"keys": keys},
+        ).fetchall()
+        return dict(rows)
+
+    def resolve_many(self, session, keys: pd.Series, attributes: pd.DataFrame = None) -> dict:
+        """
+        Resolves every distinct natural key of a batch at once. Cached keys come from the LRU. The
+        rest are looked up with one query, and the ones still missing are inserted with one
+        executemany (ON CONFLICT DO NOTHING, so a concurrent writer's row is simply kept) and read
+        back. `attributes`, indexed by natural key, holds the other columns of rows to insert.
+        Returns {natural key: surrogate key}.
+        """
+        resolved, misses = {}, []
+        for key in keys.dropna().drop_duplicates().tolist():
+            value = self.get(key)
+            if value is None:
+                misses.append(key)
+            else:
+                resolved[key] = value
+        if not misses:
+            return resolved
+
+        found = self._fetch(session, misses)
+        # Sorted, so concurrent loads creating overlapping keys take the unique index locks in the
+        # same order instead of deadlocking (as the bulk upserts do with ORDER BY)
+        missing = sorted((key for key in misses if key not in found), key=str)
+        if missing:
+            rows = pd.DataFrame({self.natural_key: missing})
+            if attributes is not None:
+                rows = rows.join(attributes, on=self.natural_key)
+            # NaN from missing categorical values must be stored as NULL
+            rows = rows.astype(object).where(rows.notna(), None)
+            session.execute(insert(self.model.__table__).on_conflict_do_nothing(), rows.to_dict("records"))
+            self.inserted += len(missing)
+            if self.natural_key == self.surrogate_key:
+                found.update((key, key) for key in missing)
+            else:
+                found.update(self._fetch(session, missing))
+        logger.info(f"Resolved {len(misses)} uncached {self.model.__tablename__} key(s): "
+                    f"{len(misses) - len(missing)} existing, {len(missing)} new")
+
+        for key in misses:
+            self.put(key, found[key])
+            resolved[key] = found[key]
+        return resolved
+
+    def stats(self) -> dict:
+        """Returns the counters; hits and misses count distinct keys per batch, not DB round trips."""
+        return {
+            "table": self.model.__tablename__,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "inserted": self.inserted,
+        }
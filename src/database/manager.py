@@ -1,12 +1,19 @@
+import pandas as pd
 from .models.base import Base, get_engine
 from .models.dim_users import DimUser
 from .models.dim_actions import DimAction
 from .models.fact_user_actions import FactUserAction
+from .models.etl_watermark import EtlWatermark
+from .models.etl_stage_state import EtlStageState
+from .models.rollups import RollupDailyAction, RollupDailyUsers
+from .partitions import FACT_TABLE, BRIN_INDEX, is_partitioned, ensure_partitions
+from sqlalchemy import inspect, text
 from src.config import logger
 
 def init_db():
     """
     Initializes the database by creating all defined tables if they do not exist.
+    fact_user_actions is created range-partitioned by timestamp, with its current and upcoming partitions.
     """
     logger.info("Initializing database...")
 
@@ -16,7 +23,19 @@ def init_db():
 
         logger.info("Creating tables if they do not exist...")
         Base.metadata.create_all(bind=engine)
-        
+
+        with engine.begin() as connection:
+            if is_partitioned(connection):
+                now = pd.Timestamp.now(tz="UTC")
+                ensure_partitions(connection, [now])
+            elif inspect(connection).has_table(FACT_TABLE):
+                # Tables created before partitioning keep working; they only get the BRIN index
+                logger.warning(f"{FACT_TABLE} exists and is not partitioned; partition management is disabled. "
+                               "Recreate the table (see README) to enable it.")
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {BRIN_INDEX} ON {FACT_TABLE} USING brin (timestamp)"
+                ))
+
         logger.info("Database initialized successfully. All tables are ready.")
     except Exception as e:
         logger.exception("Error during database initialization.")
@@ -1,23 +1,83 @@
+import threading
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session
-from src.config import database_config
+from sqlalchemy.pool import NullPool
+from src.config import database_config, pipeline_config, logger
 
 # Global declarative base for all models
 Base = declarative_base()
 
-# Create engine only once at module level
-engine = create_engine(database_config(), echo=False)
+_engine = None
+_engine_lock = threading.Lock()
 
-# Thread-safe session factory
-SessionLocal = scoped_session(sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
-))
+def engine_options(pipeline: dict = None) -> dict:
+    """
+    create_engine keyword arguments built from the DB_* settings.
+
+    With DB_PGBOUNCER the pooling is left to PgBouncer (NullPool: connections are closed on release),
+    and no session-level startup options are sent, since transaction pooling rejects them.
+    """
+    pipeline = pipeline or pipeline_config()
+    options = {
+        "echo": False,
+        "executemany_mode": pipeline["DB_EXECUTEMANY_MODE"],
+        "executemany_values_page_size": pipeline["DB_EXECUTEMANY_PAGE_SIZE"],
+    }
+    if pipeline["DB_PGBOUNCER"]:
+        options["poolclass"] = NullPool
+        return options
+
+    options.update(
+        pool_size=pipeline["DB_POOL_SIZE"],
+        max_overflow=pipeline["DB_MAX_OVERFLOW"],
+        pool_timeout=pipeline["DB_POOL_TIMEOUT"],
+        pool_recycle=pipeline["DB_POOL_RECYCLE"],
+        pool_pre_ping=pipeline["DB_POOL_PRE_PING"],
+    )
+    if pipeline["DB_STATEMENT_TIMEOUT_MS"] > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={pipeline['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+def _set_local_statement_timeout(engine, timeout_ms: int):
+    """Applies the timeout per transaction, the only scope that survives PgBouncer transaction pooling."""
+    @event.listens_for(engine, "begin")
+    def set_timeout(connection):
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        finally:
+            cursor.close()
 
 def get_engine():
     """
-    Returns the SQLAlchemy engine instance.
+    Returns the SQLAlchemy engine instance, creating it on first use.
+    Importing the models therefore needs neither database settings nor a connection.
     """
-    return engine
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                pipeline = pipeline_config()
+                engine = create_engine(database_config(), **engine_options(pipeline))
+                if pipeline["DB_PGBOUNCER"] and pipeline["DB_STATEMENT_TIMEOUT_MS"] > 0:
+                    _set_local_statement_timeout(engine, pipeline["DB_STATEMENT_TIMEOUT_MS"])
+                logger.info(f"Created database engine with pool {engine.pool.status()}")
+                _engine = engine
+    return _engine
+
+def dispose_engine():
+    """Closes the engine's pooled connections and forgets it; the next get_engine() builds a new one."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+def _create_session():
+    return _session_factory(bind=get_engine())
+
+# Thread-safe session factory, bound to the engine when the first session is opened
+SessionLocal = scoped_session(_create_session)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, DateTime, func
+from .base import Base
+
+
+class EtlStageState(Base):
+    __tablename__ = "etl_stage_state"
+
+    stage = Column(String(32), primary_key=True, nullable=False)
+    partition = Column(String(32), primary_key=True, nullable=False)
+    input_hash = Column(String(64), nullable=False)
+    output = Column(String(1024), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return (f"<EtlStageState(stage='{self.stage}', partition='{self.partition}', "
+                f"input_hash='{self.input_hash}', output='{self.output}')>")
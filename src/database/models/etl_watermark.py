@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, BigInteger, DateTime, func
+from .base import Base
+
+
+class EtlWatermark(Base):
+    __tablename__ = "etl_watermarks"
+
+    stage = Column(String(32), primary_key=True, nullable=False)
+    partition = Column(String(32), primary_key=True, nullable=False)
+    last_object = Column(String(1024), nullable=True)
+    last_offset = Column(BigInteger, nullable=True)
+    max_timestamp = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return (f"<EtlWatermark(stage='{self.stage}', partition='{self.partition}', "
+                f"last_object='{self.last_object}', last_offset={self.last_offset}, "
+                f"max_timestamp='{self.max_timestamp}')>")
@@ -1,16 +1,24 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from .base import Base
+from src.database.partitions import FACT_TABLE, BRIN_INDEX
 
 class FactUserAction(Base):
-    __tablename__ = "fact_user_actions"
+    """
+    One row per user action, range-partitioned by timestamp (see src/database/partitions.py).
+    PostgreSQL requires the partition key in the primary key, hence (id, timestamp).
+    """
+    __tablename__ = FACT_TABLE
 
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     user_id = Column(String(64), ForeignKey("dim_users.user_id"), nullable=False)
     action_id = Column(Integer, ForeignKey("dim_actions.action_id"), nullable=False)
-    timestamp = Column(DateTime(timezone=True), nullable=False)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
 
     __table_args__ = (
         Index("idx_user_action_time", "user_id", "action_id", "timestamp"),
+        # Rows arrive roughly in time order, so a few block ranges summarize each partition
+        Index(BRIN_INDEX, "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
     )
 
     def __repr__(self) -> str:
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, BigInteger, Date, Float, LargeBinary, ForeignKey
+from .base import Base
+
+class RollupDailyAction(Base):
+    """
+    Events per UTC day, action and the acting user's device and location, kept up to date by every load.
+    Unknown device or location is stored as an empty string, since both are part of the key.
+    """
+    __tablename__ = "rollup_daily_actions"
+
+    day = Column(Date, primary_key=True, nullable=False)
+    action_id = Column(Integer, ForeignKey("dim_actions.action_id"), primary_key=True, nullable=False)
+    device = Column(String(100), primary_key=True, nullable=False)
+    location = Column(String(100), primary_key=True, nullable=False)
+    events = Column(BigInteger, nullable=False)
+
+    def __repr__(self) -> str:
+        return (f"<RollupDailyAction(day='{self.day}', action_id={self.action_id}, device='{self.device}', "
+                f"location='{self.location}', events={self.events})>")
+
+class RollupDailyUsers(Base):
+    """Distinct users per UTC day as a HyperLogLog sketch (see src/database/rollups.py)."""
+    __tablename__ = "rollup_daily_users"
+
+    day = Column(Date, primary_key=True, nullable=False)
+    sketch = Column(LargeBinary, nullable=False)
+    users_estimate = Column(Float, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<RollupDailyUsers(day='{self.day}', users_estimate={self.users_estimate})>"
@@ -0,0 +1,149 @@
+import re
+import pandas as pd
+from enum import Enum
+from sqlalchemy import text
+from src.config import pipeline_config, logger
+
+FACT_TABLE = "fact_user_actions"
+BRIN_INDEX = "brin_fact_user_actions_timestamp"
+
+class PartitionInterval(Enum):
+    """Enum to select the time range covered by each fact_user_actions partition."""
+    DAY = "day"
+    MONTH = "month"
+
+_PARTITION_NAME = re.compile(rf"^{FACT_TABLE}_p(\d{{4}})_(\d{{2}})(?:_(\d{{2}}))?$")
+
+IS_PARTITIONED_SQL = """
+    SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))
+"""
+
+LIST_PARTITIONS_SQL = """
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(:table)
+"""
+
+# Serializes partition DDL between concurrent loads; released when the transaction ends
+PARTITION_LOCK_SQL = f"SELECT pg_advisory_xact_lock(hashtext('{FACT_TABLE}:partitions'))"
+
+def period_start(timestamp, interval: PartitionInterval) -> pd.Timestamp:
+    """Start (UTC) of the partition period containing the timestamp."""
+    timestamp = pd.Timestamp(timestamp)
+    timestamp = timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+    day = timestamp.normalize()
+    return day if interval is PartitionInterval.DAY else day.replace(day=1)
+
+def next_period(start: pd.Timestamp, interval: PartitionInterval) -> pd.Timestamp:
+    if interval is PartitionInterval.DAY:
+        return start + pd.Timedelta(days=1)
+    return start + pd.offsets.MonthBegin(1)
+
+def partition_name(start: pd.Timestamp, interval: PartitionInterval) -> str:
+    """fact_user_actions_p2025_07 for monthly partitions, fact_user_actions_p2025_07_15 for daily ones."""
+    suffix = start.strftime("%Y_%m_%d") if interval is PartitionInterval.DAY else start.strftime("%Y_%m")
+    return f"{FACT_TABLE}_p{suffix}"
+
+def parse_partition_name(name: str):
+    """(period start, interval) encoded in a managed partition's name, or None for any other table."""
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    interval = PartitionInterval.DAY if day else PartitionInterval.MONTH
+    return pd.Timestamp(int(year), int(month), int(day or 1), tz="UTC"), interval
+
+def batch_periods(timestamps, interval: PartitionInterval) -> list:
+    """
+    Start of every partition period that holds at least one of the timestamps, in order. Periods
+    between them that hold no event are left out, so a stray old event adds one partition, not
+    every partition since its date.
+    """
+    days = pd.to_datetime(pd.Series(timestamps), utc=True).dt.normalize().dropna().unique()
+    return sorted({period_start(day, interval) for day in days})
+
+def is_partitioned(connection) -> bool:
+    return bool(connection.execute(text(IS_PARTITIONED_SQL), {"table": FACT_TABLE}).scalar())
+
+def list_partitions(connection) -> list:
+    return [row[0] for row in connection.execute(text(LIST_PARTITIONS_SQL), {"table": FACT_TABLE}).fetchall()]
+
+def ensure_partitions(connection, timestamps, interval: PartitionInterval = None, ahead: int = None,
+                      now=None) -> list:
+    """
+    Creates the fact_user_actions partitions holding the given event timestamps plus the current
+    period and the next `ahead` periods, so that loads never hit a missing partition. Existing partitions are left
+    alone and the catalog check runs without locks; only when something is missing is the partition
+    DDL serialized across concurrent loads. A table that is not partitioned is left untouched.
+    Returns the names of the partitions created.
+    """
+    pipeline = pipeline_config()
+    interval = interval or PartitionInterval(pipeline["FACT_PARTITION_INTERVAL"])
+    ahead = pipeline["FACT_PARTITIONS_AHEAD"] if ahead is None else ahead
+    if not is_partitioned(connection):
+        return []
+
+    current = period_start(now if now is not None else pd.Timestamp.now(tz="UTC"), interval)
+    upcoming = [current]
+    for _ in range(ahead):
+        upcoming.append(next_period(upcoming[-1], interval))
+    wanted = sorted(set(batch_periods(timestamps, interval)) | set(upcoming))
+
+    existing = set(list_partitions(connection))
+    missing = [period for period in wanted if partition_name(period, interval) not in existing]
+    if not missing:
+        return []
+
+    connection.execute(text(PARTITION_LOCK_SQL))
+    # Another load may have created some of them while this one waited for the lock
+    existing = set(list_partitions(connection))
+    created = []
+    for period in missing:
+        name = partition_name(period, interval)
+        if name in existing:
+            continue
+        connection.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {FACT_TABLE} "
+            f"FOR VALUES FROM ('{period.isoformat()}') TO ('{next_period(period, interval).isoformat()}')"
+        ))
+        created.append(name)
+    if created:
+        logger.info(f"Created {len(created)} {FACT_TABLE} partition(s): {', '.join(created)}")
+    return created
+
+def apply_retention(connection, keep: int = None, interval: PartitionInterval = None, drop: bool = None,
+                    now=None) -> list:
+    """
+    Detaches (and with `drop`, drops) the managed partitions that lie entirely before the last
+    `keep` periods, the current one included. Detached partitions stay in the database as plain
+    tables, out of every query on fact_user_actions, until someone archives or drops them.
+    keep=0 disables retention. Returns the names of the partitions removed.
+    """
+    pipeline = pipeline_config()
+    keep = pipeline["FACT_RETENTION_PERIODS"] if keep is None else keep
+    interval = interval or PartitionInterval(pipeline["FACT_PARTITION_INTERVAL"])
+    drop = pipeline["FACT_RETENTION_DROP"] if drop is None else drop
+    if keep <= 0 or not is_partitioned(connection):
+        return []
+
+    cutoff = period_start(now if now is not None else pd.Timestamp.now(tz="UTC"), interval)
+    for _ in range(keep - 1):
+        cutoff = period_start(cutoff - pd.Timedelta(days=1), interval)
+
+    expired = []
+    for name in sorted(list_partitions(connection)):
+        parsed = parse_partition_name(name)
+        if parsed is not None and next_period(*parsed) <= cutoff:
+            expired.append(name)
+    if not expired:
+        return []
+
+    connection.execute(text(PARTITION_LOCK_SQL))
+    for name in expired:
+        connection.execute(text(f"ALTER TABLE {FACT_TABLE} DETACH PARTITION {name}"))
+        if drop:
+            connection.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"{'Dropped' if drop else 'Detached'} {len(expired)} expired {FACT_TABLE} partition(s): "
+                f"{', '.join(expired)}")
+    return expired
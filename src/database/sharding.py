@@ -0,0 +1,88 @@
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import DBAPIError
+from src.config import logger
+from src.database.bulk import copy_to_stage, merge_dimensions, merge_facts
+from src.database.partitions import ensure_partitions
+from src.etl_pipeline import metrics
+
+# PostgreSQL aborts one side of a lock cycle (deadlock_detected) or a serialization conflict
+# (serialization_failure); the aborted transaction is safe to run again
+RETRYABLE_PGCODES = {"40P01", "40001"}
+SHARD_RETRIES = 3
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, DBAPIError) and getattr(error.orig, "pgcode", None) in RETRYABLE_PGCODES
+
+def shard_numbers(user_ids: pd.Series, shards: int) -> np.ndarray:
+    """
+    Shard of each row: a stable 64-bit hash of the user id's string form, modulo `shards`. The same
+    user always lands in the same shard, in every process and on every run.
+    """
+    hashes = pd.util.hash_array(user_ids.astype(str).to_numpy(dtype=object))
+    return (hashes % np.uint64(shards)).astype(np.int64)
+
+def split_by_user(df: pd.DataFrame, shards: int) -> list:
+    """The batch's rows for each shard number, 0..shards-1 (some may be empty)."""
+    numbers = shard_numbers(df["user_id"], shards)
+    return [df[numbers == shard] for shard in range(shards)]
+
+def load_dimensions(engine, df: pd.DataFrame) -> dict:
+    """
+    Upserts every user and action of the batch, and creates the partitions it needs, in one
+    transaction. Shards then only insert facts, so they never compete for dimension rows.
+    """
+    # Each user's earliest row decides its device/location, as in the single-transaction merge
+    ordered = df.sort_values("timestamp", kind="stable")
+    keys = pd.concat([ordered.drop_duplicates("user_id"), ordered.drop_duplicates("action_type")])
+    with engine.begin() as connection:
+        ensure_partitions(connection, df["timestamp"])
+        copy_to_stage(connection, keys)
+        return merge_dimensions(connection)
+
+def load_shard(engine, df: pd.DataFrame, rollups: bool = False, retries: int = SHARD_RETRIES) -> dict:
+    """
+    Inserts one shard's facts in its own transaction, retrying with backoff when PostgreSQL
+    aborted it for a deadlock or serialization conflict.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            with engine.begin() as connection:
+                staged = copy_to_stage(connection, df)
+                counts = merge_facts(connection, rollups)
+            counts["rows_staged"] = staged
+            counts["attempts"] = attempt
+            return counts
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            logger.warning(f"Shard load hit a lock conflict (attempt {attempt}/{retries}); retrying")
+            time.sleep(0.2 * attempt)
+
+def sharded_load(engine, df: pd.DataFrame, shards: int, rollups: bool = False) -> dict:
+    """
+    Loads a validated batch as `shards` user-partitioned transactions running concurrently, each on
+    its own pooled connection, after resolving all dimensions first.
+
+    Shards commit independently, so a failed shard leaves the others loaded. Every shard checks
+    each event against fact_user_actions, which makes re-running the whole batch safe. Returns the
+    counts summed over the shards.
+    """
+    counts = load_dimensions(engine, df)
+    parts = [part for part in split_by_user(df, shards) if not part.empty]
+    logger.info(f"Loading {len(df)} rows as {len(parts)} shard(s) by user_id")
+
+    totals = {"shards": len(parts), "facts_inserted": 0, "rows_staged": 0, "retries": 0}
+    with ThreadPoolExecutor(max_workers=max(1, len(parts))) as pool:
+        # Shards report their DB round trips to the caller's stage
+        futures = [metrics.submit(pool, load_shard, engine, part, rollups) for part in parts]
+        for future in futures:
+            shard_counts = future.result()
+            totals["facts_inserted"] += shard_counts["facts_inserted"]
+            totals["rows_staged"] += shard_counts["rows_staged"]
+            totals["retries"] += shard_counts["attempts"] - 1
+    counts.update(totals)
+    logger.info(f"Sharded load completed: {counts}")
+    return counts
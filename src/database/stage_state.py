@@ -0,0 +1,33 @@
+from src.config import logger
+from .models.base import SessionLocal
+from .models.etl_stage_state import EtlStageState
+
+
+class StageStateStore:
+    """
+    Remembers, per stage and day partition, a fingerprint of the inputs of the stage's last
+    successful run and the output it produced, so a rerun over unchanged inputs can reuse it.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def get(self, stage: str, partition: str) -> dict:
+        """Returns the recorded state as a plain dict, or an empty dict if the stage never completed."""
+        with self.session_factory() as session:
+            row = session.get(EtlStageState, (stage, partition))
+            if row is None:
+                return {}
+            return {"input_hash": row.input_hash, "output": row.output}
+
+    def record(self, stage: str, partition: str, input_hash: str, output: str):
+        """Stores the fingerprint and output of a completed run, replacing the previous one."""
+        with self.session_factory() as session:
+            row = session.get(EtlStageState, (stage, partition))
+            if row is None:
+                row = EtlStageState(stage=stage, partition=partition)
+                session.add(row)
+            row.input_hash = input_hash
+            row.output = output
+            session.commit()
+        logger.info(f"Recorded {stage} state for {partition}: input_hash={input_hash[:12]}, output={output}")
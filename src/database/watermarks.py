@@ -0,0 +1,49 @@
+from datetime import timezone
+from src.config import logger
+from .models.base import SessionLocal
+from .models.etl_watermark import EtlWatermark
+
+
+class WatermarkStore:
+    """
+    Remembers, per stage and day partition, the last object (and offset within it) that was
+    processed and the largest event timestamp seen, so reruns only pick up new data.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def get(self, stage: str, partition: str) -> dict:
+        """Returns the watermark as a plain dict, or an empty dict if the stage never ran."""
+        with self.session_factory() as session:
+            row = session.get(EtlWatermark, (stage, partition))
+            if row is None:
+                return {}
+            return {
+                "last_object": row.last_object,
+                "last_offset": row.last_offset,
+                "max_timestamp": row.max_timestamp,
+            }
+
+    def advance(self, stage: str, partition: str, last_object: str = None, last_offset: int = None,
+                max_timestamp=None):
+        """
+        Moves the watermark forward. The stored max_timestamp never goes backwards.
+        """
+        with self.session_factory() as session:
+            row = session.get(EtlWatermark, (stage, partition))
+            if row is None:
+                row = EtlWatermark(stage=stage, partition=partition)
+                session.add(row)
+            if last_object is not None:
+                row.last_object = last_object
+            if last_offset is not None:
+                row.last_offset = last_offset
+            current = row.max_timestamp
+            if current is not None and current.tzinfo is None:
+                current = current.replace(tzinfo=timezone.utc)  # backends without timezone support
+            if max_timestamp is not None and (current is None or max_timestamp > current):
+                row.max_timestamp = max_timestamp
+            session.commit()
+        logger.info(f"Advanced {stage} watermark for {partition}: last_object={last_object}, "
+                    f"last_offset={last_offset}, max_timestamp={max_timestamp}")
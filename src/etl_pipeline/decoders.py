@@ -0,0 +1,135 @@
+import gc
+import io
+import json
+import re
+import threading
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+from enum import Enum
+from src.config import logger
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson is in requirements.txt; stdlib json keeps it working
+    orjson = None
+    _loads = json.loads
+
+class RawDecoder(Enum):
+    """Enum to select how raw JSON payloads are decoded into a DataFrame."""
+    PANDAS = "pandas"  # pd.read_json
+    ORJSON = "orjson"  # native parser into records, then columns
+    ARROW = "arrow"    # pyarrow's multithreaded JSON reader (newline-delimited input only)
+
+class Layout(Enum):
+    """Top-level layout of a JSON payload."""
+    ARRAY = "array"    # [{...}, {...}]
+    NDJSON = "ndjson"  # one object per line
+    EMPTY = "empty"
+
+_FIRST_TOKEN = re.compile(rb"\S")
+
+def detect_layout(payload: bytes) -> Layout:
+    """Tells a JSON array from newline-delimited JSON by the first non-whitespace byte."""
+    match = _FIRST_TOKEN.search(payload)
+    if match is None:
+        return Layout.EMPTY
+    first = payload[match.start():match.start() + 1]
+    if first == b"[":
+        return Layout.ARRAY
+    if first == b"{":
+        return Layout.NDJSON
+    raise ValueError(f"Expected a JSON array or newline-delimited JSON objects, got {first!r}")
+
+def flatten_metadata(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replaces the nested `metadata` column by one column per metadata key (device, location, ...).
+    Rows without metadata get nulls.
+    """
+    if "metadata" not in df.columns:
+        return df
+    values = df["metadata"].tolist()
+    metadata_df = pd.DataFrame([value if isinstance(value, dict) else {} for value in values], index=df.index)
+    return df.drop(columns=["metadata"]).join(metadata_df)
+
+# gc.disable() is process-wide, so concurrent pauses share one count: the first pauses the
+# collector, the last one out restores it
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+@contextmanager
+def _gc_paused():
+    """
+    Pauses the cyclic garbage collector. Decoding creates millions of acyclic objects, each
+    allocation burst triggering collections that find nothing; this roughly halves decode time.
+
+    Thread-safe: decoders run in several threads at once (concurrent object reads, backfill days,
+    the micro-batch poller), and the collector stays paused until every one of them has finished.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+def _decode_pandas(payload: bytes, layout: Layout) -> pd.DataFrame:
+    df = pd.read_json(io.BytesIO(payload), lines=layout is Layout.NDJSON, convert_dates=False)
+    return flatten_metadata(df)
+
+def _decode_orjson(payload: bytes, layout: Layout) -> pd.DataFrame:
+    with _gc_paused():
+        if layout is Layout.ARRAY:
+            records = _loads(payload)
+        else:
+            records = [_loads(line) for line in payload.splitlines() if line.strip()]
+        return flatten_metadata(pd.DataFrame(records))
+
+def _decode_arrow(payload: bytes, layout: Layout) -> pd.DataFrame:
+    if layout is Layout.ARRAY:
+        # pyarrow only reads newline-delimited JSON
+        return _decode_orjson(payload, layout)
+    try:
+        table = pa_json.read_json(
+            io.BytesIO(payload),
+            # Keep timestamps as text: normalize_timestamps decides the format, not the reader
+            parse_options=pa_json.ParseOptions(explicit_schema=pa.schema([("timestamp", pa.string())])),
+        )
+    except pa.ArrowInvalid as e:
+        # Mixed value types in a column (e.g. numeric and string timestamps) defeat Arrow's typed reader
+        logger.warning(f"pyarrow JSON reader rejected the payload ({e}); decoding with orjson instead")
+        return _decode_orjson(payload, layout)
+
+    # Struct columns flatten to "metadata.device", ...; strip the prefix like flatten_metadata does
+    table = table.flatten()
+    table = table.rename_columns([name.split(".", 1)[1] if name.startswith("metadata.") else name
+                                  for name in table.column_names])
+    return table.to_pandas()
+
+_DECODERS = {
+    RawDecoder.PANDAS: _decode_pandas,
+    RawDecoder.ORJSON: _decode_orjson,
+    RawDecoder.ARROW: _decode_arrow,
+}
+
+def decode_records(payload: bytes, decoder: RawDecoder = RawDecoder.ORJSON) -> pd.DataFrame:
+    """
+    Decodes a JSON array or newline-delimited JSON payload into a DataFrame with `metadata.*`
+    flattened into top-level columns. Values are left as found (no date inference).
+    """
+    layout = detect_layout(payload)
+    if layout is Layout.EMPTY:
+        return pd.DataFrame()
+    df = _DECODERS[decoder](payload, layout)
+    logger.debug(f"Decoded {len(df)} {layout.value} records with {decoder.value}")
+    return df
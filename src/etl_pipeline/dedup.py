@@ -0,0 +1,167 @@
+import io
+import math
+import numpy as np
+import pandas as pd
+import botocore.exceptions
+from src.config import logger
+from src.etl_pipeline.utils import S3Storage, generate_dedup_index_key
+
+def event_key_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Stable 64-bit hash of each row's (user_id, action_type, timestamp).
+    Values are canonicalized first so the same event hashes alike whether it was read from JSON or Parquet.
+    """
+    user_ids = df["user_id"]
+    if pd.api.types.is_float_dtype(user_ids):
+        user_ids = user_ids.astype("Int64")
+    # Arrow-backed strings and categoricals of strings hash exactly like the same object strings;
+    # converting them directly (or not at all) is far cheaper than astype(str)
+    if isinstance(user_ids.dtype, pd.StringDtype):
+        user_ids = user_ids.to_numpy(dtype=object)
+    else:
+        user_ids = user_ids.astype(str).to_numpy()
+    action_types = df["action_type"]
+    if not (isinstance(action_types.dtype, pd.CategoricalDtype)
+            and pd.api.types.infer_dtype(action_types.cat.categories) == "string"):
+        action_types = action_types.astype(str).to_numpy()
+    timestamps = pd.to_datetime(df["timestamp"], utc=True).dt.tz_localize(None)
+    canonical = pd.DataFrame({
+        "user_id": user_ids,
+        "action_type": action_types,
+        "timestamp": timestamps.to_numpy(dtype="datetime64[ns]").view("int64"),
+    })
+    return pd.util.hash_pandas_object(canonical, index=False).to_numpy()
+
+class BloomFilter:
+    """
+    Fixed-capacity Bloom filter over 64-bit hashes; `false_positive_rate` holds up to `capacity` keys.
+    The k bit positions come from double hashing the two 32-bit halves of each hash.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float, bits: np.ndarray = None, count: int = 0):
+        self.capacity = int(capacity)
+        self.false_positive_rate = float(false_positive_rate)
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(self.false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bits if bits is not None else np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        self.count = count
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rounds = np.arange(self.num_hashes, dtype=np.uint64)[:, None]
+        return (h1 + rounds * h2) % np.uint64(self.num_bits)
+
+    def add(self, hashes: np.ndarray):
+        positions = self._positions(hashes).ravel()
+        flags = np.unpackbits(self.bits, count=self.num_bits, bitorder="little").astype(bool)
+        flags[positions] = True
+        self.bits = np.packbits(flags, bitorder="little")
+        self.count += len(hashes)
+
+    def might_contain(self, hashes: np.ndarray) -> np.ndarray:
+        positions = self._positions(hashes)
+        set_bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return set_bits.all(axis=0).astype(bool)
+
+class DedupIndex:
+    """
+    Persistent index of the events already loaded for one event day, stored in MinIO.
+
+    `kind` is "bloom" (a scalable Bloom filter: filters of doubling capacity and halving error rate
+    are chained, so the total false-positive rate stays under the budget as the day grows) or
+    "hashset" (the sorted 64-bit hashes themselves: exact up to hash collisions, 8 bytes per event).
+    A positive only means "maybe loaded"; callers confirm it against PostgreSQL before dropping a row.
+    """
+
+    def __init__(self, day: str, kind: str = "bloom", false_positive_rate: float = 0.001,
+                 initial_capacity: int = 1_000_000):
+        self.day = day
+        self.kind = kind
+        self.false_positive_rate = false_positive_rate
+        self.initial_capacity = initial_capacity
+        self.filters = []
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        if self.kind == "hashset":
+            return len(self.hashes)
+        return sum(f.count for f in self.filters)
+
+    def might_contain(self, hashes: np.ndarray) -> np.ndarray:
+        if self.kind == "hashset":
+            if not len(self.hashes):
+                return np.zeros(len(hashes), dtype=bool)
+            positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+            return self.hashes[positions] == hashes
+        found = np.zeros(len(hashes), dtype=bool)
+        for bloom in self.filters:
+            found |= bloom.might_contain(hashes)
+        return found
+
+    def add(self, hashes: np.ndarray):
+        if self.kind == "hashset":
+            self.hashes = np.union1d(self.hashes, hashes)
+            return
+        hashes = np.unique(hashes)
+        while len(hashes):
+            if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+                level = len(self.filters)
+                # Budget p is split as p/2 + p/4 + ... across the chain
+                self.filters.append(BloomFilter(self.initial_capacity * 2 ** level,
+                                                self.false_positive_rate / 2 ** (level + 1)))
+            current = self.filters[-1]
+            room = current.capacity - current.count
+            current.add(hashes[:room])
+            hashes = hashes[room:]
+
+    def to_bytes(self) -> bytes:
+        arrays = {"meta": np.array([self.false_positive_rate, self.initial_capacity], dtype=np.float64)}
+        if self.kind == "hashset":
+            arrays["hashes"] = self.hashes
+        for level, bloom in enumerate(self.filters):
+            arrays[f"bloom_{level}"] = bloom.bits
+            arrays[f"count_{level}"] = np.array([bloom.count], dtype=np.int64)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, day: str, kind: str, payload: bytes) -> "DedupIndex":
+        arrays = np.load(io.BytesIO(payload), allow_pickle=False)
+        false_positive_rate, initial_capacity = arrays["meta"]
+        index = cls(day, kind, float(false_positive_rate), int(initial_capacity))
+        if kind == "hashset":
+            index.hashes = arrays["hashes"]
+        level = 0
+        while f"bloom_{level}" in arrays.files:
+            index.filters.append(BloomFilter(
+                index.initial_capacity * 2 ** level,
+                index.false_positive_rate / 2 ** (level + 1),
+                bits=arrays[f"bloom_{level}"],
+                count=int(arrays[f"count_{level}"][0]),
+            ))
+            level += 1
+        return index
+
+    @classmethod
+    def load(cls, storage: S3Storage, day: str, kind: str = "bloom", false_positive_rate: float = 0.001,
+             initial_capacity: int = 1_000_000) -> "DedupIndex":
+        """Reads the day's index from MinIO, or starts an empty one if there is none yet."""
+        key = generate_dedup_index_key(day, kind)
+        try:
+            payload = storage.download_bytes(key)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            payload = b""
+        if not payload:
+            return cls(day, kind, false_positive_rate, initial_capacity)
+        index = cls.from_bytes(day, kind, payload)
+        logger.info(f"Loaded {kind} dedup index for {day} with {len(index)} event(s)")
+        return index
+
+    def save(self, storage: S3Storage) -> str:
+        key = generate_dedup_index_key(self.day, self.kind)
+        storage.upload_fileobj(io.BytesIO(self.to_bytes()), key)
+        return key
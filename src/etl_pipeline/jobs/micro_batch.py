@@ -0,0 +1,170 @@
+import argparse
+import logging
+import queue
+import sys
+import threading
+import time
+import pandas as pd
+from src.config import load_config, pipeline_config
+from src.database.watermarks import WatermarkStore
+from src.etl_pipeline import metrics
+from src.etl_pipeline.tasks.load_data import LoadData, LoadMode
+from src.etl_pipeline.tasks.transform_data import TransformData
+from src.etl_pipeline.utils import S3Storage
+
+logger = logging.getLogger(__name__)
+
+# Watermark stage of the runner; its partition is the tailed prefix (at most 32 characters)
+WATERMARK_STAGE = "stream"
+
+# Put on the queue by the poller when it stops, after its last object
+_DONE = object()
+
+class MicroBatchRunner:
+    """
+    Tails new raw objects under a prefix and loads them in small batches.
+
+    A poller thread lists the bucket for keys sorting after the last one it saw, transforms each
+    new object and puts the frame on a bounded queue. When the queue is full the poller blocks, so
+    a slow database holds back the reads instead of filling memory. The calling thread buffers the
+    frames and bulk-loads them once `max_records` rows or `max_seconds` have accumulated. After each
+    load commits, the stream watermark moves to the batch's last key; a restart resumes from there.
+    """
+
+    def __init__(self, prefix: str = None, poll_seconds: float = None, max_records: int = None,
+                 max_seconds: float = None, queue_size: int = None, storage: S3Storage = None,
+                 transformer: TransformData = None, loader: LoadData = None, watermarks: WatermarkStore = None):
+        pipeline = pipeline_config()
+        self.prefix = prefix or pipeline["STREAM_PREFIX"]
+        self.poll_seconds = poll_seconds if poll_seconds is not None else pipeline["STREAM_POLL_SECONDS"]
+        self.max_records = max_records or pipeline["STREAM_MAX_RECORDS"]
+        self.max_seconds = max_seconds if max_seconds is not None else pipeline["STREAM_MAX_SECONDS"]
+        self.queue = queue.Queue(maxsize=queue_size or pipeline["STREAM_QUEUE_SIZE"])
+        self.storage = storage or S3Storage(load_config()["MINIO_BUCKET"])
+        self.transformer = transformer or TransformData()
+        self.loader = loader or LoadData(mode=LoadMode.BULK)
+        self.watermarks = watermarks or WatermarkStore()
+        self._stop = threading.Event()
+        self._consuming = threading.Event()
+        self._error = None
+        # Times the poller found the queue full and had to wait
+        self.backpressure_waits = 0
+
+    def stop(self):
+        """Asks the runner to load what it has buffered and return."""
+        self._stop.set()
+
+    def _put(self, item, force: bool = False) -> bool:
+        """Blocks while the queue is full. Gives up once stopped, or for `force`, once nobody consumes."""
+        waited = False
+        while True:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not waited:
+                    self.backpressure_waits += 1
+                    waited = True
+                if not self._consuming.is_set() or (self._stop.is_set() and not force):
+                    return False
+
+    def _poll(self, start_after: str, until_idle: bool):
+        """Poller thread: transforms every new object under the prefix, in key order."""
+        last_key = start_after
+        try:
+            while not self._stop.is_set():
+                keys = self.storage.list_keys(self.prefix, start_after=last_key)
+                for key in keys:
+                    df = self.transformer.transform_payload(self.storage.download_bytes(key))
+                    if not self._put((key, df)):
+                        return
+                    last_key = key
+                if not keys:
+                    if until_idle:
+                        return
+                    self._stop.wait(self.poll_seconds)
+        except Exception as e:
+            logger.exception(f"Polling {self.prefix} failed: {e}")
+            self._error = e
+        finally:
+            self._put(_DONE, force=True)
+
+    def _flush(self, keys: list, frames: list) -> dict:
+        """Loads one micro-batch, then moves the stream watermark past its objects."""
+        with metrics.StageMetrics("micro_batch") as stage:
+            # Objects without valid records still advance the watermark
+            batch = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            summary = self.loader.load_frame(batch)
+            self.watermarks.advance(WATERMARK_STAGE, self.prefix, last_object=keys[-1],
+                                    max_timestamp=summary["max_timestamp"])
+            stage.add(rows_in=len(batch), rows_out=summary["rows"])
+            stage.count("objects", len(keys))
+            stage.count("backpressure_waits", self.backpressure_waits)
+        self.backpressure_waits = 0
+        logger.info(f"Loaded micro-batch of {len(keys)} object(s) up to {keys[-1]}: {summary['rows']} row(s)")
+        return stage.record()
+
+    def run(self, max_batches: int = None, until_idle: bool = False) -> list:
+        """
+        Runs until stop() is called, `max_batches` batches are loaded, or, with `until_idle`, a
+        listing finds nothing new. Returns the metrics record of every batch. Errors of the poller
+        are raised here after the buffered batch is loaded.
+        """
+        start_after = self.watermarks.get(WATERMARK_STAGE, self.prefix).get("last_object")
+        logger.info(f"Tailing {self.prefix} after {start_after or 'the beginning'}: batches of "
+                    f"{self.max_records} rows or {self.max_seconds}s, up to {self.queue.maxsize} objects queued")
+        self._consuming.set()
+        poller = threading.Thread(target=self._poll, args=(start_after, until_idle), daemon=True)
+        poller.start()
+
+        records, keys, frames, rows, opened = [], [], [], 0, None
+        try:
+            while max_batches is None or len(records) < max_batches:
+                timeout = self.poll_seconds
+                if keys:
+                    timeout = max(0.0, self.max_seconds - (time.monotonic() - opened))
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is _DONE:
+                    if keys:
+                        records.append(self._flush(keys, frames))
+                    break
+                if item is not None:
+                    key, df = item
+                    if not keys:
+                        opened = time.monotonic()
+                    keys.append(key)
+                    if not df.empty:
+                        frames.append(df)
+                        rows += len(df)
+                if keys and (rows >= self.max_records or time.monotonic() - opened >= self.max_seconds):
+                    records.append(self._flush(keys, frames))
+                    keys, frames, rows = [], [], 0
+        finally:
+            # Objects still queued are not past the watermark, so the next run picks them up again
+            self._stop.set()
+            self._consuming.clear()
+            poller.join()
+        if self._error is not None:
+            raise self._error
+        return records
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Continuously load new raw objects in micro-batches.")
+    parser.add_argument("--prefix", default=None, help="key prefix to tail (default: STREAM_PREFIX)")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches")
+    parser.add_argument("--until-idle", action="store_true", help="stop once no new objects are found")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    runner = MicroBatchRunner(prefix=args.prefix)
+    try:
+        runner.run(max_batches=args.max_batches, until_idle=args.until_idle)
+    except KeyboardInterrupt:
+        logger.info("Interrupted. Objects not yet loaded are picked up by the next run.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,267 @@
 import logging
+from datetime import datetime
+from src.config import load_config, pipeline_config
+from src.database.models.base import get_engine
+from src.database.partitions import apply_retention
+from src.database.stage_state import StageStateStore
+from src.database.watermarks import WatermarkStore
+from src.etl_pipeline import metrics
+from src.etl_pipeline.utils import (
+    S3Storage, DataType, FileFormat, current_partition, generate_s3_prefix, generate_part_key,
+    generate_manifest_key, load_manifest, fingerprint,
+)
 from src.etl_pipeline.tasks.ingest_data import IngestData
 from src.etl_pipeline.tasks.transform_data import TransformData
 from src.etl_pipeline.tasks.load_data import LoadData
 
 logger = logging.getLogger(__name__)
 
-def run_ingest():
-    """Ingest raw data from source to staging."""
-    logger.info("Starting the ingestion job...")
-    ingest_data = IngestData()
-    ingest_data.ingest_raw_data()
+def _after(keys: list, watermark: dict) -> list:
+    """Keys sorting after the watermark's last processed object (all keys if there is none)."""
+    last_object = watermark.get("last_object")
+    return [key for key in keys if not last_object or key > last_object]
+
+def _unchanged_output(stage_name: str, ds: str, input_hash: str, storage: S3Storage, force: bool = False):
+    """
+    The output manifest of the stage's last successful run for day `ds` if that run saw the same
+    input fingerprint and the manifest still exists, else None: the stage has to run.
+    """
+    if force or input_hash is None:
+        return None
+    state = StageStateStore().get(stage_name, current_partition(ds))
+    if state.get("input_hash") != input_hash or storage.get_json(state["output"]) is None:
+        return None
+    return state["output"]
+
+def run_ingest(ds: str = None, force: bool = False) -> dict:
+    """
+    Ingest raw data from source to staging.
+    `ds` is the logical date (YYYY-MM-DD) whose partition is written; Airflow passes it per run.
+    With SKIP_UNCHANGED, local inputs identical to the last successful run's are not uploaded
+    again unless `force` is set. Returns the stage's metrics record, with the raw manifest key the
+    run wrote or reused as `output` (None when there was nothing to ingest).
+    """
+    with metrics.StageMetrics("ingest", ds) as stage:
+        output = _ingest(stage, ds, force)
+    return {**stage.record(), "output": output}
+
+def _ingest(stage: metrics.StageMetrics, ds: str = None, force: bool = False):
+    logger.info(f"Starting the ingestion job for {current_partition(ds)}...")
+    ingest_data = IngestData(logical_date=ds)
+
+    input_hash = ingest_data.input_fingerprint() if pipeline_config()["SKIP_UNCHANGED"] else None
+    output = _unchanged_output("ingest", ds, input_hash, ingest_data.storage, force)
+    if output:
+        logger.info(f"Local inputs unchanged since the last ingest. Reusing s3://{ingest_data.bucket_name}/{output}")
+        stage.count("skipped")
+        return output
+
+    if pipeline_config()["INCREMENTAL"]:
+        store, partition = WatermarkStore(), current_partition(ds)
+        manifest = ingest_data.ingest_raw_data(watermark=store.get("ingest", partition))
+        if manifest:
+            store.advance("ingest", partition, **manifest["watermark"])
+    else:
+        manifest = ingest_data.ingest_raw_data()
+
+    if not manifest:
+        logger.warning("Ingest produced no manifest; the inputs are not recorded as processed.")
+        return None
+
+    # An incremental ingest lists the parts it uploaded; a full one uploaded every part
+    uploaded = set(manifest["new_parts"]) if "new_parts" in manifest else None
+    parts = [part for part in manifest["parts"] if uploaded is None or part["key"] in uploaded]
+    stage.count("parts", len(parts))
+    # Record counts are known only for parts split locally; whole files are uploaded unread
+    if parts and all("records" in part for part in parts):
+        records = sum(part["records"] for part in parts)
+        stage.add(rows_in=records, rows_out=records)
+    stage.count("executed")
+    # Only a completed ingest is recorded, so a failed one is retried even for unchanged inputs
+    if input_hash:
+        StageStateStore().record("ingest", current_partition(ds), input_hash, ingest_data.manifest_key)
     logger.info("Ingestion job completed.")
+    return ingest_data.manifest_key
+
+def _list_raw_keys(storage: S3Storage, ds: str = None) -> list:
+    """Raw parts of the day: from the ingest manifest, else whatever sits under the day's prefix."""
+    manifest = load_manifest(storage, generate_manifest_key(DataType.RAW, logical_date=ds))
+    if manifest:
+        return [part["key"] for part in manifest["parts"]]
+    return storage.list_keys(generate_s3_prefix(DataType.RAW, logical_date=ds))
+
+def _raw_fingerprint(storage: S3Storage, raw_keys: list, processed_format: FileFormat, ds: str = None):
+    """Fingerprint of a transform's inputs: the raw keys with their ETags, and the output format. None if unknown."""
+    etags = storage.list_etags(generate_s3_prefix(DataType.RAW, logical_date=ds))
+    if not raw_keys or any(key not in etags for key in raw_keys):
+        return None
+    return fingerprint({"raw": [[key, etags[key]] for key in raw_keys], "format": processed_format.value})
+
+def run_transform(ds: str = None, force: bool = False) -> dict:
+    """
+    Transform the raw data of logical date `ds` (default: today) and save the processed result.
+    With SKIP_UNCHANGED, raw objects identical to the last successful run's are not transformed
+    again unless `force` is set. Returns the stage's metrics record, with the processed manifest key
+    the run wrote or reused as `output` (None when there was nothing new to transform).
+    """
+    with metrics.StageMetrics("transform", ds) as stage:
+        output = _transform(stage, ds, force)
+    return {**stage.record(), "output": output}
+
+def _transform(stage: metrics.StageMetrics, ds: str = None, force: bool = False):
+    logger.info(f"Starting the transformation job for {current_partition(ds)}...")
+    pipeline = pipeline_config()
+    processed_format = FileFormat(pipeline["PROCESSED_FORMAT"])
+    storage = S3Storage(load_config()["MINIO_BUCKET"])
+    raw_keys = _list_raw_keys(storage, ds)
+
+    input_hash = _raw_fingerprint(storage, raw_keys, processed_format, ds) if pipeline["SKIP_UNCHANGED"] else None
+    output = _unchanged_output("transform", ds, input_hash, storage, force)
+    if output:
+        logger.info(f"Raw inputs unchanged since the last transform. Reusing s3://{storage.bucket_name}/{output}")
+        stage.count("skipped")
+        return output
+
+    existing_parts = []
+    if pipeline["INCREMENTAL"]:
+        store, partition = WatermarkStore(), current_partition(ds)
+        raw_keys = _after(raw_keys, store.get("transform", partition))
+        if not raw_keys:
+            logger.info("No new raw parts since the last transform. Nothing to do.")
+            return None
+        manifest = load_manifest(storage, generate_manifest_key(DataType.PROCESSED, processed_format, ds))
+        existing_parts = (manifest or {}).get("parts", [])
 
-def run_transform():
-    """Transform raw data and save the processed result."""
-    logger.info("Starting the transformation job...")
-    transform_data = TransformData()
-    transformed_df = transform_data.transform()
-    transform_data.save_to_json(transformed_df)
-    logger.info("Transformation job completed and saved to JSON.")
-
-def run_load():
-    """Load transformed data into PostgreSQL database."""
-    logger.info("Starting the loading job to PostgreSQL...")
-    loader = LoadData()
-    loader.load()
+    transform_data = TransformData(raw_keys=raw_keys or None, logical_date=ds)
+    first_part = len(existing_parts) + 1
+
+    if pipeline["TRANSFORM_MODE"] == "parallel":
+        results = transform_data.transform_parallel(first_part=first_part)
+        new_parts = [
+            {"key": r["key"], "rows": r["rows"], "raw_key": r["raw_key"], "seconds": r["seconds"]}
+            for r in results if r["key"]
+        ]
+    else:
+        if pipeline["INCREMENTAL"]:
+            # Never overwrite earlier output of the day; append a new part instead
+            transform_data.processed_key = generate_part_key(DataType.PROCESSED, first_part, processed_format, ds)
+        if pipeline["TRANSFORM_MODE"] == "streaming":
+            rows = transform_data.transform_streaming()
+        else:
+            transformed_df = transform_data.transform()
+            transform_data.save_processed(transformed_df)
+            rows = len(transformed_df)
+        new_parts = [{"key": transform_data.processed_key, "rows": rows}] if rows else []
+
+    transform_data.write_manifest(existing_parts + new_parts)
+    stage.add(rows_in=transform_data.rows_in, rows_out=sum(part["rows"] for part in new_parts))
+    stage.count("parts", len(new_parts))
+    for path, count in transform_data.timestamp_paths.items():
+        stage.count(f"timestamp_{path}", count)
+    if pipeline["INCREMENTAL"]:
+        store.advance("transform", partition, last_object=max(raw_keys))
+    stage.count("executed")
+    if input_hash:
+        StageStateStore().record("transform", current_partition(ds), input_hash, transform_data.processed_manifest_key)
+    logger.info(f"Transformation job completed; {len(new_parts)} new processed part(s) "
+                f"listed in {transform_data.processed_manifest_key}.")
+    return transform_data.processed_manifest_key
+
+def run_load(ds: str = None) -> dict:
+    """
+    Load the processed data of logical date `ds` (default: today) into PostgreSQL database.
+    Returns the stage's metrics record.
+    """
+    with metrics.StageMetrics("load", ds) as stage:
+        _load(stage, ds)
+    return stage.record()
+
+def _pending_load(ds: str = None):
+    """
+    Processed keys of logical date `ds` still to be loaded, or None when there is nothing to do.
+    An empty key list means the day has no manifest: load the default key.
+    """
+    pipeline = pipeline_config()
+    storage = S3Storage(load_config()["MINIO_BUCKET"])
+    processed_format = FileFormat(pipeline["PROCESSED_FORMAT"])
+    manifest = load_manifest(storage, generate_manifest_key(DataType.PROCESSED, processed_format, ds))
+    processed_keys = [part["key"] for part in manifest["parts"]] if manifest else []
+    if manifest and not processed_keys:
+        logger.info("Processed manifest lists no parts. Nothing to load.")
+        return None
+
+    if pipeline["INCREMENTAL"]:
+        processed_keys = _after(processed_keys, WatermarkStore().get("load", current_partition(ds)))
+        if not processed_keys:
+            logger.info("No new processed parts since the last load. Nothing to do.")
+            return None
+    return processed_keys
+
+def _finish_load(ds: str, processed_keys: list, max_timestamp):
+    """Advances the load watermark past the loaded keys and applies partition retention."""
+    pipeline = pipeline_config()
+    if pipeline["INCREMENTAL"]:
+        WatermarkStore().advance("load", current_partition(ds), last_object=max(processed_keys),
+                                 max_timestamp=max_timestamp)
+
+    if pipeline["FACT_RETENTION_PERIODS"] > 0:
+        with get_engine().begin() as connection:
+            apply_retention(connection)
+
+def _load(stage: metrics.StageMetrics, ds: str = None):
+    logger.info(f"Starting the loading job to PostgreSQL for {current_partition(ds)}...")
+    processed_keys = _pending_load(ds)
+    if processed_keys is None:
+        return
+
+    loader = LoadData(processed_keys=processed_keys or None, logical_date=ds)
+    summary = loader.load()
+    stage.add(rows_in=loader.rows_read, rows_out=summary["rows"])
+    _finish_load(ds, processed_keys, summary["max_timestamp"])
     logger.info("Data load to PostgreSQL completed.")
+
+# The same load split into Airflow tasks: prepare_load_shards resolves the dimensions once, a task
+# mapped over the shard numbers runs run_load_shard, and finish_load_shards advances the watermark.
+# The plan returned by prepare_load_shards travels between them through XCom, so it is JSON.
+
+def prepare_load_shards(ds: str = None, shards: int = None) -> dict:
+    """
+    Fixes the processed keys to load, upserts their dimensions and writes the rows of each of the
+    `shards` (default LOAD_SHARDS) user shards to its own object. Returns the plan for the shard and
+    finish tasks: the processed keys, the shard keys, the row count and max timestamp, and this
+    step's metrics record.
+    """
+    plan = {"processed_keys": [], "shard_keys": [], "rows": 0, "max_timestamp": None}
+    with metrics.StageMetrics("load_prepare", ds) as stage:
+        logger.info(f"Preparing the sharded load to PostgreSQL for {current_partition(ds)}...")
+        processed_keys = _pending_load(ds)
+        if processed_keys is not None:
+            loader = LoadData(processed_keys=processed_keys or None, logical_date=ds)
+            summary = loader.prepare_shards(shards)
+            stage.add(rows_in=loader.rows_read, rows_out=summary["rows"])
+            plan.update(processed_keys=loader.processed_keys, shard_keys=summary["shard_keys"], rows=summary["rows"],
+                        max_timestamp=summary["max_timestamp"].isoformat() if summary["max_timestamp"] else None)
+    plan["metrics"] = stage.record()
+    return plan
+
+def run_load_shard(shard: int, plan: dict, ds: str = None) -> dict:
+    """Loads the facts of user shard `shard` from the object a prepared plan wrote for it."""
+    shard_keys = plan.get("shard_keys", [])
+    shard_key = shard_keys[shard] if shard < len(shard_keys) else None
+    with metrics.StageMetrics(f"load_shard_{shard}", ds) as stage:
+        if shard_key:
+            loader = LoadData(logical_date=ds)
+            summary = loader.load_shard(shard, shard_key)
+            stage.add(rows_in=loader.rows_read, rows_out=summary["rows"])
+        else:
+            logger.info("Nothing to load for this shard.")
+    return stage.record()
+
+def finish_load_shards(plan: dict, ds: str = None) -> dict:
+    """Runs once every shard of the plan is loaded: advances the watermark and applies retention."""
+    with metrics.StageMetrics("load_finish", ds) as stage:
+        if plan["processed_keys"]:
+            max_timestamp = datetime.fromisoformat(plan["max_timestamp"]) if plan["max_timestamp"] else None
+            _finish_load(ds, plan["processed_keys"], max_timestamp)
+            logger.info("Sharded data load to PostgreSQL completed.")
+    return stage.record()
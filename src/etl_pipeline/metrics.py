@@ -0,0 +1,182 @@
+import contextvars
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import psutil
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.config import pipeline_config, logger
+
+# Totals every stage reports, in record order
+AMOUNTS = ("rows_in", "rows_out", "bytes_read", "bytes_written", "db_round_trips")
+
+_current = contextvars.ContextVar("etl_stage_metrics", default=None)
+
+class PeakRSS:
+    """Samples the process's resident set size in a background thread while the block runs."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._done = threading.Event()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+class StageMetrics:
+    """
+    Measures one pipeline stage: wall time, rows in/out, bytes read/written, DB round trips, peak
+    RSS and named counters. While the block runs it is the current stage of its context, so S3
+    transfers and SQL statements anywhere below add themselves to it; on exit the record is emitted.
+    """
+
+    def __init__(self, stage: str, ds: str = None, emit: bool = True):
+        self.stage = stage
+        self.ds = ds
+        self.emit = emit
+        self.amounts = dict.fromkeys(AMOUNTS, 0)
+        self.counters = {}
+        self.status = None
+        self.seconds = 0.0
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._memory = PeakRSS(interval=0.05)
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, value in amounts.items():
+                self.amounts[name] += int(value)
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def record(self) -> dict:
+        """JSON-serializable summary; this is what the DAG tasks push to XCom."""
+        with self._lock:
+            return {
+                "stage": self.stage,
+                "ds": self.ds,
+                "status": self.status,
+                "started_at": self.started_at,
+                "seconds": round(self.seconds, 3),
+                **self.amounts,
+                "peak_rss_bytes": self._memory.peak,
+                "counters": dict(self.counters),
+            }
+
+    def __enter__(self):
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._token = _current.set(self)
+        self._memory.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._started
+        self._memory.__exit__(exc_type, exc, tb)
+        _current.reset(self._token)
+        self.status = "failed" if exc_type else "success"
+        if self.emit:
+            emit(self.record())
+
+def add(**amounts):
+    """Adds to the current stage's totals; a no-op outside a stage."""
+    stage = _current.get()
+    if stage is not None:
+        stage.add(**amounts)
+
+def count(name: str, value: int = 1):
+    """Adds to one of the current stage's named counters; a no-op outside a stage."""
+    stage = _current.get()
+    if stage is not None:
+        stage.count(name, value)
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit that runs `fn` in the submitting context, so worker threads report to its stage."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_round_trip(conn, cursor, statement, parameters, context, executemany):
+    # An executemany counts once, although psycopg2 may send it as several pages
+    add(db_round_trips=1)
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_]", "_", name)
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_statsd(record: dict, prefix: str) -> list:
+    """StatsD lines: a run counter per status, the duration as a timer, totals as counters, peak RSS as a gauge."""
+    base = f"{_metric_name(prefix)}.{_metric_name(record['stage'])}"
+    lines = [f"{base}.runs.{record['status']}:1|c", f"{base}.seconds:{round(record['seconds'] * 1000)}|ms"]
+    lines += [f"{base}.{name}:{record[name]}|c" for name in AMOUNTS]
+    lines.append(f"{base}.peak_rss_bytes:{record['peak_rss_bytes']}|g")
+    lines += [f"{base}.{_metric_name(name)}:{value}|c" for name, value in sorted(record["counters"].items())]
+    return lines
+
+def to_openmetrics(record: dict, prefix: str) -> str:
+    """OpenMetrics text exposition of one stage record, labelled by stage, ds and status."""
+    base = f"{_metric_name(prefix)}_stage"
+    labels = f'stage="{_label(record["stage"])}",ds="{_label(record["ds"] or "")}",status="{record["status"]}"'
+    lines = []
+    for name in ("seconds",) + AMOUNTS + ("peak_rss_bytes",):
+        lines += [f"# TYPE {base}_{name} gauge", f"{base}_{name}{{{labels}}} {record[name]}"]
+    if record["counters"]:
+        lines.append(f"# TYPE {base}_counter gauge")
+        lines += [f'{base}_counter{{{labels},name="{_label(name)}"}} {value}'
+                  for name, value in sorted(record["counters"].items())]
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+def send_statsd(lines: list, host: str, port: int):
+    """Fire-and-forget UDP, one datagram per line."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for line in lines:
+            sock.sendto(line.encode("utf-8"), (host, port))
+
+def write_textfile(text: str, directory: str, name: str) -> str:
+    """Atomically replaces <directory>/<name>.prom, as node_exporter's textfile collector expects."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.prom")
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    with os.fdopen(fd, "w") as handle:
+        handle.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+def emit(record: dict):
+    """
+    Logs the record as one JSON line and sends it to StatsD and/or the OpenMetrics text file when
+    configured. Metrics are best effort: a failing sink is logged and never fails the stage.
+    """
+    pipeline = pipeline_config()
+    prefix = pipeline["METRICS_PREFIX"]
+    logger.info(f"Stage metrics: {json.dumps(record, default=str)}")
+    try:
+        if pipeline["METRICS_STATSD_HOST"]:
+            send_statsd(to_statsd(record, prefix), pipeline["METRICS_STATSD_HOST"], pipeline["METRICS_STATSD_PORT"])
+        if pipeline["METRICS_TEXTFILE_DIR"]:
+            write_textfile(to_openmetrics(record, prefix), pipeline["METRICS_TEXTFILE_DIR"],
+                           f"{_metric_name(prefix)}_{_metric_name(record['stage'])}")
+    except Exception as e:
+        logger.warning(f"Failed to emit metrics for stage {record['stage']}: {e}")
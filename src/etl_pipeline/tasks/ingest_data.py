@@ -1,39 +1,190 @@
-from src.config  import load_config, logger
-from src.etl_pipeline.utils import get_s3_client, generate_s3_key, DataType
+from src.config  import load_config, pipeline_config, logger
+from src.etl_pipeline.utils import (
+    get_s3_client, current_partition, generate_s3_key, generate_part_key, generate_manifest_key, DataType, S3Storage,
+    AsyncS3Storage, iter_json_records, write_manifest, load_manifest, file_digest, fingerprint,
+)
+import glob
+import json
 import os
+import tempfile
 import botocore.exceptions
 
 class IngestData:
     """Class to handle ingestion of local files to MinIO bucket."""
 
-    def __init__(self):
+    def __init__(self, logical_date=None):
         config = load_config()
         self.bucket_name = config["MINIO_BUCKET"]
-        self.local_file_path = config["RAW_LOCAL_FILE"]
+        # "{ds}" in RAW_LOCAL_FILE selects a per-day source, e.g. /data/logs/{ds}/*.json
+        self.local_file_path = config["RAW_LOCAL_FILE"].replace("{ds}", current_partition(logical_date))
         self.s3_client = get_s3_client()
-        self.object_key = generate_s3_key(data_type=DataType.RAW)
+        self.storage = S3Storage(self.bucket_name, self.s3_client)
+        # The day whose raw/ prefix receives the upload (Airflow's `ds` in scheduled and backfill runs)
+        self.logical_date = logical_date
+        self.object_key = generate_s3_key(data_type=DataType.RAW, logical_date=logical_date)
+        self.manifest_key = generate_manifest_key(DataType.RAW, logical_date=logical_date)
 
-    def ingest_raw_data(self):
-        """Upload the local file to MinIO, creating bucket if missing."""
+        pipeline = pipeline_config()
+        self.part_max_bytes = pipeline["INGEST_PART_MAX_BYTES"]
+        self.upload_workers = pipeline["INGEST_UPLOAD_WORKERS"]
+
+    def _resolve_input_files(self) -> list:
+        """
+        Expands RAW_LOCAL_FILE, which may be a single file, a directory of *.json / *.jsonl / *.ndjson
+        files or a glob.
+        """
+        path = self.local_file_path
+        if os.path.isdir(path):
+            files = [f for pattern in ("*.json", "*.jsonl", "*.ndjson") for f in glob.glob(os.path.join(path, pattern))]
+        elif any(ch in path for ch in "*?["):
+            files = glob.glob(path)
+        else:
+            files = [path] if os.path.exists(path) else []
+        return sorted(f for f in files if os.path.isfile(f))
+
+    def input_fingerprint(self) -> str:
+        """
+        Fingerprint of what an ingest would upload: every input file's name and content hash, and
+        the part size, which decides how the files are cut into parts.
+        """
+        files = self._resolve_input_files()
+        return fingerprint({
+            "files": [[path, file_digest(path)] for path in files],
+            "part_max_bytes": self.part_max_bytes,
+        })
+
+    def _split_file(self, path: str, workdir: str, skip: int = 0) -> tuple:
+        """
+        Re-chunks one JSON array or NDJSON file into local JSON array part files of at most
+        part_max_bytes each (a single record larger than the limit gets a part of its own; 0 means no limit).
+        The first `skip` records are left out. Returns the parts and the file's total record count.
+        """
+        max_bytes = self.part_max_bytes or float("inf")
+        parts = []
+        out, size, records, seen = None, 0, 0, 0
+
+        def close_part():
+            out.write(b"\n]")
+            out.close()
+            parts[-1].update(bytes=os.path.getsize(parts[-1]["local_path"]), records=records)
+
+        with open(path, "rb") as source:
+            for record in iter_json_records(source):
+                seen += 1
+                if seen <= skip:
+                    continue
+                encoded = json.dumps(record).encode("utf-8")
+                if out is not None and size + len(encoded) + 4 > max_bytes:
+                    close_part()
+                    out = None
+                if out is None:
+                    local_path = os.path.join(workdir, f"part-{len(os.listdir(workdir)):05d}.json")
+                    out = open(local_path, "wb")
+                    out.write(b"[\n")
+                    parts.append({"local_path": local_path, "source": path})
+                    size, records = 2, 0
+                else:
+                    out.write(b",\n")
+                out.write(encoded)
+                size += len(encoded) + 2
+                records += 1
+        if out is not None:
+            close_part()
+        return parts, seen
+
+    def _plan_parts(self, files: list, workdir: str) -> list:
+        """
+        Decides which local files become which objects. A single unsplit file keeps the
+        classic raw_logs.json key; anything else is numbered raw_logs-00001.json, ...
+        """
+        parts = []
+        for path in files:
+            if self.part_max_bytes and os.path.getsize(path) > self.part_max_bytes:
+                parts.extend(self._split_file(path, workdir)[0])
+            else:
+                parts.append({"local_path": path, "source": path, "bytes": os.path.getsize(path)})
+
+        if len(parts) == 1 and parts[0]["local_path"] == files[0]:
+            parts[0]["key"] = self.object_key
+        else:
+            for number, part in enumerate(parts, start=1):
+                part["key"] = generate_part_key(DataType.RAW, number, logical_date=self.logical_date)
+        return parts
+
+    def _upload_parts(self, parts: list):
+        """Uploads all parts concurrently; each upload may itself be multipart."""
+        logger.info(f"Uploading {len(parts)} part(s), {self.upload_workers} at a time")
+        storage = AsyncS3Storage(self.storage, self.upload_workers)
+        storage.run(storage.upload_files([(part["local_path"], part["key"]) for part in parts]))
+        for part in parts:
+            logger.info(f"Uploaded {part['source']} -> s3://{self.bucket_name}/{part['key']}")
+
+    def _write_manifest(self, parts: list) -> dict:
+        """Writes the manifest that lets transform and load fan out over the day's parts."""
+        return write_manifest(self.storage, self.manifest_key, [
+            {key: part[key] for key in ("key", "bytes", "records", "source") if key in part}
+            for part in parts
+        ])
+
+    def _ingest_incremental(self, files: list, watermark: dict) -> dict:
+        """
+        Uploads only what lies past the watermark: files sorting after `last_object`, plus the
+        records of `last_object` beyond `last_offset` (log files are treated as append-only).
+        New parts are numbered after the ones already in the day's manifest and appended to it.
+        """
+        last_object = watermark.get("last_object")
+        last_offset = watermark.get("last_offset") or 0
+        existing_parts = (load_manifest(self.storage, self.manifest_key) or {}).get("parts", [])
+
+        new_parts = []
+        position = {"last_object": last_object, "last_offset": last_offset}
+        with tempfile.TemporaryDirectory() as workdir:
+            for path in files:
+                if last_object and path < last_object:
+                    continue
+                skip = last_offset if path == last_object else 0
+                parts, total = self._split_file(path, workdir, skip=skip)
+                new_parts.extend(parts)
+                position = {"last_object": path, "last_offset": total}
+
+            for number, part in enumerate(new_parts, start=len(existing_parts) + 1):
+                part["key"] = generate_part_key(DataType.RAW, number, logical_date=self.logical_date)
+            self._upload_parts(new_parts)
+
+        logger.info(f"Incremental ingest: {len(new_parts)} new part(s) past {last_object}@{last_offset}")
+        manifest = self._write_manifest(existing_parts + new_parts)
+        # Not stored in the manifest: the caller persists the new position in the watermark store
+        manifest["new_parts"] = [part["key"] for part in new_parts]
+        manifest["watermark"] = position
+        return manifest
+
+    def ingest_raw_data(self, watermark: dict = None):
+        """
+        Upload the local file(s) to MinIO as one or more parts, creating bucket if missing.
+        With a watermark ({"last_object", "last_offset"}, possibly empty) only new data is uploaded.
+        """
         try:
             logger.info(f"Checking for file at {self.local_file_path}")
-            if not os.path.exists(self.local_file_path):
+            files = self._resolve_input_files()
+            if not files:
                 raise FileNotFoundError(f"File does not exist: {self.local_file_path}")
-            
+
             # Check and create bucket
-            buckets = [b['Name'] for b in self.s3_client.list_buckets()['Buckets']]
-
-            if self.bucket_name not in buckets:
-                self.s3_client.create_bucket(Bucket=self.bucket_name)
-                logger.info(f"Created bucket: {self.bucket_name}")
-                        
-            logger.info(f"Uploading to s3://{self.bucket_name}/{self.object_key}")
-            self.s3_client.upload_file(self.local_file_path, self.bucket_name, self.object_key)
+            self.storage.ensure_bucket()
+
+            if watermark is not None:
+                return self._ingest_incremental(files, watermark)
+
+            with tempfile.TemporaryDirectory() as workdir:
+                parts = self._plan_parts(files, workdir)
+                self._upload_parts(parts)
+            manifest = self._write_manifest(parts)
             logger.info("Upload successful")
+            return manifest
 
         except botocore.exceptions.ClientError as e:
             logger.error(f"MinIO Client error: {e}")
             raise
         except Exception as e:
             logger.exception(f"Upload failed: {e}")
-
+            raise
@@ -1,122 +1,420 @@
 import pandas as pd
+import numpy as np
 import io
-from src.config import load_config, logger
-from src.database.models.base import SessionLocal
+import pyarrow.parquet as pq
+from enum import Enum
+from sqlalchemy import insert
+from src.config import load_config, pipeline_config, logger
+from src.database.models.base import SessionLocal, get_engine
+from src.database.bulk import bulk_load, find_loaded_events, loaded_event_mask
+from src.database.sharding import load_dimensions, load_shard, sharded_load, split_by_user
+from src.database.partitions import ensure_partitions
+from src.database.rollups import record_new_facts, update_rollups
+from src.database.cache import DimensionCache
 from src.database.models.dim_users import DimUser
 from src.database.models.dim_actions import DimAction
 from src.database.models.fact_user_actions import FactUserAction
-from src.etl_pipeline.utils import get_s3_client, generate_s3_key, DataType
+from src.etl_pipeline.utils import (
+    get_s3_client, generate_s3_key, generate_quarantine_key, generate_shard_key, DataType, FileFormat, S3Storage,
+    AsyncS3Storage, compact_dtypes, to_processed_arrow,
+)
+from src.etl_pipeline import metrics
+from src.etl_pipeline.decoders import RawDecoder, decode_records
+from src.etl_pipeline.dedup import DedupIndex, event_key_hashes
 from src.etl_pipeline.tasks.quality_checks import run_data_quality_checks
 from botocore.exceptions import ClientError
 
+class LoadMode(Enum):
+    """Enum to select how processed rows are written to PostgreSQL."""
+    ORM = "orm"    # per-row ORM lookups and inserts
+    BULK = "bulk"  # COPY into a temp table, then set-based merge
+    SHARDED = "sharded"  # bulk merge of dimensions, then facts in concurrent per-user-hash shards
+
 class LoadData:
-    """Class to load processed JSON data from S3 into PostgreSQL database."""
+    """Class to load processed JSON or Parquet data from S3 into PostgreSQL database."""
 
-    def __init__(self):
+    def __init__(self, mode: LoadMode = None, processed_keys: list = None, logical_date=None):
         config = load_config()
         self.bucket_name = config["MINIO_BUCKET"]
-        self.processed_key = generate_s3_key(DataType.PROCESSED)
+        pipeline = pipeline_config()
+        self.processed_format = FileFormat(pipeline["PROCESSED_FORMAT"])
+        self.json_decoder = RawDecoder(pipeline["RAW_DECODER"])
+        self.logical_date = logical_date
+        self.processed_key = generate_s3_key(DataType.PROCESSED, self.processed_format, logical_date)
+        self.processed_keys = processed_keys or [self.processed_key]
         self.s3_client = get_s3_client()
+        self.storage = S3Storage(self.bucket_name, self.s3_client)
+        self.object_concurrency = pipeline["S3_OBJECT_CONCURRENCY"]
+
+        self.mode = mode or LoadMode(pipeline["LOAD_MODE"])
+        self.user_cache = DimensionCache(DimUser, "user_id", "user_id", max_size=pipeline["DIM_CACHE_MAX_SIZE"])
+        self.action_cache = DimensionCache(DimAction, "action_type", "action_id", max_size=pipeline["DIM_CACHE_MAX_SIZE"])
+        self.preload_actions = pipeline["DIM_CACHE_PRELOAD_ACTIONS"]
+        self.quarantine_rejected = pipeline["DQ_QUARANTINE"]
+        # "off", "bloom" or "hashset": persistent per-day index of events already loaded
+        self.dedup_index = pipeline["DEDUP_INDEX"]
+        self.dedup_false_positive_rate = pipeline["DEDUP_FALSE_POSITIVE_RATE"]
+        self.dedup_initial_capacity = pipeline["DEDUP_INITIAL_CAPACITY"]
+        self.rollups = pipeline["ROLLUPS"]
+        self.shards = pipeline["LOAD_SHARDS"]
+        self.parquet_compression = pipeline["PARQUET_COMPRESSION"]
+        # The ORM load inserts new facts in executemany pages of this many rows
+        self.insert_page_rows = max(1, pipeline["LOAD_INSERT_PAGE_ROWS"])
+        # ... and logs its progress every this many facts inserted (0: never)
+        self.log_every_rows = pipeline["LOAD_LOG_EVERY_ROWS"]
+        # Processed rows read by the last load(), before quality checks and dedup
+        self.rows_read = 0
 
-    def _read_processed_json(self) -> pd.DataFrame:
+    def _read_processed(self, processed_key: str = None) -> pd.DataFrame:
         """
-        Reads processed JSON data from an S3 (MinIO) bucket and loads it into a DataFrame.
+        Reads processed JSON or Parquet data from an S3 (MinIO) bucket and loads it into a DataFrame.
         """
+        processed_key = processed_key or self.processed_key
         try:
-            logger.info(f"Reading raw data from s3://{self.bucket_name}/{self.processed_key}")
+            logger.info(f"Reading processed data from s3://{self.bucket_name}/{processed_key}")
             
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.processed_key)
-            body = response.get("Body")
+            return self._decode_processed(processed_key, self.storage.download_bytes(processed_key))
 
-            if body is None:
-                logger.error("No content found in S3 object body.")
-                return pd.DataFrame()
+        except (ClientError, ValueError) as e:
+            logger.error(f"Failed to read or parse {self.processed_format.name} from S3: {e}")
+            raise
+        except Exception as e:
+            logger.exception(f"Unexpected error while reading from S3: {e}")
+            raise
 
-            raw_data = body.read()
+    def _decode_processed(self, processed_key: str, raw_data: bytes) -> pd.DataFrame:
+        """Decodes one downloaded processed object (JSON or Parquet) into a DataFrame."""
+        if not raw_data:
+            logger.error(f"No content found in S3 object body of {processed_key}.")
+            return pd.DataFrame()
 
-            df = pd.read_json(io.BytesIO(raw_data), lines=False)
+        if self.processed_format is FileFormat.PARQUET:
+            df = pd.read_parquet(io.BytesIO(raw_data))
+        else:
+            # Timestamps are parsed explicitly in load(); the processed zone always holds ISO 8601 UTC
+            df = decode_records(raw_data, self.json_decoder)
 
-            if df.empty:
-                logger.warning("Loaded DataFrame is empty.")
-                return pd.DataFrame()
+        if df.empty:
+            logger.warning("Loaded DataFrame is empty.")
+            return pd.DataFrame()
 
-            logger.info(f"Successfully loaded {len(df)} records into DataFrame")
-            return df
+        logger.info(f"Successfully loaded {len(df)} records into DataFrame")
+        return df
 
-        except (ClientError, ValueError) as e:
-            logger.error(f"Failed to read or parse JSON from S3: {e}")
-            raise
+    def _read_processed_objects(self) -> list:
+        """
+        Reads every processed part, S3_OBJECT_CONCURRENCY at a time, decoding each one while the
+        next ones are still downloading. Returns one DataFrame per key, in key order.
+        """
+        if len(self.processed_keys) == 1:
+            return [self._read_processed(self.processed_keys[0])]
+        logger.info(f"Reading {len(self.processed_keys)} processed objects, {self.object_concurrency} at a time")
+        storage = AsyncS3Storage(self.storage, self.object_concurrency)
+        try:
+            return storage.run(storage.read_objects(self.processed_keys, self._decode_processed))
         except Exception as e:
-            logger.exception(f"Unexpected error while reading from S3: {e}")
+            logger.exception(f"Failed to read processed data from S3: {e}")
             raise
 
-    def load(self):
+    def quarantine(self, rejected: pd.DataFrame) -> str:
         """
-        Loads processed user action data into PostgreSQL using SQLAlchemy ORM.
+        Writes rows rejected by the data quality rules, with their `dq_reasons`, to a quarantine object.
         """
-        
-        logger.info("Starting data load to PostgreSQL")
+        key = generate_quarantine_key(self.logical_date)
+        try:
+            payload = rejected.to_json(orient="records", date_format="iso", date_unit="s").encode("utf-8")
+            self.storage.upload_fileobj(io.BytesIO(payload), key)
+            logger.info(f"Quarantined {len(rejected)} rejected row(s) to s3://{self.bucket_name}/{key}")
+            return key
+        except ClientError as e:
+            logger.error(f"Failed to write quarantine object {key}: {e}")
+            raise
 
-        df = self._read_processed_json()
-        logger.info(f"Retrieved {len(df)} records from processed S3 file")
+    def _drop_loaded_events(self, data: pd.DataFrame) -> tuple:
+        """
+        Drops events that are already in fact_user_actions before they reach the loader.
+
+        Each event day's dedup index flags candidates that may have been loaded; only those are
+        checked exactly against PostgreSQL, in one set-based query. Events the index has never seen
+        still go through the loader's own duplicate handling, so a stale index cannot cause duplicates.
+        Returns the remaining rows, the index updates to apply once they are loaded, and counters.
+        """
+        hashes = event_key_hashes(data)
+        days = data["timestamp"].dt.floor("D").to_numpy()
+
+        candidates = np.zeros(len(data), dtype=bool)
+        indexes = {}
+        for day in np.unique(days):
+            rows = days == day
+            index = DedupIndex.load(self.storage, pd.Timestamp(day).strftime("%Y-%m-%d"), self.dedup_index,
+                                    self.dedup_false_positive_rate, self.dedup_initial_capacity)
+            candidates[rows] = index.might_contain(hashes[rows])
+            indexes[day] = index
+
+        loaded = np.zeros(len(data), dtype=bool)
+        if candidates.any():
+            loaded[candidates] = find_loaded_events(get_engine(), data[candidates])
+
+        keep = ~loaded
+        pending = [(index, hashes[keep & (days == day)]) for day, index in indexes.items()]
+        stats = {
+            "candidates": int(candidates.sum()),
+            "dropped": int(loaded.sum()),
+            "false_positives": int((candidates & ~loaded).sum()),
+        }
+        logger.info(f"Dedup index ({self.dedup_index}): {stats}")
+        return data[keep], pending, stats
+
+    def _record_loaded_events(self, pending: list):
+        """Adds the just-loaded events to their day's dedup index and saves it."""
+        for index, hashes in pending:
+            if len(hashes):
+                index.add(hashes)
+                key = index.save(self.storage)
+                logger.info(f"Dedup index for {index.day} now holds {len(index)} event(s) at {key}")
+
+    def _validated_batch(self, quarantine: bool = True) -> tuple:
+        """
+        Reads every processed part and runs the data quality checks, quarantining rejected rows.
+        Returns (passed rows, quality summary); the summary is None when there was nothing to read.
+        """
+        frames = self._read_processed_objects()
+        # Parts concatenated with different categories fall back to object columns; compact once after
+        df = compact_dtypes(frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True))
+        self.rows_read = len(df)
+        logger.info(f"Retrieved {len(df)} records from {len(frames)} processed S3 object(s)")
 
         if df.empty:
-            logger.warning("No data to load. Aborting.")
-            return
+            return df, None
 
         try:
-            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+            # Parquet parts arrive typed already; only JSON parts carry ISO 8601 strings
+            if not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+                df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601", utc=True, errors="coerce")
         except Exception as e:
             logger.error(f"Failed to parse timestamp column: {e}")
             raise
+        return self._check_quality(df, quarantine)
+
+    def _check_quality(self, df: pd.DataFrame, quarantine: bool = True) -> tuple:
+        """Runs the data quality checks, quarantining rejected rows. Returns (passed rows, quality summary)."""
+        data, rejected, quality = run_data_quality_checks(df)
+        quality["quarantine_key"] = None
+        if not rejected.empty and self.quarantine_rejected and quarantine:
+            quality["quarantine_key"] = self.quarantine(rejected)
+        return data, quality
+
+    def load(self) -> dict:
+        """
+        Loads processed user action data into PostgreSQL using the configured load mode.
+        Returns the number of rows loaded, their max timestamp and the data quality summary.
+        """
+        logger.info("Starting data load to PostgreSQL")
+        data, quality = self._validated_batch()
+        if quality is None:
+            logger.warning("No data to load. Aborting.")
+            return {"rows": 0, "max_timestamp": None, "quality": None}
+        return self._load_checked(data, quality)
+
+    def load_frame(self, df: pd.DataFrame) -> dict:
+        """
+        Loads an in-memory batch that already went through TransformData, e.g. one micro-batch of
+        the streaming runner: quality checks, quarantine and load, as load() does for S3 parts.
+        """
+        self.rows_read = len(df)
+        if df.empty:
+            return {"rows": 0, "max_timestamp": None, "quality": None}
+        data, quality = self._check_quality(compact_dtypes(df))
+        return self._load_checked(data, quality)
 
-        # Run data quality checks
-        data = run_data_quality_checks(df)
+    def _load_checked(self, data: pd.DataFrame, quality: dict) -> dict:
+        """Drops already loaded events (with the dedup index) and loads the rest of a checked batch."""
         if data.empty:
             logger.warning("Data after quality checks is empty. Skipping load.")
-            return
+            return {"rows": 0, "max_timestamp": None, "quality": quality}
+
+        pending = []
+        if self.dedup_index != "off":
+            data, pending, quality["dedup"] = self._drop_loaded_events(data)
+            for name, value in quality["dedup"].items():
+                metrics.count(f"dedup_{name}", value)
+            if data.empty:
+                logger.info("Every event was already loaded. Nothing to load.")
+                return {"rows": 0, "max_timestamp": None, "quality": quality}
         
+        self.load_dataframe(data)
+        self._record_loaded_events(pending)
+        return {"rows": len(data), "max_timestamp": data["timestamp"].max().to_pydatetime(), "quality": quality}
+
+    def load_dataframe(self, data: pd.DataFrame):
+        """
+        Writes an already validated DataFrame to PostgreSQL using the configured load mode.
+        """
+        if self.mode is LoadMode.BULK:
+            self._load_bulk(data)
+        elif self.mode is LoadMode.SHARDED:
+            self._load_sharded(data)
+        else:
+            self._load_orm(data)
+
+    def _load_bulk(self, data: pd.DataFrame):
+        """
+        Stages the batch with COPY and merges it with set-based statements in one transaction.
+        """
+        try:
+            counts = bulk_load(get_engine(), data, self.rollups)
+            logger.info(f"Bulk load into PostgreSQL completed: {counts}")
+            for name in ("rows_staged", "users_inserted", "actions_inserted", "facts_inserted"):
+                metrics.count(name, counts[name])
+            return counts
+        except Exception as e:
+            logger.exception(f"Failed during bulk DB load process: {e}")
+            raise
+
+    def _load_sharded(self, data: pd.DataFrame):
+        """
+        Resolves the batch's dimensions in one transaction, then inserts its facts as `shards`
+        concurrent transactions partitioned by user_id.
+        """
+        try:
+            counts = sharded_load(get_engine(), data, self.shards, self.rollups)
+            for name in ("rows_staged", "users_inserted", "actions_inserted", "facts_inserted", "shards", "retries"):
+                metrics.count(name, counts[name])
+            return counts
+        except Exception as e:
+            logger.exception(f"Failed during sharded DB load process: {e}")
+            raise
+
+    def prepare_shards(self, shards: int = None) -> dict:
+        """
+        First step of a load run as separate shard tasks: validates the batch, quarantines rejected
+        rows, upserts all of its dimensions and writes each user shard's rows to its own object.
+        Returns the rows to load, their max timestamp and the shard keys (None for an empty shard).
+        """
+        shards = shards or self.shards
+        logger.info("Preparing sharded load: resolving dimensions")
+        if self.dedup_index != "off":
+            logger.warning("Shard tasks do not use the dedup index; every event is checked in PostgreSQL instead")
+        data, quality = self._validated_batch()
+        if data.empty:
+            logger.warning("No data to load after quality checks.")
+            return {"rows": 0, "max_timestamp": None, "quality": quality, "shard_keys": []}
+        try:
+            counts = load_dimensions(get_engine(), data)
+        except Exception as e:
+            logger.exception(f"Failed to resolve dimensions: {e}")
+            raise
+        metrics.count("users_inserted", counts["users_inserted"])
+        metrics.count("actions_inserted", counts["actions_inserted"])
+        return {"rows": len(data), "max_timestamp": data["timestamp"].max().to_pydatetime(), "quality": quality,
+                "shard_keys": self._write_shards(data, shards)}
+
+    def _write_shards(self, data: pd.DataFrame, shards: int) -> list:
+        """
+        Writes the validated rows of each user shard as Parquet, so a shard task reads only its own
+        rows. Returns the key of every shard, in shard order; None where a shard has no rows.
+        """
+        keys = []
+        for shard, part in enumerate(split_by_user(data, shards)):
+            if part.empty:
+                keys.append(None)
+                continue
+            key = generate_shard_key(shard, self.logical_date)
+            with io.BytesIO() as buffer:
+                pq.write_table(to_processed_arrow(part), buffer, compression=self.parquet_compression)
+                buffer.seek(0)
+                self.storage.upload_fileobj(buffer, key)
+            keys.append(key)
+        logger.info(f"Wrote {sum(key is not None for key in keys)} non-empty shard(s) of {len(data)} rows")
+        return keys
+
+    def load_shard(self, shard: int, shard_key: str) -> dict:
+        """
+        Inserts the facts of one user shard, after prepare_shards has resolved the dimensions and
+        written the shard's validated rows to `shard_key` (None: the shard has no rows).
+        """
+        part = pd.DataFrame()
+        if shard_key:
+            part = compact_dtypes(pd.read_parquet(io.BytesIO(self.storage.download_bytes(shard_key))))
+        self.rows_read = len(part)
+        logger.info(f"Loading shard {shard}: {len(part)} rows")
+        if part.empty:
+            return {"rows": 0, "facts_inserted": 0}
+        try:
+            counts = load_shard(get_engine(), part, rollups=self.rollups)
+        except Exception as e:
+            logger.exception(f"Failed to load shard {shard}: {e}")
+            raise
+        metrics.count("facts_inserted", counts["facts_inserted"])
+        metrics.count("retries", counts["attempts"] - 1)
+        return {"rows": len(part), "facts_inserted": counts["facts_inserted"]}
+
+    def _plan_facts(self, session, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Resolves the batch's dimensions before any fact is touched: the distinct users and actions
+        are resolved in bulk (see DimensionCache.resolve_many), and their keys are merged onto the
+        rows. Returns the fact rows (user_id, action_id, timestamp) with the event's action_type.
+        """
+        # A new user's first row in the batch decides its device and location
+        users = data.drop_duplicates("user_id").set_index("user_id")[["device", "location"]]
+        self.user_cache.resolve_many(session, data["user_id"], attributes=users)
+        action_ids = self.action_cache.resolve_many(session, data["action_type"])
+
+        actions = pd.DataFrame({"action_type": list(action_ids), "action_id": list(action_ids.values())})
+        facts = data[["user_id", "action_type", "timestamp"]].astype({"action_type": object})
+        facts = facts.merge(actions, on="action_type", how="left", validate="many_to_one")
+        # Rows repeating an event (when DQ_UNIQUE_KEY allows it) load it once
+        return facts.drop_duplicates(["user_id", "action_id", "timestamp"])
+
+    def _load_orm(self, data: pd.DataFrame):
+        """
+        Loads the batch through an ORM session with keys resolved per batch instead of per row:
+        users and actions are looked up and created once for the whole batch, events already in
+        fact_user_actions are found with set-based queries, and new facts are inserted in
+        executemany pages of `insert_page_rows`. DB round trips grow with distinct keys and pages,
+        not with rows. Progress is logged every `log_every_rows` facts inserted.
+        """
         try:
             with SessionLocal() as session:
-                for idx, row in data.iterrows():
-                    logger.info(f"Processing row {idx}: user_id={row['user_id']}, action_type={row['action_type']}")
-                    
-                    # DIM USERS
-                    user = session.query(DimUser).filter_by(user_id=row['user_id']).first()
-                    if not user:
-                        user = DimUser(
-                            user_id=row['user_id'],
-                            device=row['device'] if 'device' in row else None,
-                            location=row['location'] if 'location' in row else None
-                        )
-                        session.add(user)
-                        session.flush()
-
-                    # DIM ACTIONS
-                    action = session.query(DimAction).filter_by(action_type=row['action_type']).first()
-                    if not action:
-                        action = DimAction(action_type=row['action_type'])
-                        session.add(action)
-                        session.flush()
-                    
-                    # FACT TABLE
-                    fact_exists = session.query(FactUserAction).filter_by(
-                        user_id=row['user_id'],
-                        action_id=action.action_id,
-                        timestamp=row['timestamp']
-                    ).first()
-
-                    if not fact_exists:
-                        fact = FactUserAction(
-                            user_id=row['user_id'],
-                            action_id=action.action_id,
-                            timestamp=row['timestamp']
-                        )
-                        session.add(fact)
+                ensure_partitions(session, data["timestamp"])
+                if self.preload_actions:
+                    self.action_cache.preload(session)
+                facts = self._plan_facts(session, data)
+
+                # Every event is checked, so a retry of an already committed batch inserts nothing
+                existing = loaded_event_mask(session, facts)
 
+                new = facts.loc[~existing, ["user_id", "action_id", "timestamp"]]
+                new_facts = new.astype({"user_id": object}).to_dict("records")
+                logged = 0
+                for start in range(0, len(new_facts), self.insert_page_rows):
+                    page = new_facts[start:start + self.insert_page_rows]
+                    session.execute(insert(FactUserAction.__table__), page)
+                    done = start + len(page)
+                    if self.log_every_rows and (done - logged >= self.log_every_rows or done == len(new_facts)):
+                        logger.info(f"Inserted {done}/{len(new_facts)} new fact(s)")
+                        logged = done
+
+                if self.rollups:
+                    record_new_facts(session, new_facts)
+                    update_rollups(session)
                 session.commit()
-                logger.info("Successfully loaded all data into PostgreSQL.")
+                logger.info(f"Successfully loaded all data into PostgreSQL: {len(new_facts)} new fact(s) "
+                            f"from {len(data)} row(s).")
+            metrics.count("facts_inserted", len(new_facts))
+            metrics.count("facts_existing", int(existing.sum()))
+            # Rows repeating an event of the same batch, dropped by _plan_facts
+            metrics.count("facts_duplicate", len(data) - len(facts))
+
+            for stats in (self.user_cache.stats(), self.action_cache.stats()):
+                logger.info(f"Dimension cache {stats['table']}: {stats['hits']} of "
+                            f"{stats['hits'] + stats['misses']} distinct key(s) resolved without a query, {stats}")
+                metrics.count(f"cache_{stats['table']}_hits", stats["hits"])
+                metrics.count(f"cache_{stats['table']}_misses", stats["misses"])
 
         except Exception as e:
+            # Keys created in the rolled-back transaction must not outlive it.
+            self.user_cache.invalidate()
+            self.action_cache.invalidate()
             logger.exception(f"Failed during DB load process: {e}")
             raise
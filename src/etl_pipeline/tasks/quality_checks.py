@@ -1,35 +1,128 @@
+import numpy as np
 import pandas as pd
-from src.config import logger
-
-def run_data_quality_checks(df: pd.DataFrame) -> pd.DataFrame:
-        logger.info("Running basic data quality checks...")
-
-        initial_count = len(df)
-        summary = {}
-
-        # Null check
-        null_counts = df.isnull().sum()
-        total_nulls = null_counts.sum()
-        if total_nulls > 0:
-            logger.warning(f"Null values detected:\n{null_counts[null_counts > 0]}")
-            summary["nulls_found"] = int(total_nulls)
-            df = df.dropna()
-            logger.info(f"Dropped rows with nulls. Remaining rows: {len(df)}")
-
-        # Duplicate check
-        duplicate_count = df.duplicated().sum()
-        if duplicate_count > 0:
-            logger.warning(f"Found {duplicate_count} duplicate rows.")
-            summary["duplicates_found"] = int(duplicate_count)
-            df = df.drop_duplicates()
-            logger.info(f"Removed duplicates. Remaining: {len(df)}")
-
-        final_count = len(df)
-        summary["rows_before"] = initial_count
-        summary["rows_after"] = final_count
-        logger.info(f"Data quality check complete. Rows before: {initial_count}, after: {final_count}")
-
-        if summary:
-            logger.debug(f"DQ Summary: {summary}")
-
-        return df
\ No newline at end of file
+from datetime import timedelta
+from src.config import pipeline_config, logger
+from src.etl_pipeline import metrics
+
+REQUIRED_COLUMNS = ["user_id", "action_type", "timestamp", "device", "location"]
+
+class NotNull:
+    """Rejects rows where any of the columns is null (or the column is missing)."""
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self.name = "not_null"
+
+    def violations(self, df: pd.DataFrame) -> np.ndarray:
+        mask = np.zeros(len(df), dtype=bool)
+        for column in self.columns:
+            if column not in df.columns:
+                return np.ones(len(df), dtype=bool)
+            mask |= df[column].isna().to_numpy()
+        return mask
+
+class AllowedValues:
+    """Rejects rows whose column value is not in a fixed set. Nulls are left to NotNull."""
+
+    def __init__(self, column: str, values):
+        self.column = column
+        self.values = set(values)
+        self.name = f"allowed_values:{column}"
+
+    def violations(self, df: pd.DataFrame) -> np.ndarray:
+        values = df[self.column]
+        return (~values.isin(self.values) & values.notna()).to_numpy()
+
+class TimestampRange:
+    """Rejects rows whose timestamp lies outside [min_value, max_value]. Either bound may be None."""
+
+    def __init__(self, column: str = "timestamp", min_value=None, max_value=None):
+        self.column = column
+        self.min_value = pd.Timestamp(min_value, tz="UTC") if min_value is not None else None
+        self.max_value = pd.Timestamp(max_value).tz_convert("UTC") if max_value is not None else None
+        self.name = f"timestamp_range:{column}"
+
+    def violations(self, df: pd.DataFrame) -> np.ndarray:
+        values = df[self.column]
+        mask = np.zeros(len(df), dtype=bool)
+        if self.min_value is not None:
+            mask |= (values < self.min_value).to_numpy()
+        if self.max_value is not None:
+            mask |= (values > self.max_value).to_numpy()
+        return mask
+
+class Unique:
+    """
+    Rejects every repeat of a key among the rows that passed all other rules (the first one is kept).
+    Only the key columns are hashed.
+    """
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self.name = "unique:" + "+".join(self.columns)
+
+    def violations(self, df: pd.DataFrame, rejected: np.ndarray = None) -> np.ndarray:
+        mask = np.zeros(len(df), dtype=bool)
+        candidates = ~rejected if rejected is not None else np.ones(len(df), dtype=bool)
+        mask[candidates] = df.loc[candidates, self.columns].duplicated(keep="first").to_numpy()
+        return mask
+
+def default_rules() -> list:
+    """The rule set applied before loading, configured through the DQ_* settings."""
+    pipeline = pipeline_config()
+    rules = [NotNull(REQUIRED_COLUMNS)]
+    if pipeline["DQ_ALLOWED_ACTION_TYPES"]:
+        rules.append(AllowedValues("action_type", pipeline["DQ_ALLOWED_ACTION_TYPES"]))
+    max_future = pipeline["DQ_MAX_FUTURE_SECONDS"]
+    rules.append(TimestampRange(
+        "timestamp",
+        min_value=pipeline["DQ_MIN_TIMESTAMP"] or None,
+        max_value=pd.Timestamp.now(tz="UTC") + timedelta(seconds=max_future) if max_future >= 0 else None,
+    ))
+    rules.append(Unique(pipeline["DQ_UNIQUE_KEY"]))
+    return rules
+
+def run_data_quality_checks(df: pd.DataFrame, rules: list = None) -> tuple:
+    """
+    Evaluates every rule against the batch and splits it once by the combined reject mask.
+
+    Row-level rules each contribute a boolean mask over just the columns they read; uniqueness rules
+    run last, over the rows still accepted. Returns (passed, rejected, summary): rejected rows carry a
+    `dq_reasons` column naming the rules they broke, and summary holds row and per-rule violation counts.
+    """
+    logger.info("Running data quality checks...")
+    rules = default_rules() if rules is None else rules
+
+    rejected = np.zeros(len(df), dtype=bool)
+    masks = {}
+    for rule in sorted(rules, key=lambda r: isinstance(r, Unique)):
+        if isinstance(rule, Unique):
+            mask = rule.violations(df, rejected)
+        else:
+            mask = rule.violations(df)
+        masks[rule.name] = mask
+        rejected |= mask
+
+    passed_df = df[~rejected]
+    rejected_df = df[rejected]
+    if len(rejected_df):
+        reasons = pd.Series("", index=rejected_df.index)
+        for name, mask in masks.items():
+            broken = mask[rejected]
+            reasons[broken] = reasons[broken] + np.where(reasons[broken] == "", "", ",") + name
+        rejected_df = rejected_df.assign(dq_reasons=reasons)
+
+    summary = {
+        "rows_before": len(df),
+        "rows_after": len(passed_df),
+        "rows_rejected": len(rejected_df),
+        "violations": {name: int(mask.sum()) for name, mask in masks.items()},
+    }
+    metrics.count("dq_rows_checked", summary["rows_before"])
+    metrics.count("dq_rows_rejected", summary["rows_rejected"])
+    for name, violations in summary["violations"].items():
+        metrics.count(f"dq_{name}", violations)
+    if len(rejected_df):
+        logger.warning(f"Data quality rules rejected {len(rejected_df)} row(s): {summary['violations']}")
+    logger.info(f"Data quality check complete. Rows before: {len(df)}, after: {len(passed_df)}")
+    return passed_df, rejected_df, summary
@@ -1,41 +1,75 @@
 import pandas as pd
 import io
-from src.etl_pipeline.utils import get_s3_client, generate_s3_key, DataType
-from src.config  import load_config, logger
+import tempfile
+import time
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from src.etl_pipeline.utils import (
+    get_s3_client, generate_s3_key, generate_part_key, generate_manifest_key, DataType, FileFormat, S3Storage,
+    AsyncS3Storage,
+    iter_json_records, chunked, to_processed_arrow, processed_parquet_writer, write_manifest, compact_dtypes,
+)
+from src.etl_pipeline import metrics
+from src.etl_pipeline.decoders import RawDecoder, decode_records, flatten_metadata
+from src.etl_pipeline.timestamps import TIMESTAMP_PATHS, normalize_timestamps
+from src.config  import load_config, pipeline_config, logger
 from botocore.exceptions import ClientError
 
+def _transform_part(raw_key: str, processed_key: str, logical_date=None) -> dict:
+    """
+    Process-pool worker: transforms one raw object and writes it to its own processed part.
+    Builds its own TransformData (and therefore its own S3 client) inside the worker process.
+    """
+    started = time.perf_counter()
+    transformer = TransformData(raw_keys=[raw_key], logical_date=logical_date)
+    transformer.processed_key = processed_key
+    df = transformer.transform()
+    transformer.save_processed(df)
+    transfers = transformer.storage.transfers
+    return {
+        "raw_key": raw_key,
+        "key": processed_key if not df.empty else None,
+        "rows": len(df),
+        "raw_rows": transformer.rows_in,
+        "bytes_read": sum(t["bytes"] for t in transfers if t["operation"] == "download"),
+        "bytes_written": sum(t["bytes"] for t in transfers if t["operation"] == "upload"),
+        "timestamp_paths": transformer.timestamp_paths,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
 class TransformData:
-    def __init__(self):
+    def __init__(self, raw_keys: list = None, logical_date=None):
         config = load_config()
         self.bucket_name = config["MINIO_BUCKET"]
-        self.raw_key = generate_s3_key(DataType.RAW)
-        self.processed_key = generate_s3_key(DataType.PROCESSED)
+        pipeline = pipeline_config()
+        self.processed_format = FileFormat(pipeline["PROCESSED_FORMAT"])
+        self.parquet_compression = pipeline["PARQUET_COMPRESSION"]
+        self.raw_decoder = RawDecoder(pipeline["RAW_DECODER"])
+        self.logical_date = logical_date
+        self.raw_key = generate_s3_key(DataType.RAW, logical_date=logical_date)
+        # A day ingested in parts lists them in its manifest; otherwise there is one raw object
+        self.raw_keys = raw_keys or [self.raw_key]
+        self.processed_key = generate_s3_key(DataType.PROCESSED, self.processed_format, logical_date)
+        self.processed_manifest_key = generate_manifest_key(DataType.PROCESSED, self.processed_format, logical_date)
+        self.workers = pipeline["TRANSFORM_WORKERS"]
+        self.object_concurrency = pipeline["S3_OBJECT_CONCURRENCY"]
+        # Rows per timestamp parse path, accumulated over everything this instance transformed
+        self.timestamp_paths = dict.fromkeys(TIMESTAMP_PATHS, 0)
+        # Raw records read, likewise accumulated
+        self.rows_in = 0
         self.s3_client = get_s3_client()
+        self.storage = S3Storage(self.bucket_name, self.s3_client)
 
-    def _read_raw_json(self) -> pd.DataFrame:
+    def _read_raw_json(self, raw_key: str = None) -> pd.DataFrame:
         """
         Reads raw JSON data from an S3 (MinIO) bucket and loads it into a DataFrame.
         """
+        raw_key = raw_key or self.raw_key
         try:
-            logger.info(f"Reading raw data from s3://{self.bucket_name}/{self.raw_key}")
-            
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.raw_key)
-            body = response.get("Body")
-
-            if body is None:
-                logger.error("No content found in S3 object body.")
-                return pd.DataFrame()
+            logger.info(f"Reading raw data from s3://{self.bucket_name}/{raw_key}")
 
-            raw_data = body.read()
-
-            df = pd.read_json(io.BytesIO(raw_data), lines=False)
-
-            if df.empty:
-                logger.warning("Loaded DataFrame is empty.")
-                return pd.DataFrame()
-
-            logger.info(f"Successfully loaded {len(df)} records into DataFrame")
-            return df
+            return self._decode_raw(raw_key, self.storage.download_bytes(raw_key))
 
         except (ClientError, ValueError) as e:
             logger.error(f"Failed to read or parse JSON from S3: {e}")
@@ -45,59 +79,223 @@ class TransformData:
             raise
         
 
+    def _decode_raw(self, raw_key: str, raw_data: bytes) -> pd.DataFrame:
+        """Decodes one downloaded raw object into a DataFrame."""
+        if not raw_data:
+            logger.error(f"No content found in S3 object body of {raw_key}.")
+            return pd.DataFrame()
+
+        # JSON array or NDJSON; metadata comes back flattened and timestamps are left as found
+        df = decode_records(raw_data, self.raw_decoder)
+
+        if df.empty:
+            logger.warning("Loaded DataFrame is empty.")
+            return pd.DataFrame()
+
+        logger.info(f"Successfully loaded {len(df)} records into DataFrame")
+        return df
+
+    def _read_raw_objects(self, raw_keys: list) -> list:
+        """
+        Reads several raw objects, S3_OBJECT_CONCURRENCY at a time, decoding each one while the
+        next ones are still downloading. Returns one DataFrame per key, in key order.
+        """
+        if len(raw_keys) == 1:
+            return [self._read_raw_json(raw_keys[0])]
+        logger.info(f"Reading {len(raw_keys)} raw objects, {self.object_concurrency} at a time")
+        storage = AsyncS3Storage(self.storage, self.object_concurrency)
+        return storage.run(storage.read_objects(raw_keys, self._decode_raw))
+
     def transform(self) -> pd.DataFrame:
         """
         Transform raw user action logs:
         - Flatten metadata
         - Filter invalid records
-        - Normalize timestamp to ISO 8601 UTC (YYYY-MM-DDTHH:MM:SSZ)
+        - Normalize timestamp to a UTC datetime64 column (whole seconds)
         - Keep only required fields
         """
         try:
             logger.info("Starting transformation process")
 
-            df = self._read_raw_json()
-            logger.info(f"Raw records loaded: {len(df)}")
+            frames = self._read_raw_objects(self.raw_keys)
+            df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            logger.info(f"Raw records loaded: {len(df)} from {len(frames)} object(s)")
 
             if df.empty:
                 logger.warning("DataFrame is empty. Skipping transformation.")
                 return df
 
-            # Step 1: Flatten metadata if present
-            if 'metadata' in df.columns:
-                logger.info("Flattening metadata column")
-                metadata_df = pd.json_normalize(df['metadata'])
-                df = df.drop(columns=['metadata']).join(metadata_df)
-
-            # Step 2: Remove rows with missing critical fields
-            required_fields = ["user_id", "action_type"]
-            missing_before = df.shape[0]
-            df = df.dropna(subset=required_fields)
-            missing_after = df.shape[0]
-            logger.info(f"Dropped {missing_before - missing_after} rows with missing user_id or action_type")
-
-            # Step 3: Normalize timestamp to UTC ISO 8601 (no microseconds)
-            if "timestamp" in df.columns:
-                df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
-                df = df.dropna(subset=["timestamp"])
-                df["timestamp"] = df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-                logger.info("Timestamp normalized to UTC ISO 8601 format")
-            else:
-                logger.warning("Timestamp column missing. Skipping timestamp normalization.")
-
-            # Step 4: Extract only useful fields
-            useful_fields = ["device", "location"]
-            missing_cols = [col for col in useful_fields if col not in df.columns]
-            for col in missing_cols:
-                df[col] = None  # fill missing columns with None
-
-            logger.info(f"Transformation complete. Final record count: {len(df)}")
+            df = self._transform_frame(df)
+
+            logger.info(f"Transformation complete. Final record count: {len(df)}. "
+                        f"Timestamp parse paths: {self.timestamp_paths}")
             return df
 
         except Exception as e:
             logger.exception(f"Transformation failed: {e}")
             raise
 
+    def transform_payload(self, payload: bytes) -> pd.DataFrame:
+        """Decodes and transforms one raw JSON payload already in memory (a micro-batch object)."""
+        df = decode_records(payload, self.raw_decoder)
+        if df.empty:
+            return df
+        return self._transform_frame(df)
+
+    def _transform_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Applies the flatten/filter/normalize steps to one DataFrame (a whole day or a single chunk).
+        """
+        self.rows_in += len(df)
+
+        # Step 1: Flatten metadata if present
+        if 'metadata' in df.columns:
+            logger.info("Flattening metadata column")
+            df = flatten_metadata(df)
+
+        # Step 2: Remove rows with missing critical fields
+        required_fields = ["user_id", "action_type"]
+        missing_before = df.shape[0]
+        df = df.dropna(subset=required_fields)
+        missing_after = df.shape[0]
+        logger.info(f"Dropped {missing_before - missing_after} rows with missing user_id or action_type")
+
+        # Step 3: Normalize timestamp to UTC (no microseconds); it stays datetime64 until serialized
+        if "timestamp" in df.columns:
+            timestamps, paths = normalize_timestamps(df["timestamp"])
+            for path, count in paths.items():
+                self.timestamp_paths[path] += count
+            df = df.assign(timestamp=timestamps.dt.floor("s"))
+            df = df.dropna(subset=["timestamp"])
+            logger.info(f"Timestamp normalized to UTC. Rows per parse path: {paths}")
+        else:
+            logger.warning("Timestamp column missing. Skipping timestamp normalization.")
+
+        # Step 4: Extract only useful fields
+        useful_fields = ["device", "location"]
+        missing_cols = [col for col in useful_fields if col not in df.columns]
+        for col in missing_cols:
+            df[col] = None  # fill missing columns with None
+
+        # Step 5: Compact dtypes (categoricals and Arrow-backed user ids) for the rest of the pipeline
+        return compact_dtypes(df)
+
+    def transform_streaming(self, chunk_size: int = None, block_size: int = 1 << 20) -> int:
+        """
+        Transforms the raw object chunk by chunk and writes the processed output incrementally.
+
+        The S3 body is read in `block_size` byte blocks and parsed into chunks of `chunk_size`
+        records, so peak memory depends on the chunk size rather than the size of the raw file.
+        Processed chunks are spooled to a local temp file and uploaded once at the end.
+        Returns the number of processed records written.
+        """
+        chunk_size = chunk_size or pipeline_config()["TRANSFORM_CHUNK_SIZE"]
+        try:
+            logger.info(f"Starting streaming transformation of {len(self.raw_keys)} raw object(s) "
+                        f"in chunks of {chunk_size} records")
+
+            def raw_records():
+                for key in self.raw_keys:
+                    body = self.storage.open_stream(key)
+                    if body is None:
+                        logger.error(f"No content found in S3 object body of {key}.")
+                        continue
+                    yield from iter_json_records(body, block_size)
+
+            rows_in = rows_out = 0
+            with tempfile.TemporaryFile() as spool:
+                parquet_writer = None
+                if self.processed_format is FileFormat.PARQUET:
+                    parquet_writer = processed_parquet_writer(spool, self.parquet_compression)
+                else:
+                    spool.write(b"[")
+
+                for records in chunked(raw_records(), chunk_size):
+                    rows_in += len(records)
+                    df = self._transform_frame(pd.DataFrame.from_records(records))
+                    if df.empty:
+                        continue
+                    if parquet_writer:
+                        # Each chunk becomes one row group
+                        parquet_writer.write_table(to_processed_arrow(df))
+                    else:
+                        # Strip the surrounding brackets so chunks concatenate into one JSON array
+                        payload = df.to_json(orient="records", date_format="iso", date_unit="s")[1:-1]
+                        spool.write(("," if rows_out else "").encode("utf-8") + payload.encode("utf-8"))
+                    rows_out += len(df)
+
+                if parquet_writer:
+                    parquet_writer.close()
+                else:
+                    spool.write(b"]")
+
+                logger.info(f"Streaming transformation complete. Records in: {rows_in}, out: {rows_out}. "
+                            f"Timestamp parse paths: {self.timestamp_paths}")
+                if rows_out == 0:
+                    logger.warning("No records left after transformation. Skipping upload.")
+                    return 0
+
+                spool.seek(0)
+                logger.info(f"Saving transformed data to s3://{self.bucket_name}/{self.processed_key}")
+                self.storage.upload_fileobj(spool, self.processed_key)
+
+            logger.info(f"Successfully saved streamed transformation as {self.processed_format.name}")
+            return rows_out
+
+        except Exception as e:
+            logger.exception(f"Streaming transformation failed: {e}")
+            raise
+
+    def transform_parallel(self, workers: int = None, first_part: int = 1) -> list:
+        """
+        Transforms each raw part in its own worker process and writes one processed part per input.
+
+        Each part goes through exactly the same transform/save code as the serial path, so the
+        concatenated parts equal the serial output. Processed parts are numbered from `first_part`.
+        Returns per-part processed keys, row counts and timings (key is None for empty parts).
+        """
+        workers = max(1, min(workers or self.workers, len(self.raw_keys)))
+        jobs = [
+            (raw_key, generate_part_key(DataType.PROCESSED, number, self.processed_format, self.logical_date))
+            for number, raw_key in enumerate(self.raw_keys, start=first_part)
+        ]
+        try:
+            logger.info(f"Starting parallel transformation of {len(jobs)} raw part(s) with {workers} worker(s)")
+            started = time.perf_counter()
+
+            results = []
+            # spawn, not fork: the parent holds boto3/SQLAlchemy pools and logging locks
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                futures = [
+                    pool.submit(_transform_part, raw_key, processed_key, self.logical_date)
+                    for raw_key, processed_key in jobs
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    logger.info(f"Transformed {result['raw_key']}: {result['rows']} rows in {result['seconds']}s")
+                    for path, count in result["timestamp_paths"].items():
+                        self.timestamp_paths[path] += count
+                    # Workers run in other processes, outside the parent's stage metrics
+                    self.rows_in += result["raw_rows"]
+                    metrics.add(bytes_read=result["bytes_read"], bytes_written=result["bytes_written"])
+                    results.append(result)
+
+            results.sort(key=lambda r: self.raw_keys.index(r["raw_key"]))
+            total_rows = sum(r["rows"] for r in results)
+            logger.info(f"Parallel transformation complete: {total_rows} rows from {len(results)} part(s) "
+                        f"in {time.perf_counter() - started:.2f}s. Timestamp parse paths: {self.timestamp_paths}")
+            return results
+
+        except Exception as e:
+            logger.exception(f"Parallel transformation failed: {e}")
+            raise
+
+    def write_manifest(self, parts: list) -> dict:
+        """
+        Records which processed objects make up the day so LoadData reads exactly those.
+        """
+        return write_manifest(self.storage, self.processed_manifest_key, parts)
+
     def save_to_json(self, df):
         """
         Serializes the given DataFrame to JSON and uploads it to MinIO at the processed S3 key.
@@ -109,13 +307,46 @@ class TransformData:
             
             logger.info(f"Saving transformed data to s3://{self.bucket_name}/{self.processed_key}")
             
-            json_bytes = df.to_json(orient='records', lines=False, indent=2).encode("utf-8")
+            # ISO 8601 at second precision, e.g. 2025-07-15T10:15:30Z
+            json_bytes = df.to_json(orient='records', lines=False, indent=2, date_format="iso",
+                                    date_unit="s").encode("utf-8")
 
             with io.BytesIO(json_bytes) as out_buffer:
-                self.s3_client.upload_fileobj(out_buffer, self.bucket_name, self.processed_key)
+                self.storage.upload_fileobj(out_buffer, self.processed_key)
 
             logger.info("Successfully saved transformed data as JSON")
 
         except Exception as e:
             logger.exception(f"Failed to save JSON to S3: {e}")
             raise
+
+    def save_to_parquet(self, df):
+        """
+        Serializes the given DataFrame to Parquet and uploads it to MinIO at the processed S3 key.
+        """
+        try:
+            if df.empty:
+                logger.warning("Attempted to save empty DataFrame. Skipping upload.")
+                return
+
+            logger.info(f"Saving transformed data to s3://{self.bucket_name}/{self.processed_key}")
+
+            with io.BytesIO() as out_buffer:
+                pq.write_table(to_processed_arrow(df), out_buffer, compression=self.parquet_compression)
+                out_buffer.seek(0)
+                self.storage.upload_fileobj(out_buffer, self.processed_key)
+
+            logger.info(f"Successfully saved transformed data as Parquet ({self.parquet_compression})")
+
+        except Exception as e:
+            logger.exception(f"Failed to save Parquet to S3: {e}")
+            raise
+
+    def save_processed(self, df):
+        """
+        Saves the given DataFrame in the configured processed-zone format.
+        """
+        if self.processed_format is FileFormat.PARQUET:
+            self.save_to_parquet(df)
+        else:
+            self.save_to_json(df)
@@ -0,0 +1,82 @@
+import pandas as pd
+from src.config import logger
+
+# Every path a raw timestamp can take; the counts returned by normalize_timestamps use these keys
+TIMESTAMP_PATHS = ("native", "iso", "epoch_s", "epoch_ms", "rfc2822", "fallback", "invalid", "missing")
+
+ISO_PATTERN = r"^\s*\d{4}-\d{2}-\d{2}"
+RFC2822_PATTERN = r"^\s*(?:[A-Za-z]{3},\s*)?\d{1,2}\s+[A-Za-z]{3}\s+\d{4}\s+\d{1,2}:\d{2}:\d{2}"
+RFC2822_FORMAT = "%d %b %Y %H:%M:%S %z"
+
+# Epoch values at or above this are milliseconds: 1e11 seconds lies in the year 5138,
+# while 1e11 milliseconds is March 1973
+EPOCH_MS_THRESHOLD = 1e11
+
+def _parse_epoch(numbers: pd.Series, counts: dict) -> pd.Series:
+    """Parses epoch seconds and epoch milliseconds, telling them apart by magnitude."""
+    millis = numbers.abs() >= EPOCH_MS_THRESHOLD
+    parsed = pd.concat([
+        pd.to_datetime(numbers[~millis], unit="s", utc=True, errors="coerce"),
+        pd.to_datetime(numbers[millis], unit="ms", utc=True, errors="coerce"),
+    ])
+    counts["epoch_s"] += int(parsed[~millis.reindex(parsed.index)].notna().sum())
+    counts["epoch_ms"] += int(parsed[millis.reindex(parsed.index)].notna().sum())
+    return parsed
+
+def _parse_rfc2822(text: pd.Series) -> pd.Series:
+    """Parses RFC 2822 dates ("Tue, 15 Jul 2025 10:15:30 +0200") with one explicit format."""
+    text = (
+        text.str.strip()
+        .str.replace(r"^[A-Za-z]{3},\s*", "", regex=True)
+        .str.replace(r"\s(?:GMT|UTC|UT|Z)$", " +0000", regex=True)
+    )
+    return pd.to_datetime(text, format=RFC2822_FORMAT, utc=True, errors="coerce")
+
+def normalize_timestamps(values: pd.Series) -> tuple:
+    """
+    Parses a raw timestamp column into datetime64[ns, UTC].
+
+    Rather than letting pandas infer a format per element, rows are grouped by the format they
+    look like (ISO 8601, epoch seconds, epoch milliseconds, RFC 2822) and each group is parsed
+    with an explicit vectorized call. Only rows no group could parse go through per-element
+    inference. Returns the parsed column (NaT where unparseable) and the row count of each path.
+    """
+    counts = dict.fromkeys(TIMESTAMP_PATHS, 0)
+    result = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns, UTC]")
+
+    present = values.notna()
+    counts["missing"] = int((~present).sum())
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = pd.to_datetime(values, utc=True)
+        counts["native"] = int(present.sum())
+        return parsed.astype("datetime64[ns, UTC]"), counts
+
+    # Numbers and numeric strings are epochs
+    numbers = pd.to_numeric(values, errors="coerce")
+    is_epoch = present & numbers.notna()
+    if is_epoch.any():
+        result[is_epoch] = _parse_epoch(numbers[is_epoch], counts)
+
+    pending = present & ~is_epoch
+    if pending.any():
+        text = values[pending].astype(str)
+        is_iso = text.str.match(ISO_PATTERN)
+        is_rfc = ~is_iso & text.str.match(RFC2822_PATTERN)
+
+        iso = pd.to_datetime(text[is_iso].str.strip(), format="ISO8601", utc=True, errors="coerce")
+        rfc = _parse_rfc2822(text[is_rfc])
+        counts["iso"] = int(iso.notna().sum())
+        counts["rfc2822"] = int(rfc.notna().sum())
+        result[iso.index] = iso
+        result[rfc.index] = rfc
+
+        # Unrecognized shapes, and recognized ones their explicit format rejected
+        leftover = text[result[text.index].isna()]
+        if not leftover.empty:
+            fallback = pd.to_datetime(leftover, format="mixed", utc=True, errors="coerce")
+            counts["fallback"] = int(fallback.notna().sum())
+            result[fallback.index] = fallback
+
+    counts["invalid"] = int((present & result.isna()).sum())
+    logger.debug(f"Timestamp parse paths: {counts}")
+    return result, counts
@@ -1,26 +1,454 @@
+import asyncio
 import boto3
-from src.config import load_config
-from datetime import datetime, timezone
+import botocore.exceptions
+import codecs
+import hashlib
+import json
+import os
+import threading
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import IO, Iterable, Iterator
+from src.config import load_config, pipeline_config, logger
+from src.etl_pipeline import metrics
+from datetime import date, datetime, timezone
 from enum import Enum
 
 class DataType(Enum):
     """Enum to represent the data processing stage."""
     RAW = "raw"
     PROCESSED = "processed"
+    QUARANTINE = "quarantine"
+    LOAD_SHARDS = "load_shards"
+
+class FileFormat(Enum):
+    """Enum to represent the serialization format of an object in the bucket."""
+    JSON = "json"
+    PARQUET = "parquet"
+
+# Typed schema of the processed zone when stored as Parquet.
+# Low-cardinality string columns are dictionary-encoded.
+PROCESSED_PARQUET_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("action_type", pa.dictionary(pa.int32(), pa.string())),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("device", pa.dictionary(pa.int32(), pa.string())),
+    ("location", pa.dictionary(pa.int32(), pa.string())),
+])
+
+# Low-cardinality columns, carried as pandas categoricals from the transform to the load and
+# stored as dictionary columns in Parquet
+CATEGORICAL_COLUMNS = ["action_type", "device", "location"]
+# Arrow-backed strings: one contiguous buffer per column instead of a Python object per row
+USER_ID_DTYPE = pd.StringDtype("pyarrow")
+
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
 
 def get_s3_client() -> boto3.client:
-    """Create and return a boto3 S3 client configured for MinIO."""
-    config = load_config()
-    return boto3.client(
-        "s3",
-        endpoint_url=config["MINIO_ENDPOINT"],
-        aws_access_key_id=config["MINIO_ACCESS_KEY"],
-        aws_secret_access_key=config["MINIO_SECRET_KEY"],
+    """
+    Return the process-wide boto3 S3 client configured for MinIO, creating it on first use.
+    Clients are keyed by PID so forked workers never share a parent's connection pool.
+    """
+    pid = os.getpid()
+    with _s3_clients_lock:
+        client = _s3_clients.get(pid)
+        if client is None:
+            config = load_config()
+            pipeline = pipeline_config()
+            client = boto3.client(
+                "s3",
+                endpoint_url=config["MINIO_ENDPOINT"],
+                aws_access_key_id=config["MINIO_ACCESS_KEY"],
+                aws_secret_access_key=config["MINIO_SECRET_KEY"],
+                # Enough pooled connections for every concurrent multipart/ranged request
+                config=BotoConfig(max_pool_connections=max(10, pipeline["S3_MAX_CONCURRENCY"],
+                                                            pipeline["S3_OBJECT_CONCURRENCY"])),
+            )
+            _s3_clients.clear()
+            _s3_clients[pid] = client
+    return client
+
+def get_transfer_config() -> TransferConfig:
+    """Build the multipart transfer settings shared by every upload and download."""
+    pipeline = pipeline_config()
+    return TransferConfig(
+        multipart_threshold=pipeline["S3_MULTIPART_THRESHOLD"],
+        multipart_chunksize=pipeline["S3_MULTIPART_CHUNK_SIZE"],
+        max_concurrency=pipeline["S3_MAX_CONCURRENCY"],
+        use_threads=pipeline["S3_MAX_CONCURRENCY"] > 1,
     )
 
-def generate_s3_key(data_type: DataType) -> str:
-    """Generate S3 key path based on the data type and current UTC date."""
-    now = datetime.now(timezone.utc)
+class S3Storage:
+    """
+    Bucket-scoped object I/O on top of the pooled client: tuned multipart uploads,
+    ranged parallel downloads and a bytes/sec record of every transfer.
+    """
+
+    def __init__(self, bucket_name: str, client=None, transfer_config: TransferConfig = None):
+        self.bucket_name = bucket_name
+        self.client = client or get_s3_client()
+        self.transfer_config = transfer_config or get_transfer_config()
+        self.transfers = []
+
+    def _record(self, operation: str, key: str, nbytes: int, started: float) -> dict:
+        seconds = max(time.perf_counter() - started, 1e-9)
+        stats = {
+            "operation": operation,
+            "key": key,
+            "bytes": nbytes,
+            "seconds": round(seconds, 4),
+            "bytes_per_sec": round(nbytes / seconds),
+        }
+        self.transfers.append(stats)
+        metrics.add(**{"bytes_written" if operation == "upload" else "bytes_read": nbytes})
+        logger.info(f"{operation} s3://{self.bucket_name}/{key}: {nbytes} bytes in {seconds:.2f}s "
+                    f"({nbytes / seconds / 2**20:.1f} MiB/s)")
+        return stats
+
+    def ensure_bucket(self):
+        """Create the bucket if it does not exist yet."""
+        buckets = [b['Name'] for b in self.client.list_buckets()['Buckets']]
+        if self.bucket_name not in buckets:
+            self.client.create_bucket(Bucket=self.bucket_name)
+            logger.info(f"Created bucket: {self.bucket_name}")
+
+    def upload_file(self, path: str, key: str) -> dict:
+        """Upload a local file, switching to parallel multipart above the threshold."""
+        started = time.perf_counter()
+        self.client.upload_file(path, self.bucket_name, key, Config=self.transfer_config)
+        return self._record("upload", key, os.path.getsize(path), started)
+
+    def upload_fileobj(self, fileobj: IO[bytes], key: str) -> dict:
+        """Upload a seekable file-like object, switching to parallel multipart above the threshold."""
+        started = time.perf_counter()
+        # Measure up front: s3transfer may close the file object once the upload completes
+        start_pos = fileobj.tell()
+        nbytes = fileobj.seek(0, os.SEEK_END) - start_pos
+        fileobj.seek(start_pos)
+        self.client.upload_fileobj(fileobj, self.bucket_name, key, Config=self.transfer_config)
+        return self._record("upload", key, nbytes, started)
+
+    def put_json(self, key: str, payload) -> dict:
+        """Serialize a small JSON document (e.g. a manifest) and store it in one PUT."""
+        started = time.perf_counter()
+        body = json.dumps(payload, indent=2).encode("utf-8")
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=body, ContentType="application/json")
+        return self._record("upload", key, len(body), started)
+
+    def get_json(self, key: str):
+        """Read a small JSON document, returning None if the object does not exist."""
+        try:
+            response = self.client.get_object(Bucket=self.bucket_name, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        body = response["Body"].read()
+        metrics.add(bytes_read=len(body))
+        return json.loads(body)
+
+    def list_keys(self, prefix: str, start_after: str = None) -> list:
+        """List object keys under a prefix (only those sorting after `start_after`, if given), skipping manifests."""
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        options = {"StartAfter": start_after} if start_after else {}
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, **options):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return sorted(key for key in keys if not key.rsplit("/", 1)[-1].startswith("_"))
+
+    def list_etags(self, prefix: str) -> dict:
+        """ETag of every object under a prefix, by key; an object's ETag changes whenever it is rewritten with new content."""
+        etags = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            etags.update((obj["Key"], obj["ETag"].strip('"')) for obj in page.get("Contents", []))
+        return etags
+
+    def open_stream(self, key: str):
+        """Return the streaming body of an object for incremental reads."""
+        response = self.client.get_object(Bucket=self.bucket_name, Key=key)
+        metrics.add(bytes_read=response.get("ContentLength") or 0)
+        return response.get("Body")
+
+    def download_bytes(self, key: str) -> bytes:
+        """
+        Download an object into memory. The first request fetches one chunk and learns the
+        object size; any remaining chunks are fetched concurrently with ranged GETs.
+        """
+        started = time.perf_counter()
+        chunk_size = self.transfer_config.multipart_chunksize
+        try:
+            first = self.client.get_object(Bucket=self.bucket_name, Key=key, Range=f"bytes=0-{chunk_size - 1}")
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":  # zero-byte object
+                return b""
+            raise
+
+        head = first["Body"].read()
+        content_range = first.get("ContentRange")
+        total = int(content_range.rsplit("/", 1)[1]) if content_range else len(head)
+        if total <= len(head):
+            self._record("download", key, len(head), started)
+            return head
+
+        buffer = bytearray(total)
+        buffer[:len(head)] = head
+
+        def fetch(offset: int):
+            end = min(offset + chunk_size, total) - 1
+            part = self.client.get_object(Bucket=self.bucket_name, Key=key, Range=f"bytes={offset}-{end}")
+            buffer[offset:end + 1] = part["Body"].read()
+
+        workers = max(1, self.transfer_config.max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fetch, range(len(head), total, chunk_size)))
+
+        self._record("download", key, total, started)
+        return bytes(buffer)
+
+class AsyncS3Storage:
+    """
+    asyncio front end of an S3Storage. Each request runs the blocking boto3 call in a worker
+    thread, and a semaphore caps the requests in flight, so many objects transfer at once while
+    payloads that already arrived are parsed.
+    """
+
+    def __init__(self, storage: S3Storage, concurrency: int = None):
+        self.storage = storage
+        self.concurrency = max(1, concurrency or pipeline_config()["S3_OBJECT_CONCURRENCY"])
+        self._limit = asyncio.Semaphore(self.concurrency)
+
+    async def _request(self, fn, *args):
+        # to_thread runs fn in a copy of this context, so transfers count towards the current stage
+        async with self._limit:
+            return await asyncio.to_thread(fn, *args)
+
+    async def download_bytes(self, key: str) -> bytes:
+        return await self._request(self.storage.download_bytes, key)
+
+    async def upload_file(self, path: str, key: str) -> dict:
+        return await self._request(self.storage.upload_file, path, key)
+
+    async def put_json(self, key: str, payload) -> dict:
+        return await self._request(self.storage.put_json, key, payload)
+
+    async def list_keys(self, prefix: str, start_after: str = None) -> list:
+        return await self._request(self.storage.list_keys, prefix, start_after)
+
+    async def read_objects(self, keys: list, parse) -> list:
+        """
+        Downloads every key and returns parse(key, payload) for each, in key order. Parsing runs in a
+        worker thread outside the request limit, so the next downloads start while it runs.
+        """
+        async def read(key: str):
+            payload = await self.download_bytes(key)
+            return await asyncio.to_thread(parse, key, payload)
+        return list(await asyncio.gather(*(read(key) for key in keys)))
+
+    async def upload_files(self, uploads: list) -> list:
+        """Uploads (local path, key) pairs concurrently; returns the transfer stats, in order."""
+        return list(await asyncio.gather(*(self.upload_file(path, key) for path, key in uploads)))
+
+    def run(self, coroutine):
+        """
+        Runs one of this storage's coroutines to completion from synchronous code (a task callable),
+        on a new event loop with enough worker threads for the requests in flight plus parsing.
+        """
+        async def main():
+            self._limit = asyncio.Semaphore(self.concurrency)
+            threads = self.concurrency + (os.cpu_count() or 1)
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+            return await coroutine
+        return asyncio.run(main())
+
+
+def resolve_logical_date(logical_date=None) -> date:
+    """
+    Normalize a logical date (a date, a datetime or Airflow's "YYYY-MM-DD" `ds` string) to a date.
+    Defaults to the current UTC date.
+    """
+    if logical_date is None:
+        return datetime.now(timezone.utc).date()
+    if isinstance(logical_date, datetime):
+        if logical_date.tzinfo is not None:
+            logical_date = logical_date.astimezone(timezone.utc)
+        return logical_date.date()
+    if isinstance(logical_date, date):
+        return logical_date
+    return datetime.strptime(str(logical_date)[:10], "%Y-%m-%d").date()
+
+def current_partition(logical_date=None) -> str:
+    """The day partition (YYYY-MM-DD, UTC) that keys and watermarks are grouped by."""
+    return resolve_logical_date(logical_date).strftime("%Y-%m-%d")
+
+def generate_s3_prefix(data_type: DataType, file_format: FileFormat = FileFormat.JSON, logical_date=None) -> str:
+    """Generate the S3 "directory" holding one day's objects for the data type and file format."""
+    day = resolve_logical_date(logical_date)
     prefix = data_type.value  # "raw" or "processed"
-    filename = f"{prefix}_logs.json"
-    return now.strftime(f"{prefix}/json/%Y/%m/%d/{filename}")
\ No newline at end of file
+    extension = file_format.value  # "json" or "parquet"
+    return day.strftime(f"{prefix}/{extension}/%Y/%m/%d/")
+
+def generate_s3_key(data_type: DataType, file_format: FileFormat = FileFormat.JSON, logical_date=None) -> str:
+    """Generate S3 key path based on the data type, file format and logical date (default: today, UTC)."""
+    filename = f"{data_type.value}_logs.{file_format.value}"
+    return generate_s3_prefix(data_type, file_format, logical_date) + filename
+
+def generate_part_key(data_type: DataType, part_number: int, file_format: FileFormat = FileFormat.JSON,
+                      logical_date=None) -> str:
+    """Generate the key of one numbered part of a day's data, e.g. raw_logs-00001.json."""
+    filename = f"{data_type.value}_logs-{part_number:05d}.{file_format.value}"
+    return generate_s3_prefix(data_type, file_format, logical_date) + filename
+
+def generate_manifest_key(data_type: DataType, file_format: FileFormat = FileFormat.JSON, logical_date=None) -> str:
+    """Generate the key of the manifest listing a day's parts."""
+    return generate_s3_prefix(data_type, file_format, logical_date) + "_manifest.json"
+
+def generate_quarantine_key(logical_date=None) -> str:
+    """Generate a unique key for the rows one load rejected, e.g. quarantine/json/2025/07/15/quarantine_logs-<run>.json."""
+    run = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    return generate_s3_prefix(DataType.QUARANTINE, FileFormat.JSON, logical_date) + f"quarantine_logs-{run}.json"
+
+def generate_shard_key(shard: int, logical_date=None) -> str:
+    """Generate the key of one user shard of a day's validated rows, e.g. load_shards/parquet/2025/07/15/shard-00000.parquet."""
+    return generate_s3_prefix(DataType.LOAD_SHARDS, FileFormat.PARQUET, logical_date) + f"shard-{shard:05d}.parquet"
+
+def generate_dedup_index_key(day, kind: str = "bloom") -> str:
+    """Generate the key of the dedup index of events loaded for one event day."""
+    return resolve_logical_date(day).strftime(f"dedup/{kind}/%Y/%m/%d/_index.npz")
+
+def write_manifest(storage: "S3Storage", key: str, parts: list) -> dict:
+    """Write a manifest listing a day's parts (each a dict with at least "key") and return it."""
+    manifest = {
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "parts": parts,
+        "total_bytes": sum(part.get("bytes", 0) for part in parts),
+    }
+    storage.put_json(key, manifest)
+    logger.info(f"Wrote manifest with {len(parts)} part(s) to s3://{storage.bucket_name}/{key}")
+    return manifest
+
+def load_manifest(storage: "S3Storage", key: str):
+    """Return the parsed manifest at `key`, or None if the day was ingested as a single object."""
+    manifest = storage.get_json(key)
+    if manifest is None:
+        logger.info(f"No manifest at s3://{storage.bucket_name}/{key}")
+    return manifest
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a local file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint(inputs) -> str:
+    """SHA-256 over a JSON-serializable description of a stage's inputs (names, content hashes, settings)."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def canonical_user_ids(user_ids: pd.Series) -> pd.Series:
+    """User ids as USER_ID_DTYPE strings; integer ids read next to nulls come back as floats, so 1.0 becomes "1"."""
+    if pd.api.types.is_float_dtype(user_ids):
+        user_ids = user_ids.astype("Int64")
+    return user_ids.astype(USER_ID_DTYPE)
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the processed columns to their compact dtypes: user_id to Arrow-backed strings and
+    CATEGORICAL_COLUMNS to categoricals. Columns that already have them are left alone.
+    """
+    columns = {}
+    if "user_id" in df.columns and df["user_id"].dtype != USER_ID_DTYPE:
+        columns["user_id"] = canonical_user_ids(df["user_id"])
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            columns[column] = df[column].astype("category")
+    return df.assign(**columns) if columns else df
+
+def to_processed_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert a transformed DataFrame to an Arrow table matching PROCESSED_PARQUET_SCHEMA.
+    ISO 8601 timestamp strings are parsed back into a typed UTC timestamp column.
+    """
+    frame = df.reindex(columns=PROCESSED_PARQUET_SCHEMA.names)
+    timestamps = frame["timestamp"]
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, format="%Y-%m-%dT%H:%M:%SZ", utc=True)
+
+    arrays = []
+    for field in PROCESSED_PARQUET_SCHEMA:
+        column = frame[field.name]
+        if field.name == "timestamp":
+            arrays.append(pa.array(timestamps, type=field.type, from_pandas=True))
+        elif isinstance(column.dtype, pd.CategoricalDtype):
+            # Categories and codes map straight onto the dictionary column
+            arrays.append(pa.array(column, from_pandas=True).cast(field.type))
+        elif pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(column, type=pa.string(), from_pandas=True).dictionary_encode())
+        else:
+            arrays.append(pa.array(canonical_user_ids(column), type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=PROCESSED_PARQUET_SCHEMA)
+
+def processed_parquet_writer(sink, compression: str) -> pq.ParquetWriter:
+    """Open a Parquet writer for the processed schema; each write_table call adds a row group."""
+    return pq.ParquetWriter(sink, PROCESSED_PARQUET_SCHEMA, compression=compression)
+
+def iter_json_records(stream: IO[bytes], block_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Incrementally yield the records of a top-level JSON array, or of newline-delimited JSON
+    objects, read from a byte stream.
+    Only one block plus the record being decoded is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos = "", 0
+    in_array = in_lines = eof = False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+
+        if pos < len(buffer):
+            if not (in_array or in_lines):
+                if buffer[pos] == "{":
+                    in_lines = True
+                elif buffer[pos] == "[":
+                    in_array = True
+                    pos += 1
+                    continue
+                else:
+                    raise ValueError("Expected a top-level JSON array or newline-delimited JSON objects")
+            if in_array and buffer[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield record
+                continue
+        elif eof:
+            if in_array:
+                raise ValueError("Unterminated JSON array")
+            return
+
+        block = stream.read(block_size)
+        if not block:
+            eof = True
+        buffer = buffer[pos:] + utf8.decode(block or b"", final=eof)
+        pos = 0
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of at most `size` items."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
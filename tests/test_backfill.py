@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.etl_pipeline.jobs import backfill
+
+
+def test_date_range_is_inclusive():
+    assert backfill.date_range("2024-02-27", "2024-03-01") == ["2024-02-27", "2024-02-28", "2024-02-29", "2024-03-01"]
+    with pytest.raises(ValueError):
+        backfill.date_range("2024-03-02", "2024-03-01")
+
+
+def test_run_backfill_bounds_parallelism_and_reports_failures():
+    calls, active, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    def stage(name):
+        def run(ds):
+            with lock:
+                calls.append((name, ds))
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            if name == "load" and ds == "2024-01-03":
+                raise RuntimeError("boom")
+        return run
+
+    stages = {name: stage(name) for name in ("ingest", "transform", "load")}
+    with patch.dict(backfill.STAGES, stages):
+        results = backfill.run_backfill("2024-01-01", "2024-01-05", max_parallel_days=2)
+
+    assert [r["ds"] for r in results] == [f"2024-01-0{d}" for d in range(1, 6)]
+    assert [r["status"] for r in results] == ["success", "success", "failed", "success", "success"]
+    assert peak[0] <= 2
+    # ingest is not part of a default backfill; transform always runs before load for a day
+    assert {name for name, _ in calls} == {"transform", "load"}
+    for ds in {ds for _, ds in calls}:
+        assert [name for name, day in calls if day == ds] == ["transform", "load"]
+
+
+def test_run_backfill_rejects_unknown_stage():
+    with pytest.raises(ValueError):
+        backfill.run_backfill("2024-01-01", "2024-01-01", stages=["publish"])
+
+
+def test_run_day_retries_deadlocked_stage():
+    from sqlalchemy.exc import OperationalError
+
+    class Deadlock(Exception):
+        pgcode = "40P01"
+
+    attempts = []
+
+    def load(ds):
+        attempts.append(ds)
+        if len(attempts) == 1:
+            raise OperationalError("INSERT INTO dim_actions ...", {}, Deadlock())
+
+    def transform(ds):
+        return {"counters": {"skipped": 1}, "output": "processed/json/2024/01/01/_manifest.json"}
+
+    with patch.dict(backfill.STAGES, {"transform": transform, "load": load}), patch.object(backfill.time, "sleep"):
+        result = backfill.run_day("2024-01-01", stages=["transform", "load"])
+
+    assert result["status"] == "success"
+    assert result["outputs"] == {"transform": "processed/json/2024/01/01/_manifest.json"}
+    assert attempts == ["2024-01-01", "2024-01-01"]
@@ -0,0 +1,73 @@
+import os
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.database.cache import DimensionCache
+from src.database.models.dim_actions import DimAction
+from src.database.models.dim_users import DimUser
+
+
+def test_cache_evicts_least_recently_used():
+    cache = DimensionCache(DimAction, "action_type", "action_id", max_size=2)
+    cache.put("click", 1)
+    cache.put("view", 2)
+    cache.get("click")
+    cache.put("scroll", 3)
+
+    assert cache.get("view") is None
+    assert cache.get("click") == 1
+    assert cache.get("scroll") == 3
+    assert cache.evictions == 1
+
+
+def test_cache_preload_fills_from_single_query():
+    cache = DimensionCache(DimAction, "action_type", "action_id")
+    session = MagicMock()
+    session.query().all.return_value = [("click", 1), ("view", 2)]
+
+    assert cache.preload(session) == 2
+    assert cache.resolve_many(session, pd.Series(["view", "click"])) == {"view": 2, "click": 1}
+    session.execute.assert_not_called()
+
+
+def test_resolve_many_looks_up_and_inserts_distinct_keys_once():
+    cache = DimensionCache(DimAction, "action_type", "action_id")
+    cache.put("click", 1)
+    session = MagicMock()
+    # "view" exists; "scroll" is inserted and read back
+    session.execute.return_value.fetchall.side_effect = [[("view", 2)], [("scroll", 3)]]
+
+    keys = pd.Series(["click", "view", "scroll", "view", "click", None] * 100, dtype="category")
+    assert cache.resolve_many(session, keys) == {"click": 1, "view": 2, "scroll": 3}
+
+    lookup, insert, read_back = session.execute.call_args_list
+    assert lookup[0][1] == {"keys": ["view", "scroll"]}
+    assert insert[0][1] == [{"action_type": "scroll"}]
+    assert read_back[0][1] == {"keys": ["scroll"]}
+    # Everything is cached now: no further round trips
+    assert cache.resolve_many(session, keys) == {"click": 1, "view": 2, "scroll": 3}
+    assert session.execute.call_count == 3
+
+
+def test_resolve_many_inserts_attributes_of_new_users():
+    cache = DimensionCache(DimUser, "user_id", "user_id")
+    session = MagicMock()
+    session.execute.return_value.fetchall.return_value = []
+    attributes = pd.DataFrame({"device": pd.Categorical(["mobile", None]), "location": ["Berlin", None]},
+                              index=pd.Index(["1", "2"], name="user_id"))
+
+    assert cache.resolve_many(session, pd.Series(["2", "1", "2"]), attributes) == {"1": "1", "2": "2"}
+
+    # Surrogate and natural key are the same column, so nothing is read back
+    assert session.execute.call_count == 2
+    # New keys are inserted in sorted order, whatever their order in the batch
+    assert session.execute.call_args[0][1] == [
+        {"user_id": "1", "device": "mobile", "location": "Berlin"},
+        {"user_id": "2", "device": None, "location": None},
+    ]
@@ -0,0 +1,80 @@
+import gc
+import json
+import threading
+import pandas as pd
+import pytest
+
+from src.etl_pipeline.decoders import Layout, RawDecoder, _gc_paused, decode_records, detect_layout
+
+RECORDS = [
+    {"user_id": 1, "action_type": "login", "timestamp": "2025-07-15T10:15:30Z",
+     "metadata": {"device": "mobile", "location": "Berlin"}},
+    {"user_id": 2, "action_type": "click", "timestamp": "2025-07-15T11:00:00Z", "metadata": None},
+    {"user_id": None, "action_type": "view", "timestamp": "2025-07-15T12:30:00Z",
+     "metadata": {"device": "desktop", "location": "München"}},
+]
+ARRAY = json.dumps(RECORDS, indent=2, ensure_ascii=False).encode("utf-8")
+NDJSON = "\n".join(json.dumps(r, ensure_ascii=False) for r in RECORDS).encode("utf-8") + b"\n"
+
+
+def test_detect_layout():
+    assert detect_layout(b"  \n[{}]") is Layout.ARRAY
+    assert detect_layout(b'\n{"a": 1}\n{"a": 2}') is Layout.NDJSON
+    assert detect_layout(b"  ") is Layout.EMPTY
+    with pytest.raises(ValueError):
+        detect_layout(b'"text"')
+
+
+@pytest.mark.parametrize("decoder", list(RawDecoder))
+@pytest.mark.parametrize("payload", [ARRAY, NDJSON], ids=["array", "ndjson"])
+def test_decoders_agree_and_flatten_metadata(decoder, payload):
+    df = decode_records(payload, decoder)
+
+    assert set(df.columns) == {"user_id", "action_type", "timestamp", "device", "location"}
+    assert list(df["action_type"]) == ["login", "click", "view"]
+    assert list(df["timestamp"]) == [r["timestamp"] for r in RECORDS]
+    assert df.loc[2, "location"] == "München"
+    assert pd.isna(df.loc[1, "device"])
+    assert pd.isna(df.loc[2, "user_id"])
+
+
+def test_arrow_falls_back_on_mixed_types():
+    records = [dict(RECORDS[0]), dict(RECORDS[1], timestamp=1752574530)]
+    payload = "\n".join(json.dumps(r) for r in records).encode("utf-8")
+
+    df = decode_records(payload, RawDecoder.ARROW)
+
+    assert list(df["timestamp"]) == ["2025-07-15T10:15:30Z", 1752574530]
+
+
+def test_empty_payload():
+    assert decode_records(b"", RawDecoder.ORJSON).empty
+
+
+def test_gc_stays_paused_until_the_last_concurrent_decoder_finishes():
+    assert gc.isenabled()
+    first_in, second_in, first_out = threading.Event(), threading.Event(), threading.Event()
+    seen = []
+
+    def first():
+        with _gc_paused():
+            first_in.set()
+            second_in.wait(5)
+        first_out.set()
+
+    def second():
+        first_in.wait(5)
+        with _gc_paused():
+            second_in.set()
+            first_out.wait(5)
+            # The first thread's pause ended, but this one is still decoding
+            seen.append(gc.isenabled())
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert seen == [False]
+    assert gc.isenabled()
@@ -0,0 +1,115 @@
+import os
+import boto3
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from boto3.s3.transfer import TransferConfig
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.etl_pipeline.dedup import BloomFilter, DedupIndex, event_key_hashes
+from src.etl_pipeline.tasks.load_data import LoadData, LoadMode
+from src.etl_pipeline.utils import S3Storage, compact_dtypes
+
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        client = boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test"
+        )
+        client.create_bucket(Bucket="test-bucket")
+        yield client
+
+
+def random_hashes(n: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 2**63, n, dtype=np.int64).astype(np.uint64)
+
+
+def test_event_key_hashes_are_canonical():
+    from_json = pd.DataFrame({"user_id": [1.0, 2.0], "action_type": ["click", "view"],
+                              "timestamp": ["2025-07-15T10:15:30Z", "2025-07-15T11:00:00Z"]})
+    from_parquet = pd.DataFrame({"user_id": ["1", "2"], "action_type": ["click", "view"],
+                                 "timestamp": pd.to_datetime(["2025-07-15T10:15:30Z", "2025-07-15T11:00:00Z"], utc=True)})
+
+    assert (event_key_hashes(from_json) == event_key_hashes(from_parquet)).all()
+    # Compact dtypes must not change the hashes already stored in dedup indexes
+    assert (event_key_hashes(compact_dtypes(from_json)) == event_key_hashes(from_json)).all()
+    assert event_key_hashes(from_json)[0] != event_key_hashes(from_json)[1]
+
+
+def test_bloom_filter_stays_within_false_positive_budget():
+    bloom = BloomFilter(capacity=50_000, false_positive_rate=0.01)
+    members = random_hashes(50_000, seed=1)
+    bloom.add(members)
+
+    assert bloom.might_contain(members).all()
+    assert bloom.might_contain(random_hashes(50_000, seed=2)).mean() < 0.015
+
+
+@pytest.mark.parametrize("kind", ["bloom", "hashset"])
+def test_dedup_index_grows_and_round_trips(kind):
+    index = DedupIndex("2025-07-15", kind, false_positive_rate=0.01, initial_capacity=1_000)
+    members = random_hashes(5_000, seed=3)
+    index.add(members)
+
+    restored = DedupIndex.from_bytes("2025-07-15", kind, index.to_bytes())
+
+    assert len(restored) == 5_000
+    assert restored.might_contain(members).all()
+    assert restored.might_contain(random_hashes(5_000, seed=4)).mean() < 0.01
+    if kind == "bloom":
+        # Capacity doubled along the chain instead of overfilling the first filter
+        assert [f.capacity for f in restored.filters] == [1_000, 2_000, 4_000]
+
+
+def test_dedup_index_load_and_save(s3):
+    storage = S3Storage("test-bucket", s3, TransferConfig())
+    assert len(DedupIndex.load(storage, "2025-07-15", "hashset")) == 0
+
+    index = DedupIndex("2025-07-15", "hashset")
+    index.add(random_hashes(10, seed=5))
+    key = index.save(storage)
+
+    assert key == "dedup/hashset/2025/07/15/_index.npz"
+    assert len(DedupIndex.load(storage, "2025-07-15", "hashset")) == 10
+
+
+PROCESSED_JSON = b"""[
+    {"user_id": 1, "action_type": "click", "timestamp": "2025-07-15T10:15:30Z", "device": "mobile", "location": "Berlin"},
+    {"user_id": 2, "action_type": "scroll", "timestamp": "2025-07-16T10:20:00Z", "device": "desktop", "location": "Hamburg"}
+]"""
+
+
+@patch.dict("os.environ", {"DEDUP_INDEX": "bloom"})
+@patch("src.etl_pipeline.tasks.load_data.bulk_load")
+@patch("src.etl_pipeline.tasks.load_data.find_loaded_events")
+@patch("src.etl_pipeline.tasks.load_data.get_engine")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_reload_drops_indexed_events_before_postgres(mock_load_config, mock_get_s3_client, mock_get_engine,
+                                                      mock_find_loaded, mock_bulk_load, s3):
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    mock_get_s3_client.return_value = s3
+    s3.put_object(Bucket="test-bucket", Key="processed/part.json", Body=PROCESSED_JSON)
+    # The exact check confirms whatever the index flags
+    mock_find_loaded.side_effect = lambda engine, df: np.ones(len(df), dtype=bool)
+
+    first = LoadData(mode=LoadMode.BULK, processed_keys=["processed/part.json"]).load()
+    assert first["rows"] == 2
+    assert first["quality"]["dedup"] == {"candidates": 0, "dropped": 0, "false_positives": 0}
+    mock_find_loaded.assert_not_called()
+    # One index per event day
+    keys = sorted(o["Key"] for o in s3.list_objects_v2(Bucket="test-bucket", Prefix="dedup/")["Contents"])
+    assert keys == ["dedup/bloom/2025/07/15/_index.npz", "dedup/bloom/2025/07/16/_index.npz"]
+
+    second = LoadData(mode=LoadMode.BULK, processed_keys=["processed/part.json"]).load()
+    assert second["rows"] == 0
+    assert second["quality"]["dedup"] == {"candidates": 2, "dropped": 2, "false_positives": 0}
+    assert mock_bulk_load.call_count == 1
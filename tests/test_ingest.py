@@ -1,3 +1,5 @@
+import json
+import boto3
 import pytest
 from unittest.mock import patch, MagicMock
 from src.etl_pipeline.tasks.ingest_data import IngestData
@@ -24,4 +26,78 @@ def test_ingest_success(mock_get_s3_client, tmp_path):
         ingest.ingest_raw_data()
 
         mock_s3.create_bucket.assert_called_once()
-        mock_s3.upload_file.assert_called_once_with(str(file_path), "test-bucket", ingest.object_key)
+        mock_s3.upload_file.assert_called_once_with(
+            str(file_path), "test-bucket", ingest.object_key, Config=ingest.storage.transfer_config
+        )
+
+
+def _write_logs(path, count, start=0):
+    records = [
+        {"user_id": f"user_{i}", "action_type": "click", "timestamp": "2025-07-15T10:15:30Z",
+         "metadata": {"device": "iOS", "location": "Berlin"}}
+        for i in range(start, start + count)
+    ]
+    path.write_text(json.dumps(records, indent=2))
+    return records
+
+
+@pytest.fixture
+def moto_s3():
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        yield boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+
+
+@patch.dict("os.environ", {"INGEST_PART_MAX_BYTES": "2000", "INGEST_UPLOAD_WORKERS": "3"})
+@patch("src.etl_pipeline.tasks.ingest_data.load_config")
+@patch("src.etl_pipeline.tasks.ingest_data.get_s3_client")
+def test_ingest_directory_splits_parts_and_writes_manifest(mock_get_s3_client, mock_config, moto_s3, tmp_path):
+    expected = _write_logs(tmp_path / "a.json", 30) + _write_logs(tmp_path / "b.json", 2, start=30)
+    mock_get_s3_client.return_value = moto_s3
+    mock_config.return_value = {"MINIO_BUCKET": "test-bucket", "RAW_LOCAL_FILE": str(tmp_path)}
+
+    ingest = IngestData()
+    manifest = ingest.ingest_raw_data()
+
+    parts = manifest["parts"]
+    assert len(parts) > 2
+    assert [p["key"].rsplit("/", 1)[1] for p in parts[:2]] == ["raw_logs-00001.json", "raw_logs-00002.json"]
+    assert all(p["bytes"] <= 2000 for p in parts if "records" in p)
+
+    uploaded = []
+    for part in parts:
+        body = moto_s3.get_object(Bucket="test-bucket", Key=part["key"])["Body"].read()
+        assert len(body) == part["bytes"]
+        uploaded.extend(json.loads(body))
+    assert uploaded == expected
+    assert manifest["total_bytes"] == sum(p["bytes"] for p in parts)
+
+    stored = json.loads(moto_s3.get_object(Bucket="test-bucket", Key=ingest.manifest_key)["Body"].read())
+    assert stored == manifest
+
+
+@patch("src.etl_pipeline.tasks.ingest_data.load_config")
+@patch("src.etl_pipeline.tasks.ingest_data.get_s3_client")
+def test_ingest_incremental_uploads_only_records_past_watermark(mock_get_s3_client, mock_config, moto_s3, tmp_path):
+    records = _write_logs(tmp_path / "a.json", 5)
+    mock_get_s3_client.return_value = moto_s3
+    mock_config.return_value = {"MINIO_BUCKET": "test-bucket", "RAW_LOCAL_FILE": str(tmp_path)}
+
+    first = IngestData().ingest_raw_data(watermark={})
+    assert first["watermark"] == {"last_object": str(tmp_path / "a.json"), "last_offset": 5}
+
+    # a.json grows by two records and a new file appears
+    records = _write_logs(tmp_path / "a.json", 7)
+    new_file = _write_logs(tmp_path / "b.json", 1, start=100)
+    second = IngestData().ingest_raw_data(watermark=first["watermark"])
+
+    assert [p["key"] for p in second["parts"][:1]] == [first["parts"][0]["key"]]
+    assert len(second["new_parts"]) == 2
+    assert second["new_parts"][0].endswith("raw_logs-00002.json")
+    uploaded = [json.loads(moto_s3.get_object(Bucket="test-bucket", Key=key)["Body"].read())
+                for key in second["new_parts"]]
+    assert uploaded == [records[5:], new_file]
+    assert second["watermark"] == {"last_object": str(tmp_path / "b.json"), "last_offset": 1}
+
+    third = IngestData().ingest_raw_data(watermark=second["watermark"])
+    assert third["new_parts"] == []
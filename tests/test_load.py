@@ -1,8 +1,10 @@
 import os
 import pytest
 import pandas as pd
+import pyarrow.parquet as pq
 from io import BytesIO
 from unittest.mock import patch, MagicMock, call
+from sqlalchemy.sql.dml import Insert
 
 # Set required env vars before any imports that depend on them
 os.environ["POSTGRES_USER"] = "test"
@@ -11,10 +13,8 @@ os.environ["POSTGRES_HOST"] = "localhost"
 os.environ["POSTGRES_PORT"] = "5432"
 os.environ["POSTGRES_DB"] = "test_db"
 
-from src.database.models.dim_users import DimUser
-from src.database.models.dim_actions import DimAction
-from src.database.models.fact_user_actions import FactUserAction
-from src.etl_pipeline.tasks.load_data import LoadData
+from src.etl_pipeline.tasks.load_data import LoadData, LoadMode
+from src.etl_pipeline.utils import to_processed_arrow
 
 PROCESSED_JSON = """
 [
@@ -40,6 +40,40 @@ def get_mocked_dataframe() -> pd.DataFrame:
     return pd.read_json(BytesIO(PROCESSED_JSON.encode("utf-8")))
 
 
+def orm_session(existing_actions: dict = None, existing_facts: list = None) -> tuple:
+    """
+    A mocked ORM session that answers the loader's set-based statements: dimension lookups
+    (= ANY(:keys)), dimension and fact inserts, and the existing-events check against
+    `existing_facts` (fact rows committed earlier). Returns the session and the rows inserted per table.
+    """
+    actions = dict(existing_actions or {})
+    inserted = {}
+
+    def execute(statement, params=None):
+        result = MagicMock()
+        if isinstance(statement, Insert):
+            rows = params if isinstance(params, list) else [params]
+            inserted.setdefault(statement.table.name, []).extend(rows)
+            if statement.table.name == "dim_actions":
+                for row in rows:
+                    actions.setdefault(row["action_type"], len(actions) + 1)
+        elif "FROM dim_actions WHERE" in str(statement):
+            result.fetchall.return_value = [(key, actions[key]) for key in params["keys"] if key in actions]
+        elif "WITH ORDINALITY" in str(statement):
+            types = {action_id: action_type for action_type, action_id in actions.items()}
+            loaded = {(str(f["user_id"]), types[f["action_id"]], f["timestamp"]) for f in existing_facts or []}
+            events = zip(params["user_ids"], params["action_types"], params["timestamps"])
+            result.fetchall.return_value = [(n,) for n, event in enumerate(events, 1) if event in loaded]
+        else:
+            result.fetchall.return_value = []
+        return result
+
+    session = MagicMock()
+    session.execute.side_effect = execute
+    session.query.return_value.all.return_value = list(actions.items())
+    return session, inserted
+
+
 @patch("src.etl_pipeline.tasks.load_data.SessionLocal")
 @patch("src.etl_pipeline.tasks.load_data.run_data_quality_checks")
 @patch("src.etl_pipeline.tasks.load_data.get_s3_client")
@@ -52,7 +86,7 @@ def test_load_data_to_postgres(
     mock_quality_check,
     mock_session_local,
 ) -> None:
-    """Test that LoadData.load calls session methods and interacts with S3 as expected."""
+    """Test that LoadData.load resolves keys per batch and interacts with S3 as expected."""
     mock_config = {"MINIO_BUCKET": "test-bucket"}
     mock_load_config.return_value = mock_config
     mock_generate_s3_key.return_value = "processed/key.json"
@@ -62,19 +96,23 @@ def test_load_data_to_postgres(
     mock_s3.get_object.return_value = {"Body": BytesIO(PROCESSED_JSON.encode("utf-8"))}
 
     df = get_mocked_dataframe()
-    mock_quality_check.return_value = df
+    mock_quality_check.return_value = (df, df.iloc[:0], {})
 
-    mock_session = MagicMock()
+    mock_session, inserted = orm_session()
     mock_session_local.return_value.__enter__.return_value = mock_session
-    mock_session.query().filter_by().first.side_effect = [None] * 6
 
     loader = LoadData()
+    loader.rollups = False
     loader.load()
 
-    assert mock_session.add.call_count >= 6, "Expected at least 6 session.add() calls"
+    assert {table: len(rows) for table, rows in inserted.items()} == {
+        "dim_users": 2, "dim_actions": 2, "fact_user_actions": 2}
+    assert mock_session.add.call_count == 0, "No per-row ORM objects"
     assert mock_session.commit.call_count == 1, "Expected session.commit() to be called once"
     mock_quality_check.assert_called_once()
-    mock_s3.get_object.assert_called_once_with(Bucket="test-bucket", Key="processed/key.json")
+    mock_s3.get_object.assert_called_once_with(
+        Bucket="test-bucket", Key="processed/key.json", Range=f"bytes=0-{loader.storage.transfer_config.multipart_chunksize - 1}"
+    )
 
 
 @patch("src.etl_pipeline.tasks.load_data.SessionLocal")
@@ -89,7 +127,7 @@ def test_load_data_values_inserted_correctly(
     mock_quality_check,
     mock_session_local,
 ) -> None:
-    """Test that LoadData.load inserts correct DimUser, DimAction, and FactUserAction instances."""
+    """Test that LoadData.load inserts the correct dim_users, dim_actions and fact_user_actions rows."""
     mock_config = {"MINIO_BUCKET": "test-bucket"}
     mock_load_config.return_value = mock_config
     mock_generate_s3_key.return_value = "processed/key.json"
@@ -99,44 +137,188 @@ def test_load_data_values_inserted_correctly(
     mock_s3.get_object.return_value = {"Body": BytesIO(PROCESSED_JSON.encode("utf-8"))}
 
     df = get_mocked_dataframe()
-    mock_quality_check.return_value = df
+    mock_quality_check.return_value = (df, df.iloc[:0], {})
 
-    mock_session = MagicMock()
+    # "scroll" already exists in dim_actions
+    mock_session, inserted = orm_session(existing_actions={"scroll": 7})
     mock_session_local.return_value.__enter__.return_value = mock_session
-    mock_session.query().filter_by().first.side_effect = [None] * 6
 
     loader = LoadData()
+    loader.rollups = False
     loader.load()
 
-    assert mock_session.add.call_count == 6, "Expected exactly 6 add() calls (2 users, 2 actions, 2 facts)"
-
-    # Extract calls by ORM class type
-    dim_users = [c[0][0] for c in mock_session.add.call_args_list if isinstance(c[0][0], DimUser)]
-    dim_actions = [c[0][0] for c in mock_session.add.call_args_list if isinstance(c[0][0], DimAction)]
-    fact_actions = [c[0][0] for c in mock_session.add.call_args_list if isinstance(c[0][0], FactUserAction)]
-
     # Check users data
-    expected_users = [
+    assert inserted["dim_users"] == [
         {"user_id": 1, "device": "mobile", "location": "Berlin"},
         {"user_id": 2, "device": "desktop", "location": "Hamburg"},
     ]
-    for user_obj, expected in zip(dim_users, expected_users):
-        assert user_obj.user_id == expected["user_id"]
-        assert user_obj.device == expected["device"]
-        assert user_obj.location == expected["location"]
-
-    # Check actions data
-    expected_actions = {"click", "scroll"}
-    actual_actions = {a.action_type for a in dim_actions}
-    assert actual_actions == expected_actions
-
-    # Check fact data
-    assert len(fact_actions) == 2
-    for fact_obj, expected_user_id in zip(fact_actions, [1, 2]):
-        assert fact_obj.user_id == expected_user_id
-        # Timestamps should be datetime objects, convert to ISO string for comparison
-        ts_str = fact_obj.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
-        # Match expected timestamps
-        assert ts_str in ["2025-07-15T10:15:30Z", "2025-07-15T10:20:00Z"]
+
+    # Check actions data: only the missing action is inserted
+    assert inserted["dim_actions"] == [{"action_type": "click"}]
+
+    # Check fact data, with the surrogate keys merged onto the rows
+    facts = inserted["fact_user_actions"]
+    assert [(f["user_id"], f["action_id"]) for f in facts] == [(1, 2), (2, 7)]
+    assert [f["timestamp"].strftime("%Y-%m-%dT%H:%M:%SZ") for f in facts] == [
+        "2025-07-15T10:15:30Z", "2025-07-15T10:20:00Z"]
 
     mock_session.commit.assert_called_once()
+
+
+@patch("src.etl_pipeline.tasks.load_data.ensure_partitions")
+@patch("src.etl_pipeline.tasks.load_data.SessionLocal")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_orm_load_round_trips_follow_distinct_keys(mock_load_config, mock_get_s3_client, mock_session_local,
+                                                    mock_ensure_partitions) -> None:
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+
+    def load(rows: int) -> int:
+        mock_session, inserted = orm_session()
+        mock_session_local.return_value.__enter__.return_value = mock_session
+        data = pd.DataFrame({
+            "user_id": [str(n % 10) for n in range(rows)],
+            "action_type": ["click", "scroll"] * (rows // 2),
+            "timestamp": pd.date_range("2025-07-15", periods=rows, freq="s", tz="UTC"),
+            "device": ["mobile"] * rows,
+            "location": ["Berlin"] * rows,
+        })
+        loader = LoadData(mode=LoadMode.ORM)
+        loader.rollups = False
+        loader.load_dataframe(data)
+        assert len(inserted["fact_user_actions"]) == rows
+        return mock_session.execute.call_count
+
+    assert load(20) == load(2000)
+
+
+@patch.dict("os.environ", {"INCREMENTAL": "true", "LOAD_MODE": "orm", "ROLLUPS": "false"})
+@patch("src.etl_pipeline.jobs.user_action_log_job.WatermarkStore")
+@patch("src.etl_pipeline.jobs.user_action_log_job.S3Storage")
+@patch("src.etl_pipeline.jobs.user_action_log_job.load_manifest")
+@patch("src.etl_pipeline.jobs.user_action_log_job.load_config")
+@patch("src.etl_pipeline.tasks.load_data.ensure_partitions")
+@patch("src.etl_pipeline.tasks.load_data.SessionLocal")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_load_retried_before_the_watermark_moves_inserts_nothing(
+    mock_load_config, mock_get_s3_client, mock_session_local, mock_ensure_partitions,
+    mock_job_config, mock_load_manifest, mock_job_storage, mock_watermark_store,
+) -> None:
+    """A retry after the facts committed, but before the load watermark advanced, must not duplicate them."""
+    from src.etl_pipeline.jobs import user_action_log_job
+
+    mock_load_config.return_value = mock_job_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    mock_get_s3_client.return_value.get_object.side_effect = lambda **kwargs: {
+        "Body": BytesIO(PROCESSED_JSON.encode("utf-8"))}
+    mock_load_manifest.return_value = {"parts": [{"key": "processed/part-00001.json"}]}
+    # An earlier load of the day; its watermark is older than every event of the batch
+    mock_watermark_store.return_value.get.return_value = {
+        "last_object": None, "max_timestamp": pd.Timestamp("2025-07-15T09:00:00Z").to_pydatetime()}
+
+    def load(existing_facts: list) -> list:
+        mock_session, inserted = orm_session(existing_actions={"click": 1, "scroll": 2}, existing_facts=existing_facts)
+        mock_session_local.return_value.__enter__.return_value = mock_session
+        user_action_log_job.run_load(ds="2025-07-15")
+        return inserted.get("fact_user_actions", [])
+
+    first = load([])
+    assert len(first) == 2
+    # The watermark store never moved: the retry sees the same watermark and the committed facts
+    assert load(first) == []
+
+
+@patch("src.etl_pipeline.tasks.load_data.get_engine")
+@patch("src.etl_pipeline.tasks.load_data.SessionLocal")
+@patch("src.etl_pipeline.tasks.load_data.run_data_quality_checks")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.generate_s3_key")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_load_data_bulk_mode_uses_copy_and_set_based_merge(
+    mock_load_config,
+    mock_generate_s3_key,
+    mock_get_s3_client,
+    mock_quality_check,
+    mock_session_local,
+    mock_get_engine,
+) -> None:
+    """Test that bulk mode stages rows via COPY and never falls back to per-row ORM queries."""
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    mock_generate_s3_key.return_value = "processed/key.json"
+
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+    mock_s3.get_object.return_value = {"Body": BytesIO(PROCESSED_JSON.encode("utf-8"))}
+    mock_quality_check.side_effect = lambda df: (df, df.iloc[:0], {})
+
+    mock_connection = MagicMock()
+    mock_get_engine.return_value.begin.return_value.__enter__.return_value = mock_connection
+    mock_cursor = mock_connection.connection.cursor.return_value
+
+    loader = LoadData(mode=LoadMode.BULK)
+    loader.load()
+
+    mock_cursor.copy_expert.assert_called_once()
+    copy_sql, buffer = mock_cursor.copy_expert.call_args[0]
+    assert copy_sql.startswith("COPY stage_user_actions")
+    staged_lines = buffer.getvalue().strip().splitlines()
+    assert len(staged_lines) == 2
+    assert staged_lines[0].startswith("1,click,2025-07-15 10:15:30+00:00")
+
+    executed_sql = [str(c[0][0]) for c in mock_connection.execute.call_args_list]
+    assert any("INSERT INTO dim_users" in sql for sql in executed_sql)
+    assert any("INSERT INTO dim_actions" in sql for sql in executed_sql)
+    assert any("INSERT INTO fact_user_actions" in sql for sql in executed_sql)
+    mock_session_local.assert_not_called()
+
+
+@patch.dict("os.environ", {"PROCESSED_FORMAT": "parquet"})
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_read_processed_parquet(mock_load_config, mock_get_s3_client) -> None:
+    """Test that LoadData reads the Parquet processed key with typed timestamps."""
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    buffer = BytesIO()
+    pq.write_table(to_processed_arrow(get_mocked_dataframe()), buffer)
+
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+    mock_s3.get_object.return_value = {"Body": BytesIO(buffer.getvalue())}
+
+    loader = LoadData()
+    df = loader._read_processed()
+
+    assert loader.processed_key.endswith(".parquet")
+    assert len(df) == 2
+    assert str(df["timestamp"].dtype) == "datetime64[us, UTC]"
+    assert list(df["action_type"]) == ["click", "scroll"]
+
+
+@patch("src.etl_pipeline.tasks.load_data.get_engine")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.generate_s3_key")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_load_quarantines_rejected_rows(mock_load_config, mock_generate_s3_key, mock_get_s3_client, mock_get_engine):
+    """Test that rows failing data quality rules are written to quarantine and not loaded."""
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    mock_generate_s3_key.return_value = "processed/key.json"
+    rows = PROCESSED_JSON.replace('"location": "Hamburg"', '"location": null')
+
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+    mock_s3.get_object.return_value = {"Body": BytesIO(rows.encode("utf-8"))}
+    uploaded = {}
+    mock_s3.upload_fileobj.side_effect = lambda fileobj, bucket, key, **kwargs: uploaded.update({key: fileobj.read()})
+    mock_connection = MagicMock()
+    mock_get_engine.return_value.begin.return_value.__enter__.return_value = mock_connection
+
+    summary = LoadData(mode=LoadMode.BULK, logical_date="2025-07-15").load()
+
+    assert summary["rows"] == 1
+    assert summary["quality"]["violations"]["not_null"] == 1
+    key = summary["quality"]["quarantine_key"]
+    assert key.startswith("quarantine/json/2025/07/15/quarantine_logs-")
+    quarantined = pd.read_json(BytesIO(uploaded[key]), convert_dates=False)
+    assert list(quarantined["user_id"]) == [2]
+    assert list(quarantined["dq_reasons"]) == ["not_null"]
+    assert quarantined.loc[0, "timestamp"] == "2025-07-15T10:20:00Z"
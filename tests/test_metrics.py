@@ -0,0 +1,145 @@
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.etl_pipeline import metrics
+from src.etl_pipeline.metrics import StageMetrics, to_openmetrics, to_statsd
+from src.etl_pipeline.tasks.load_data import LoadData
+from src.etl_pipeline.utils import S3Storage
+
+
+def test_stage_collects_transfers_and_round_trips_from_its_context():
+    client = MagicMock()
+    client.get_object.side_effect = lambda **kwargs: {"Body": BytesIO(b"{}"), "ContentLength": 2}
+    storage = S3Storage("bucket", client=client, transfer_config=MagicMock())
+    engine = create_engine("sqlite://")
+
+    with StageMetrics("load", "2025-07-15", emit=False) as stage:
+        storage.put_json("manifest.json", {"parts": []})
+        storage.get_json("manifest.json")
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+        # Threads submitted through metrics.submit report to the submitting stage
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            metrics.submit(pool, metrics.add, bytes_written=10).result()
+        metrics.count("facts_inserted", 3)
+
+    # Outside any stage nothing is recorded
+    storage.get_json("manifest.json")
+    metrics.count("facts_inserted")
+
+    record = stage.record()
+    assert record["status"] == "success"
+    assert record["bytes_read"] == 2
+    assert record["bytes_written"] == len(b'{\n  "parts": []\n}') + 10
+    assert record["db_round_trips"] == 2
+    assert record["peak_rss_bytes"] > 0
+    assert record["counters"] == {"facts_inserted": 3}
+
+
+@patch("src.etl_pipeline.metrics.pipeline_config")
+def test_emit_writes_textfile_and_statsd(mock_pipeline_config, tmp_path):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+    mock_pipeline_config.return_value = {
+        "METRICS_PREFIX": "etl",
+        "METRICS_STATSD_HOST": "127.0.0.1",
+        "METRICS_STATSD_PORT": receiver.getsockname()[1],
+        "METRICS_TEXTFILE_DIR": str(tmp_path),
+    }
+
+    with StageMetrics("transform", "2025-07-15") as stage:
+        stage.add(rows_in=5, rows_out=4)
+        stage.count("timestamp_iso8601", 4)
+
+    text_file = (tmp_path / "etl_transform.prom").read_text()
+    assert 'etl_stage_rows_out{stage="transform",ds="2025-07-15",status="success"} 4' in text_file
+    assert 'etl_stage_counter{stage="transform",ds="2025-07-15",status="success",name="timestamp_iso8601"} 4' in text_file
+    assert text_file.endswith("# EOF\n")
+
+    datagrams = [receiver.recv(512).decode() for _ in to_statsd(stage.record(), "etl")]
+    receiver.close()
+    assert "etl.transform.runs.success:1|c" in datagrams
+    assert "etl.transform.rows_in:5|c" in datagrams
+
+
+def test_failed_stage_is_recorded_and_sink_errors_are_swallowed():
+    record = {}
+    with patch("src.etl_pipeline.metrics.emit", side_effect=record.update):
+        try:
+            with StageMetrics("load"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    assert record["status"] == "failed"
+
+    with patch("src.etl_pipeline.metrics.pipeline_config") as mock_pipeline_config, \
+            patch("src.etl_pipeline.metrics.send_statsd", side_effect=OSError("unreachable")):
+        mock_pipeline_config.return_value = {"METRICS_PREFIX": "etl", "METRICS_STATSD_HOST": "statsd",
+                                             "METRICS_STATSD_PORT": 8125, "METRICS_TEXTFILE_DIR": ""}
+        metrics.emit(record)
+
+
+def test_metric_names_are_sanitized():
+    record = {"stage": "load", "ds": None, "status": "success", "seconds": 1.5, "rows_in": 1, "rows_out": 1,
+              "bytes_read": 0, "bytes_written": 0, "db_round_trips": 0, "peak_rss_bytes": 1,
+              "counters": {"dq_unique:user_id+timestamp": 2}}
+    assert "etl.load.dq_unique_user_id_timestamp:2|c" in to_statsd(record, "etl")
+    assert "etl.load.seconds:1500|ms" in to_statsd(record, "etl")
+    assert 'name="dq_unique:user_id+timestamp"} 2' in to_openmetrics(record, "etl")
+
+
+@patch("src.etl_pipeline.tasks.load_data.logger")
+@patch("src.etl_pipeline.tasks.load_data.ensure_partitions")
+@patch("src.etl_pipeline.tasks.load_data.SessionLocal")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_orm_load_logs_pages_and_counts_outcomes(mock_load_config, mock_get_s3_client, mock_session_local,
+                                                       mock_ensure_partitions, mock_logger):
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    session = MagicMock()
+    mock_session_local.return_value.__enter__.return_value = session
+    # The third row's fact already exists
+    session.execute.return_value.fetchall.return_value = [(3,)]
+
+    loader = LoadData()
+    loader.rollups = False
+    loader.user_cache, loader.action_cache = MagicMock(), MagicMock()
+    loader.user_cache.resolve_many.return_value = {"1": "1", "2": "2", "3": "3"}
+    loader.action_cache.resolve_many.return_value = {"click": 1}
+    for cache, table in ((loader.user_cache, "dim_users"), (loader.action_cache, "dim_actions")):
+        cache.stats.return_value = {"table": table, "hits": 2, "misses": 1}
+    # Pages of one fact; progress is logged per two facts, independently of the paging
+    loader.insert_page_rows, loader.log_every_rows = 1, 2
+    # The last row repeats the first one's event
+    data = pd.DataFrame({
+        "user_id": ["1", "2", "3", "1"],
+        "action_type": ["click"] * 4,
+        "timestamp": pd.to_datetime(["2025-07-15T10:00:00Z"] * 4, utc=True),
+        "device": ["mobile"] * 4,
+        "location": ["Berlin"] * 4,
+    })
+
+    with StageMetrics("load", emit=False) as stage:
+        loader.load_dataframe(data)
+
+    progress = [c for c in mock_logger.info.call_args_list if "Inserted" in str(c)]
+    assert len(progress) == 1
+    fact_inserts = [c for c in session.execute.call_args_list if "INSERT INTO fact_user_actions" in str(c[0][0])]
+    assert [len(c[0][1]) for c in fact_inserts] == [1, 1]
+    assert stage.counters["facts_inserted"] == 2
+    assert stage.counters["facts_existing"] == 1
+    assert stage.counters["facts_duplicate"] == 1
+    assert stage.counters["cache_dim_users_hits"] == 2
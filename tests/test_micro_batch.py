@@ -0,0 +1,101 @@
+import os
+import time
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.etl_pipeline.jobs.micro_batch import MicroBatchRunner, WATERMARK_STAGE
+
+
+def make_frame(rows: int, minute: int = 0) -> pd.DataFrame:
+    return pd.DataFrame({
+        "user_id": [str(n) for n in range(rows)],
+        "action_type": ["click"] * rows,
+        "timestamp": pd.date_range("2025-07-15", periods=rows, freq="s", tz="UTC") + pd.Timedelta(minutes=minute),
+        "device": ["mobile"] * rows,
+        "location": ["Berlin"] * rows,
+    })
+
+
+def make_runner(keys: list, rows_per_object: int = 2, **options) -> MicroBatchRunner:
+    storage = MagicMock()
+    # One listing returns every key; later listings find nothing new
+    storage.list_keys.side_effect = lambda prefix, start_after=None: [k for k in keys if start_after is None or k > start_after]
+    storage.download_bytes.side_effect = lambda key: key.encode()
+    transformer = MagicMock()
+    transformer.transform_payload.side_effect = lambda payload: make_frame(rows_per_object, keys.index(payload.decode()))
+    loader = MagicMock()
+    loader.load_frame.side_effect = lambda df: {"rows": len(df), "max_timestamp": df["timestamp"].max() if len(df) else None}
+    watermarks = MagicMock()
+    watermarks.get.return_value = {}
+    options.setdefault("poll_seconds", 0.01)
+    options.setdefault("max_seconds", 60)
+    return MicroBatchRunner(prefix="raw/", storage=storage, transformer=transformer, loader=loader,
+                            watermarks=watermarks, **options)
+
+
+def test_loads_batches_by_record_count_and_advances_the_watermark():
+    keys = [f"raw/json/2025/07/15/raw_logs-{n:05d}.json" for n in range(1, 6)]
+    runner = make_runner(keys, max_records=4, queue_size=10)
+
+    records = runner.run(until_idle=True)
+
+    loaded = [call.args[0] for call in runner.loader.load_frame.call_args_list]
+    assert [len(df) for df in loaded] == [4, 4, 2]
+    assert [r["rows_out"] for r in records] == [4, 4, 2]
+    advanced = [call.kwargs["last_object"] for call in runner.watermarks.advance.call_args_list]
+    assert advanced == [keys[1], keys[3], keys[4]]
+    assert all(call.args == (WATERMARK_STAGE, "raw/") for call in runner.watermarks.advance.call_args_list)
+
+
+def test_resumes_after_the_watermark_and_flushes_on_time():
+    keys = [f"raw/json/2025/07/15/raw_logs-{n:05d}.json" for n in range(1, 4)]
+    runner = make_runner(keys, max_records=1000, max_seconds=0.05, queue_size=10)
+    runner.watermarks.get.return_value = {"last_object": keys[0]}
+
+    runner.run(max_batches=1)
+
+    assert runner.storage.list_keys.call_args_list[0].kwargs["start_after"] == keys[0]
+    assert len(runner.loader.load_frame.call_args[0][0]) == 4
+    assert runner.watermarks.advance.call_args.kwargs["last_object"] == keys[2]
+
+
+def test_full_queue_blocks_the_poller():
+    keys = [f"raw/json/2025/07/15/raw_logs-{n:05d}.json" for n in range(1, 7)]
+    runner = make_runner(keys, max_records=1, queue_size=1)
+    load = runner.loader.load_frame.side_effect
+
+    def slow_load(df):
+        time.sleep(0.2)
+        assert runner.queue.qsize() <= 1
+        return load(df)
+
+    runner.loader.load_frame.side_effect = slow_load
+    records = runner.run(until_idle=True)
+
+    assert len(records) == 6
+    assert sum(r["counters"]["backpressure_waits"] for r in records) > 0
+    assert runner.watermarks.advance.call_args.kwargs["last_object"] == keys[-1]
+
+
+def test_poller_errors_are_raised_after_loading_the_buffer():
+    keys = ["raw/json/2025/07/15/raw_logs-00001.json", "raw/json/2025/07/15/raw_logs-00002.json"]
+    runner = make_runner(keys, max_records=1000, queue_size=10)
+    transform = runner.transformer.transform_payload.side_effect
+
+    def fail_second(payload):
+        if payload.decode() == keys[1]:
+            raise ValueError("corrupt object")
+        return transform(payload)
+
+    runner.transformer.transform_payload.side_effect = fail_second
+    with pytest.raises(ValueError):
+        runner.run()
+
+    # The good object was loaded and recorded; the bad one stays after the watermark
+    assert runner.watermarks.advance.call_args.kwargs["last_object"] == keys[0]
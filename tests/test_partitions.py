@@ -0,0 +1,113 @@
+import os
+import pandas as pd
+from unittest.mock import MagicMock
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.database.models.fact_user_actions import FactUserAction
+from src.database.partitions import (
+    PartitionInterval, apply_retention, ensure_partitions, batch_periods, parse_partition_name, partition_name,
+)
+
+NOW = pd.Timestamp("2025-07-15T10:00:00Z")
+
+
+def fake_connection(partitioned=True, existing=()):
+    """Connection whose catalog queries report the given partitions; every other statement is recorded."""
+    connection = MagicMock()
+
+    def execute(statement, params=None):
+        sql = str(statement)
+        result = MagicMock()
+        result.scalar.return_value = partitioned
+        result.fetchall.return_value = [(name,) for name in existing] if "pg_inherits" in sql else []
+        return result
+
+    connection.execute.side_effect = execute
+    return connection
+
+
+def ddl(connection) -> list:
+    return [str(c[0][0]) for c in connection.execute.call_args_list
+            if str(c[0][0]).lstrip().startswith(("CREATE", "ALTER", "DROP"))]
+
+
+def test_batch_periods_and_names():
+    periods = batch_periods(["2025-08-01T00:00:00Z", "2025-06-20T23:00:00Z", "2025-07-03T08:00:00Z"],
+                            PartitionInterval.MONTH)
+    assert [partition_name(p, PartitionInterval.MONTH) for p in periods] == [
+        "fact_user_actions_p2025_06", "fact_user_actions_p2025_07", "fact_user_actions_p2025_08",
+    ]
+    day = batch_periods(["2025-07-15T23:59:59+02:00"], PartitionInterval.DAY)[0]
+    assert partition_name(day, PartitionInterval.DAY) == "fact_user_actions_p2025_07_15"
+    assert parse_partition_name("fact_user_actions_p2025_07_15") == (day, PartitionInterval.DAY)
+    assert parse_partition_name("fact_user_actions_legacy") is None
+
+
+def test_ensure_partitions_creates_only_missing_ones():
+    connection = fake_connection(existing=["fact_user_actions_p2025_07"])
+    created = ensure_partitions(connection, ["2025-06-30T12:00:00Z", "2025-07-02T00:00:00Z"],
+                                PartitionInterval.MONTH, ahead=1, now=NOW)
+
+    assert created == ["fact_user_actions_p2025_06", "fact_user_actions_p2025_08"]
+    statements = ddl(connection)
+    assert "PARTITION OF fact_user_actions FOR VALUES FROM ('2025-06-01T00:00:00+00:00') " \
+           "TO ('2025-07-01T00:00:00+00:00')" in statements[0]
+    assert any("pg_advisory_xact_lock" in str(c[0][0]) for c in connection.execute.call_args_list)
+
+
+def test_ensure_partitions_skips_empty_periods_between_distant_events():
+    connection = fake_connection()
+    # One stray event years before the rest of the batch
+    timestamps = pd.Series(pd.to_datetime(["2019-03-04T05:06:07Z", "2025-07-15T09:00:00Z", "2025-07-15T11:00:00Z"]))
+    created = ensure_partitions(connection, timestamps, PartitionInterval.DAY, ahead=1, now=NOW)
+
+    assert created == ["fact_user_actions_p2019_03_04", "fact_user_actions_p2025_07_15", "fact_user_actions_p2025_07_16"]
+    assert len(ddl(connection)) == 3
+
+
+def test_ensure_partitions_takes_no_lock_when_nothing_is_missing():
+    connection = fake_connection(existing=["fact_user_actions_p2025_07", "fact_user_actions_p2025_08"])
+    assert ensure_partitions(connection, [NOW], PartitionInterval.MONTH, ahead=1, now=NOW) == []
+    assert not any("pg_advisory_xact_lock" in str(c[0][0]) for c in connection.execute.call_args_list)
+
+
+def test_ensure_partitions_leaves_unpartitioned_table_alone():
+    connection = fake_connection(partitioned=False)
+    assert ensure_partitions(connection, [NOW], PartitionInterval.MONTH, ahead=1, now=NOW) == []
+    assert connection.execute.call_count == 1
+
+
+def test_apply_retention_detaches_partitions_before_the_kept_periods():
+    connection = fake_connection(existing=[
+        "fact_user_actions_p2025_04", "fact_user_actions_p2025_05", "fact_user_actions_p2025_06",
+        "fact_user_actions_p2025_07", "fact_user_actions_archive",
+    ])
+    removed = apply_retention(connection, keep=2, interval=PartitionInterval.MONTH, drop=True, now=NOW)
+
+    assert removed == ["fact_user_actions_p2025_04", "fact_user_actions_p2025_05"]
+    assert ddl(connection) == [
+        "ALTER TABLE fact_user_actions DETACH PARTITION fact_user_actions_p2025_04",
+        "DROP TABLE fact_user_actions_p2025_04",
+        "ALTER TABLE fact_user_actions DETACH PARTITION fact_user_actions_p2025_05",
+        "DROP TABLE fact_user_actions_p2025_05",
+    ]
+
+
+def test_apply_retention_is_disabled_by_zero_periods():
+    connection = fake_connection(existing=["fact_user_actions_p2020_01"])
+    assert apply_retention(connection, keep=0, interval=PartitionInterval.MONTH, now=NOW) == []
+    connection.execute.assert_not_called()
+
+
+def test_fact_table_ddl_is_range_partitioned_with_brin_index():
+    table = FactUserAction.__table__
+    sql = str(CreateTable(table).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY RANGE (timestamp)" in sql
+    assert "PRIMARY KEY (id, timestamp)" in sql
+    assert any(index.dialect_options["postgresql"]["using"] == "brin" for index in table.indexes)
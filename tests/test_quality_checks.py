@@ -0,0 +1,75 @@
+import pandas as pd
+from unittest.mock import patch
+
+from src.etl_pipeline.tasks.quality_checks import (
+    REQUIRED_COLUMNS, AllowedValues, NotNull, TimestampRange, Unique, default_rules, run_data_quality_checks,
+)
+
+
+def make_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "user_id": ["1", "1", "2", None, "3", "3"],
+        "action_type": ["click", "click", "scroll", "click", "teleport", "click"],
+        "timestamp": pd.to_datetime([
+            "2025-07-15T10:00:00Z", "2025-07-15T10:00:00Z", "2025-07-15T11:00:00Z",
+            "2025-07-15T12:00:00Z", "1990-01-01T00:00:00Z", "2025-07-15T10:00:00Z",
+        ], utc=True),
+        "device": ["mobile", "desktop", "mobile", "mobile", "mobile", "mobile"],
+        "location": ["Berlin"] * 6,
+    })
+
+
+RULES = [
+    NotNull(REQUIRED_COLUMNS),
+    AllowedValues("action_type", ["click", "scroll"]),
+    TimestampRange("timestamp", min_value="2000-01-01"),
+    Unique(["user_id", "action_type", "timestamp"]),
+]
+
+
+def test_rules_split_batch_and_report_violations():
+    passed, rejected, summary = run_data_quality_checks(make_frame(), RULES)
+
+    assert list(passed.index) == [0, 2, 5]
+    assert list(rejected.index) == [1, 3, 4]
+    # Uniqueness is on the key only: row 1 differs from row 0 in device but is still a repeat
+    assert rejected.loc[1, "dq_reasons"] == "unique:user_id+action_type+timestamp"
+    assert rejected.loc[3, "dq_reasons"] == "not_null"
+    assert rejected.loc[4, "dq_reasons"] == "allowed_values:action_type,timestamp_range:timestamp"
+    assert summary == {
+        "rows_before": 6,
+        "rows_after": 3,
+        "rows_rejected": 3,
+        "violations": {
+            "not_null": 1,
+            "allowed_values:action_type": 1,
+            "timestamp_range:timestamp": 1,
+            "unique:user_id+action_type+timestamp": 1,
+        },
+    }
+
+
+def test_duplicates_of_rejected_rows_are_kept():
+    df = make_frame().iloc[[0, 0]].reset_index(drop=True)
+    df.loc[0, "device"] = None
+
+    passed, rejected, _ = run_data_quality_checks(df, RULES)
+
+    # Row 0 fails not_null, so row 1 is the first accepted occurrence of the key
+    assert list(passed.index) == [1]
+    assert list(rejected["dq_reasons"]) == ["not_null"]
+
+
+@patch.dict("os.environ", {"DQ_ALLOWED_ACTION_TYPES": "click, scroll", "DQ_UNIQUE_KEY": "user_id,timestamp"})
+def test_default_rules_follow_settings():
+    names = [rule.name for rule in default_rules()]
+    assert names == ["not_null", "allowed_values:action_type", "timestamp_range:timestamp", "unique:user_id+timestamp"]
+
+
+def test_clean_batch_passes_untouched():
+    df = make_frame().iloc[[0, 2]]
+    passed, rejected, summary = run_data_quality_checks(df)
+
+    assert passed.equals(df)
+    assert rejected.empty
+    assert summary["rows_rejected"] == 0
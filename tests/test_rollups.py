@@ -0,0 +1,112 @@
+import datetime
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from src.database.bulk import merge_stage
+from src.database.rollups import HyperLogLog, action_counts, update_rollups
+
+
+def recording_connection(results: dict):
+    """Connection returning canned rows for statements containing a marker; every statement is recorded."""
+    connection = MagicMock()
+
+    def execute(statement, params=None):
+        sql = str(statement)
+        result = MagicMock()
+        for marker, value in results.items():
+            if marker in sql:
+                result.fetchall.return_value = value
+                result.scalar.return_value = value
+                return result
+        result.fetchall.return_value = []
+        result.rowcount = 0
+        return result
+
+    connection.execute.side_effect = execute
+    return connection
+
+
+def executed(connection) -> list:
+    return [str(c[0][0]) for c in connection.execute.call_args_list]
+
+
+def test_hyperloglog_estimates_within_a_few_percent():
+    sketch = HyperLogLog(14)
+    sketch.add(np.arange(200_000))
+    assert sketch.estimate() == pytest.approx(200_000, rel=0.03)
+
+    small = HyperLogLog(14)
+    small.add(["a", "b", "c", "a"])
+    assert small.estimate() == pytest.approx(3, abs=0.1)
+
+
+def test_hyperloglog_merge_equals_sketch_of_union():
+    left, right, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    left.add(range(0, 6000))
+    right.add(range(4000, 10000))
+    union.add(range(0, 10000))
+
+    left.merge(right)
+    assert np.array_equal(left.registers, union.registers)
+
+    restored = HyperLogLog.from_bytes(left.to_bytes())
+    assert restored.precision == 12
+    assert restored.estimate() == left.estimate()
+    with pytest.raises(ValueError):
+        left.merge(HyperLogLog(14))
+
+
+def test_hyperloglog_treats_ids_by_string_form():
+    numeric, text_ids = HyperLogLog(10), HyperLogLog(10)
+    numeric.add([1, 2, 3])
+    text_ids.add(["1", "2", "3"])
+    assert np.array_equal(numeric.registers, text_ids.registers)
+
+
+def test_update_rollups_merges_each_day_sketch():
+    stored = HyperLogLog(10)
+    stored.add(["u1", "u2"])
+    day = datetime.date(2025, 7, 15)
+    connection = recording_connection({
+        "GROUP BY 1, 2\n": [(day, "u2"), (day, "u3")],
+        "FOR UPDATE": stored.to_bytes(),
+    })
+
+    counts = update_rollups(connection, precision=10)
+
+    assert counts["user_days"] == 1
+    statements = executed(connection)
+    assert any("INSERT INTO rollup_daily_actions" in sql and "ON CONFLICT" in sql for sql in statements)
+    update = [c for c in connection.execute.call_args_list if "UPDATE rollup_daily_users" in str(c[0][0])][0]
+    assert update[0][1]["day"] == day
+    assert update[0][1]["estimate"] == pytest.approx(3, abs=0.1)
+
+
+def test_merge_stage_records_inserted_facts_only_with_rollups():
+    plain = recording_connection({})
+    merge_stage(plain)
+    assert not any("new_fact_user_actions" in sql for sql in executed(plain))
+
+    tracked = recording_connection({})
+    counts = merge_stage(tracked, rollups=True)
+    statements = executed(tracked)
+    assert any("RETURNING user_id, action_id, timestamp" in sql for sql in statements)
+    assert "rollups" in counts
+
+
+def test_action_counts_serves_from_rollup_when_possible():
+    connection = recording_connection({"FROM rollup_daily_actions": [(datetime.date(2025, 7, 15), "click", 5)]})
+    df = action_counts(connection, "2025-07-15", "2025-07-16", by=["day", "action_type"])
+
+    assert df.attrs["source"] == "rollup"
+    assert df.to_dict("records") == [{"day": datetime.date(2025, 7, 15), "action_type": "click", "events": 5}]
+
+    connection = recording_connection({"FROM fact_user_actions": [("u1", 2)]})
+    df = action_counts(connection, "2025-07-15", "2025-07-16", by=["user_id"])
+    assert df.attrs["source"] == "facts"
+    params = connection.execute.call_args[0][1]
+    assert str(params["end_ts"]) == "2025-07-17 00:00:00+00:00"
+
+    with pytest.raises(ValueError):
+        action_counts(connection, "2025-07-15", "2025-07-16", by=["timestamp"])
@@ -0,0 +1,138 @@
+import os
+import pandas as pd
+import pytest
+from unittest.mock import patch, MagicMock
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from sqlalchemy.exc import OperationalError
+from src.database import sharding
+from src.database.sharding import shard_numbers, split_by_user
+from src.etl_pipeline.jobs import user_action_log_job
+
+
+def make_batch(users: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        "user_id": users,
+        "action_type": ["click"] * len(users),
+        "timestamp": pd.date_range("2025-07-15", periods=len(users), freq="min", tz="UTC"),
+        "device": ["mobile"] * len(users),
+        "location": ["Berlin"] * len(users),
+    })
+
+
+def deadlock() -> OperationalError:
+    orig = Exception("deadlock detected")
+    orig.pgcode = "40P01"
+    return OperationalError("INSERT", {}, orig)
+
+
+def test_users_map_to_one_stable_shard():
+    df = make_batch([str(n % 50) for n in range(500)])
+    parts = split_by_user(df, 4)
+
+    assert sum(len(part) for part in parts) == len(df)
+    owners = {}
+    for shard, part in enumerate(parts):
+        for user in part["user_id"].unique():
+            assert owners.setdefault(user, shard) == shard
+    # Same shards for numeric ids and on every call
+    assert list(shard_numbers(pd.Series(range(50)), 4)) == list(shard_numbers(pd.Series([str(n) for n in range(50)]), 4))
+    assert all(len(part) for part in parts)
+
+
+@patch("src.database.sharding.time.sleep")
+@patch("src.database.sharding.merge_facts")
+@patch("src.database.sharding.copy_to_stage")
+def test_load_shard_retries_deadlocks_only(mock_copy, mock_merge_facts, mock_sleep):
+    mock_copy.return_value = 3
+    mock_merge_facts.side_effect = [deadlock(), {"facts_inserted": 3}]
+    engine = MagicMock()
+
+    counts = sharding.load_shard(engine, make_batch(["1", "2", "3"]))
+
+    assert counts == {"facts_inserted": 3, "rows_staged": 3, "attempts": 2}
+    assert engine.begin.call_count == 2
+
+    mock_merge_facts.side_effect = ValueError("not a lock conflict")
+    with pytest.raises(ValueError):
+        sharding.load_shard(engine, make_batch(["1"]))
+    assert engine.begin.call_count == 3
+
+
+@patch("src.database.sharding.load_shard")
+@patch("src.database.sharding.load_dimensions")
+def test_sharded_load_resolves_dimensions_before_shards(mock_load_dimensions, mock_load_shard):
+    calls = []
+    mock_load_dimensions.side_effect = lambda engine, df: calls.append("dimensions") or {
+        "users_inserted": 20, "actions_inserted": 1}
+
+    def load(engine, part, rollups):
+        calls.append("shard")
+        return {"facts_inserted": len(part), "rows_staged": len(part), "attempts": 1}
+
+    mock_load_shard.side_effect = load
+    counts = sharding.sharded_load(MagicMock(), make_batch([str(n) for n in range(20)]), shards=3)
+
+    assert calls[0] == "dimensions" and calls.count("shard") == 3
+    assert counts["facts_inserted"] == 20 and counts["shards"] == 3 and counts["retries"] == 0
+
+
+@patch("src.etl_pipeline.jobs.user_action_log_job.WatermarkStore")
+@patch("src.etl_pipeline.jobs.user_action_log_job.pipeline_config")
+def test_finish_load_shards_advances_watermark_from_plan(mock_pipeline_config, mock_store):
+    mock_pipeline_config.return_value = {"INCREMENTAL": True, "FACT_RETENTION_PERIODS": 0}
+    plan = {"processed_keys": ["p/part-00001.json", "p/part-00002.json"], "rows": 2,
+            "max_timestamp": "2025-07-15T10:20:00+00:00"}
+
+    user_action_log_job.finish_load_shards(plan, ds="2025-07-15")
+
+    kwargs = mock_store.return_value.advance.call_args[1]
+    assert kwargs["last_object"] == "p/part-00002.json"
+    assert kwargs["max_timestamp"] == pd.Timestamp("2025-07-15T10:20:00Z").to_pydatetime()
+
+
+@patch("src.etl_pipeline.tasks.load_data.load_shard")
+@patch("src.etl_pipeline.tasks.load_data.load_dimensions")
+@patch("src.etl_pipeline.tasks.load_data.get_engine")
+@patch("src.etl_pipeline.tasks.load_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.load_data.load_config")
+def test_shard_tasks_read_only_their_own_rows(mock_load_config, mock_get_s3_client, mock_get_engine,
+                                              mock_load_dimensions, mock_load_shard):
+    from src.etl_pipeline.tasks.load_data import LoadData
+
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket"}
+    mock_load_dimensions.return_value = {"users_inserted": 20, "actions_inserted": 1}
+    mock_load_shard.side_effect = lambda engine, part, rollups: {"facts_inserted": len(part), "attempts": 1}
+    objects = {}
+    storage = MagicMock()
+    storage.upload_fileobj.side_effect = lambda buffer, key: objects.__setitem__(key, buffer.read())
+    storage.download_bytes.side_effect = objects.__getitem__
+    batch = make_batch([str(n) for n in range(20)])
+
+    preparer = LoadData(logical_date="2025-07-15")
+    preparer.storage = storage
+    with patch.object(preparer, "_validated_batch", return_value=(batch, {})):
+        summary = preparer.prepare_shards(3)
+    assert len(summary["shard_keys"]) == 3 and summary["rows"] == 20
+    assert summary["shard_keys"][0] == "load_shards/parquet/2025/07/15/shard-00000.parquet"
+
+    loaded = []
+    for shard, key in enumerate(summary["shard_keys"]):
+        loader = LoadData(logical_date="2025-07-15")
+        loader.storage = storage
+        storage.download_bytes.reset_mock()
+        result = loader.load_shard(shard, key)
+        # One download: the shard's own object, not the processed batch
+        storage.download_bytes.assert_called_once_with(key)
+        part = mock_load_shard.call_args[0][1]
+        assert result["rows"] == len(part) == loader.rows_read
+        loaded.append(part)
+
+    expected = split_by_user(batch, 3)
+    for part, want in zip(loaded, expected):
+        assert sorted(part["user_id"]) == sorted(want["user_id"])
+    assert list(pd.concat(loaded)["timestamp"].sort_values()) == list(batch["timestamp"])
@@ -0,0 +1,123 @@
+import os
+import pandas as pd
+import pytest
+from unittest.mock import patch, MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.database.models.etl_stage_state import EtlStageState
+from src.database.stage_state import StageStateStore
+from src.etl_pipeline.jobs import user_action_log_job
+from src.etl_pipeline.utils import FileFormat
+
+RAW_KEYS = ["raw/json/2025/07/15/raw_logs-00001.json", "raw/json/2025/07/15/raw_logs-00002.json"]
+
+
+@pytest.fixture
+def store():
+    engine = create_engine("sqlite://")
+    EtlStageState.__table__.create(engine)
+    return StageStateStore(sessionmaker(bind=engine))
+
+
+def test_record_replaces_the_stage_state(store):
+    assert store.get("transform", "2025-07-15") == {}
+
+    store.record("transform", "2025-07-15", "a" * 64, "processed/json/2025/07/15/_manifest.json")
+    store.record("transform", "2025-07-15", "b" * 64, "processed/json/2025/07/15/_manifest.json")
+
+    assert store.get("transform", "2025-07-15") == {
+        "input_hash": "b" * 64, "output": "processed/json/2025/07/15/_manifest.json"}
+    assert store.get("ingest", "2025-07-15") == {}
+
+
+def run_transform(etags: dict, recorded: dict, force: bool = False):
+    storage = MagicMock()
+    storage.list_etags.return_value = etags
+    storage.get_json.return_value = {"parts": []}
+    transformer = MagicMock()
+    transformer.transform.return_value = pd.DataFrame()
+    transformer.rows_in, transformer.timestamp_paths = 0, {}
+    transformer.processed_manifest_key = "processed/json/2025/07/15/_manifest.json"
+
+    with patch.object(user_action_log_job, "load_config", return_value={"MINIO_BUCKET": "test-bucket"}), \
+            patch.object(user_action_log_job, "S3Storage", return_value=storage), \
+            patch.object(user_action_log_job, "_list_raw_keys", return_value=RAW_KEYS), \
+            patch.object(user_action_log_job, "TransformData", return_value=transformer) as mock_transform_data, \
+            patch.object(user_action_log_job, "StageStateStore") as mock_store:
+        mock_store.return_value.get.return_value = recorded
+        record = user_action_log_job.run_transform(ds="2025-07-15", force=force)
+    return record, mock_transform_data, mock_store.return_value
+
+
+def test_transform_skips_unchanged_raw_objects_unless_forced():
+    etags = {key: f"etag-{n}" for n, key in enumerate(RAW_KEYS)}
+    input_hash = user_action_log_job._raw_fingerprint(MagicMock(list_etags=lambda prefix: etags), RAW_KEYS,
+                                                      FileFormat.JSON, "2025-07-15")
+    recorded = {"input_hash": input_hash, "output": "processed/json/2025/07/15/_manifest.json"}
+
+    record, mock_transform_data, _ = run_transform(etags, recorded)
+    assert record["counters"] == {"skipped": 1}
+    # The skipped run hands on the manifest of the run it reuses
+    assert record["output"] == "processed/json/2025/07/15/_manifest.json"
+    mock_transform_data.assert_not_called()
+
+    record, mock_transform_data, store = run_transform(etags, recorded, force=True)
+    assert record["counters"]["executed"] == 1
+    assert record["output"] == "processed/json/2025/07/15/_manifest.json"
+    mock_transform_data.assert_called_once()
+    store.record.assert_called_once_with("transform", "2025-07-15", input_hash,
+                                         "processed/json/2025/07/15/_manifest.json")
+
+    # A rewritten raw part changes the fingerprint
+    record, mock_transform_data, store = run_transform({**etags, RAW_KEYS[1]: "etag-new"}, recorded)
+    assert record["counters"]["executed"] == 1
+    assert store.record.call_args[0][2] != input_hash
+
+
+@patch("src.etl_pipeline.tasks.ingest_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.ingest_data.load_config")
+def test_ingest_fingerprint_follows_file_content(mock_load_config, mock_get_s3_client, tmp_path):
+    from src.etl_pipeline.tasks.ingest_data import IngestData
+
+    (tmp_path / "a.json").write_text('[{"user_id": 1}]')
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket", "RAW_LOCAL_FILE": str(tmp_path)}
+    ingest = IngestData(logical_date="2025-07-15")
+
+    first = ingest.input_fingerprint()
+    assert ingest.input_fingerprint() == first
+    (tmp_path / "a.json").write_text('[{"user_id": 2}]')
+    assert ingest.input_fingerprint() != first
+
+
+
+@patch("src.etl_pipeline.tasks.ingest_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.ingest_data.load_config")
+def test_failed_ingest_is_not_recorded_and_runs_again(mock_load_config, mock_get_s3_client, store, tmp_path):
+    from src.etl_pipeline.tasks.ingest_data import IngestData
+
+    (tmp_path / "a.json").write_text('[{"user_id": 1}]')
+    mock_load_config.return_value = {"MINIO_BUCKET": "test-bucket", "RAW_LOCAL_FILE": str(tmp_path)}
+    store.record("ingest", "2025-07-15", "old-hash", "raw/json/2025/07/15/_manifest.json")
+
+    def run():
+        with patch.object(user_action_log_job, "StageStateStore", return_value=store):
+            return user_action_log_job.run_ingest(ds="2025-07-15")
+
+    # The inputs changed, but the upload fails
+    with patch.object(IngestData, "_upload_parts", side_effect=RuntimeError("connection reset")):
+        with pytest.raises(RuntimeError):
+            run()
+    assert store.get("ingest", "2025-07-15")["input_hash"] == "old-hash"
+
+    # The next run must not take the failed attempt for a completed one
+    with patch.object(IngestData, "_upload_parts"):
+        record = run()
+    assert record["counters"]["executed"] == 1
+    assert record["output"] == "raw/json/2025/07/15/_manifest.json"
+    assert store.get("ingest", "2025-07-15")["input_hash"] != "old-hash"
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+import pytest
+import boto3
+from io import BytesIO
+from unittest.mock import patch
+from boto3.s3.transfer import TransferConfig
+
+from src.etl_pipeline import metrics, utils
+from src.etl_pipeline.utils import AsyncS3Storage, S3Storage, get_s3_client
+
+moto = pytest.importorskip("moto")
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        client = boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test"
+        )
+        client.create_bucket(Bucket="test-bucket")
+        yield client
+
+
+@patch("src.etl_pipeline.utils.load_config")
+def test_get_s3_client_is_pooled_per_process(mock_load_config):
+    mock_load_config.return_value = {
+        "MINIO_ENDPOINT": "http://localhost:9000",
+        "MINIO_ACCESS_KEY": "test",
+        "MINIO_SECRET_KEY": "test",
+    }
+    utils._s3_clients.clear()
+
+    first = get_s3_client()
+    second = get_s3_client()
+
+    assert first is second
+    assert mock_load_config.call_count == 1
+    with patch("src.etl_pipeline.utils.os.getpid", return_value=os.getpid() + 1):
+        assert get_s3_client() is not first
+    utils._s3_clients.clear()
+
+
+def test_download_bytes_fetches_ranges_in_parallel(s3):
+    payload = os.urandom(10_000)
+    s3.put_object(Bucket="test-bucket", Key="raw/part.json", Body=payload)
+    storage = S3Storage("test-bucket", s3, TransferConfig(multipart_chunksize=1024, max_concurrency=4))
+
+    with patch.object(s3, "get_object", wraps=s3.get_object) as spy:
+        assert storage.download_bytes("raw/part.json") == payload
+
+    assert spy.call_count == 10
+    assert storage.transfers[-1]["bytes"] == len(payload)
+    assert storage.transfers[-1]["bytes_per_sec"] > 0
+
+
+def test_download_bytes_small_and_empty_objects(s3):
+    s3.put_object(Bucket="test-bucket", Key="small", Body=b"[]")
+    s3.put_object(Bucket="test-bucket", Key="empty", Body=b"")
+    storage = S3Storage("test-bucket", s3, TransferConfig(multipart_chunksize=1024))
+
+    assert storage.download_bytes("small") == b"[]"
+    assert storage.download_bytes("empty") == b""
+
+
+def test_upload_fileobj_uses_multipart_above_threshold(s3):
+    payload = os.urandom(11 * MiB)
+    config = TransferConfig(multipart_threshold=5 * MiB, multipart_chunksize=5 * MiB, max_concurrency=3)
+    storage = S3Storage("test-bucket", s3, config)
+
+    stats = storage.upload_fileobj(BytesIO(payload), "processed/big.bin")
+
+    head = s3.head_object(Bucket="test-bucket", Key="processed/big.bin")
+    assert head["ContentLength"] == len(payload)
+    assert head["ETag"].strip('"').endswith("-3")  # three multipart parts
+    assert stats["bytes"] == len(payload)
+    assert storage.download_bytes("processed/big.bin") == payload
+
+
+def test_async_storage_reads_objects_concurrently_within_the_limit(s3):
+    storage = S3Storage("test-bucket", client=s3, transfer_config=TransferConfig(max_concurrency=1))
+    keys = [f"raw/part-{n:02d}.json" for n in range(12)]
+    for key in keys:
+        s3.put_object(Bucket="test-bucket", Key=key, Body=key.encode())
+
+    in_flight, peak, lock = [0], [0], threading.Lock()
+    download = storage.download_bytes
+
+    def slow_download(key):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        try:
+            return download(key)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    storage.download_bytes = slow_download
+    async_storage = AsyncS3Storage(storage, concurrency=3)
+    with metrics.StageMetrics("transform", emit=False) as stage:
+        payloads = async_storage.run(async_storage.read_objects(keys, lambda key, payload: payload.decode()))
+
+    assert payloads == keys
+    assert peak[0] == 3
+    # Worker threads report to the stage of the calling task
+    assert stage.record()["bytes_read"] == sum(len(key) for key in keys)
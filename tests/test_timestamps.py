@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from src.etl_pipeline.timestamps import normalize_timestamps
+
+EXPECTED = pd.Timestamp("2025-07-15T10:15:30Z")
+
+
+def test_each_format_takes_its_explicit_path():
+    values = pd.Series([
+        "2025-07-15T10:15:30Z",
+        "2025-07-15 12:15:30+02:00",
+        1752574530,
+        "1752574530",
+        1752574530000,
+        "Tue, 15 Jul 2025 10:15:30 GMT",
+        "15 Jul 2025 12:15:30 +0200",
+    ])
+    parsed, counts = normalize_timestamps(values)
+
+    assert str(parsed.dtype) == "datetime64[ns, UTC]"
+    assert (parsed == EXPECTED).all()
+    assert counts == {"native": 0, "iso": 2, "epoch_s": 2, "epoch_ms": 1, "rfc2822": 2,
+                      "fallback": 0, "invalid": 0, "missing": 0}
+
+
+def test_unrecognized_missing_and_invalid_values():
+    values = pd.Series(["July 15 2025 10:15:30", "garbage", None, np.nan, "2025-13-45T00:00:00Z"])
+    parsed, counts = normalize_timestamps(values)
+
+    assert parsed.iloc[0] == EXPECTED
+    assert parsed.iloc[1:].isna().all()
+    # The malformed ISO date fails its explicit format and then the fallback too
+    assert counts["fallback"] == 1
+    assert counts["invalid"] == 2
+    assert counts["missing"] == 2
+
+
+def test_numeric_column_and_native_datetimes():
+    parsed, counts = normalize_timestamps(pd.Series([1752574530.0, 1752574530000.0]))
+    assert (parsed == EXPECTED).all()
+    assert (counts["epoch_s"], counts["epoch_ms"]) == (1, 1)
+
+    parsed, counts = normalize_timestamps(pd.Series(pd.to_datetime(["2025-07-15 10:15:30"])))
+    assert parsed.iloc[0] == EXPECTED
+    assert counts["native"] == 1
@@ -1,5 +1,8 @@
+import json
+import boto3
 import pytest
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from unittest.mock import patch, MagicMock
 from src.etl_pipeline.tasks.transform_data import TransformData
@@ -74,8 +77,12 @@ def test_transform_success(mock_load_config, mock_generate_s3_key, mock_get_s3_c
     assert "device" in df.columns
     assert "location" in df.columns
     assert "timestamp" in df.columns
-    assert df["timestamp"].iloc[0] == "2025-07-15T10:15:30Z"
+    assert str(df["timestamp"].dtype) == "datetime64[ns, UTC]"
+    assert df["timestamp"].iloc[0] == pd.Timestamp("2025-07-15T10:15:30Z")
     assert df.shape[0] == 2 
+    assert transformer.timestamp_paths["iso"] == 2
+    assert transformer.timestamp_paths["fallback"] == 0
+    assert transformer.timestamp_paths["invalid"] == 0
 
     # Columns flattened from metadata exist
     assert "device" in df.columns
@@ -84,17 +91,19 @@ def test_transform_success(mock_load_config, mock_generate_s3_key, mock_get_s3_c
     # Final DataFrame contains only expected columns
     expected_cols = {"user_id", "action_type", "timestamp", "device", "location"}
     assert expected_cols.issubset(set(df.columns))
+    assert isinstance(df["action_type"].dtype, pd.CategoricalDtype)
+    assert df["user_id"].dtype == "string[pyarrow]"
     
     # Check individual row correctness
-    row_1 = df[df["user_id"] == 1].iloc[0]
+    row_1 = df[df["user_id"] == "1"].iloc[0]
     assert row_1["device"] == "mobile"
     assert row_1["location"] == "Berlin"
-    assert row_1["timestamp"] == "2025-07-15T10:15:30Z"
+    assert row_1["timestamp"] == pd.Timestamp("2025-07-15T10:15:30Z")
 
-    row_2 = df[df["user_id"] == 3].iloc[0]
+    row_2 = df[df["user_id"] == "3"].iloc[0]
     assert pd.isna(row_2["device"])
     assert pd.isna(row_2["location"])
-    assert row_2["timestamp"] == "2025-07-15T12:30:00Z"
+    assert row_2["timestamp"] == pd.Timestamp("2025-07-15T12:30:00Z")
 
 
 @patch("src.etl_pipeline.tasks.transform_data.get_s3_client")
@@ -120,3 +129,138 @@ def test_save_to_json(mock_load_config, mock_generate_s3_key, mock_get_s3_client
 
     # Ensure upload_fileobj was called
     assert mock_s3.upload_fileobj.call_count == 1
+
+
+@patch("src.etl_pipeline.tasks.transform_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.transform_data.generate_s3_key")
+@patch("src.etl_pipeline.tasks.transform_data.load_config")
+def test_transform_streaming_matches_batch(mock_load_config, mock_generate_s3_key, mock_get_s3_client, mock_config):
+    mock_load_config.return_value = mock_config
+    mock_generate_s3_key.side_effect = ["raw/key.json", "processed/key.json"]
+
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+    mock_s3.get_object.return_value = {"Body": BytesIO(RAW_JSON.encode("utf-8"))}
+
+    uploaded = {}
+    mock_s3.upload_fileobj.side_effect = lambda fileobj, bucket, key, **kwargs: uploaded.update(body=fileobj.read(), key=key)
+
+    transformer = TransformData()
+    # Tiny blocks and chunks force records to straddle reads and chunk boundaries
+    rows = transformer.transform_streaming(chunk_size=1, block_size=16)
+
+    assert rows == 2
+    assert uploaded["key"] == "processed/key.json"
+    df = pd.read_json(BytesIO(uploaded["body"]), convert_dates=False)
+    assert list(df["user_id"]) == [1, 3]
+    assert list(df["timestamp"]) == ["2025-07-15T10:15:30Z", "2025-07-15T12:30:00Z"]
+    assert df.loc[0, "device"] == "mobile"
+    assert pd.isna(df.loc[1, "location"])
+
+
+@patch.dict("os.environ", {"PROCESSED_FORMAT": "parquet"})
+@patch("src.etl_pipeline.tasks.transform_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.transform_data.load_config")
+def test_save_to_parquet_writes_typed_columns(mock_load_config, mock_get_s3_client, mock_config):
+    mock_load_config.return_value = mock_config
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+
+    uploaded = {}
+    mock_s3.upload_fileobj.side_effect = lambda fileobj, bucket, key, **kwargs: uploaded.update(body=fileobj.read(), key=key)
+
+    df = pd.DataFrame([
+        {"user_id": "user_1", "action_type": "click", "timestamp": "2025-07-15T10:15:30Z", "device": "mobile", "location": "Berlin"},
+        {"user_id": "user_2", "action_type": "click", "timestamp": "2025-07-15T11:00:00Z", "device": None, "location": "Berlin"},
+    ])
+
+    transformer = TransformData()
+    transformer.save_processed(df)
+
+    assert uploaded["key"].startswith("processed/parquet/")
+    assert uploaded["key"].endswith("processed_logs.parquet")
+
+    result = pd.read_parquet(BytesIO(uploaded["body"]))
+    assert str(result["timestamp"].dtype) == "datetime64[us, UTC]"
+    assert result["timestamp"].iloc[0] == pd.Timestamp("2025-07-15T10:15:30Z")
+    for col in ["action_type", "device", "location"]:
+        assert isinstance(result[col].dtype, pd.CategoricalDtype)
+    assert list(result["user_id"]) == ["user_1", "user_2"]
+    assert pd.isna(result["device"].iloc[1])
+
+
+@patch.dict("os.environ", {"PROCESSED_FORMAT": "parquet"})
+@patch("src.etl_pipeline.tasks.transform_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.transform_data.load_config")
+def test_transform_streaming_to_parquet(mock_load_config, mock_get_s3_client, mock_config):
+    mock_load_config.return_value = mock_config
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+    mock_s3.get_object.return_value = {"Body": BytesIO(RAW_JSON.encode("utf-8"))}
+
+    uploaded = {}
+    mock_s3.upload_fileobj.side_effect = lambda fileobj, bucket, key, **kwargs: uploaded.update(body=fileobj.read())
+
+    transformer = TransformData()
+    assert transformer.transform_streaming(chunk_size=2) == 2
+
+    result = pd.read_parquet(BytesIO(uploaded["body"]))
+    assert list(result["user_id"]) == ["1", "3"]
+    assert list(result["timestamp"]) == [pd.Timestamp("2025-07-15T10:15:30Z"), pd.Timestamp("2025-07-15T12:30:00Z")]
+
+
+@patch("src.etl_pipeline.tasks.transform_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.transform_data.generate_s3_key")
+@patch("src.etl_pipeline.tasks.transform_data.load_config")
+def test_transform_reads_every_raw_part(mock_load_config, mock_generate_s3_key, mock_get_s3_client, mock_config):
+    mock_load_config.return_value = mock_config
+    mock_generate_s3_key.side_effect = ["raw/key.json", "processed/key.json"]
+
+    mock_s3 = MagicMock()
+    mock_get_s3_client.return_value = mock_s3
+    bodies = {"raw/part-1.json": RAW_JSON, "raw/part-2.json": RAW_JSON.replace('"user_id": 1,', '"user_id": 4,')}
+    mock_s3.get_object.side_effect = lambda Bucket, Key, **kwargs: {"Body": BytesIO(bodies[Key].encode("utf-8"))}
+
+    transformer = TransformData(raw_keys=list(bodies))
+    df = transformer.transform()
+
+    assert sorted(df["user_id"]) == ["1", "3", "3", "4"]
+    assert df.index.is_unique
+
+
+@patch("src.etl_pipeline.tasks.transform_data.ProcessPoolExecutor",
+       lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+@patch("src.etl_pipeline.tasks.transform_data.get_s3_client")
+@patch("src.etl_pipeline.tasks.transform_data.load_config")
+def test_transform_parallel_matches_serial(mock_load_config, mock_get_s3_client, mock_config):
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        s3.create_bucket(Bucket="test-bucket")
+        raw_keys = []
+        for n, user_id in enumerate([1, 7, 9], start=1):
+            key = f"raw/json/part-{n}.json"
+            s3.put_object(Bucket="test-bucket", Key=key, Body=RAW_JSON.replace('"user_id": 1,', f'"user_id": {user_id},'))
+            raw_keys.append(key)
+        mock_load_config.return_value = mock_config
+        mock_get_s3_client.return_value = s3
+
+        serial_transformer = TransformData(raw_keys=raw_keys)
+        serial = serial_transformer.transform()
+        serial_paths = serial_transformer.timestamp_paths
+
+        transformer = TransformData(raw_keys=raw_keys)
+        results = transformer.transform_parallel(workers=3)
+
+        assert [r["raw_key"] for r in results] == raw_keys
+        assert all(r["rows"] == 2 and r["seconds"] >= 0 for r in results)
+
+        parts = [pd.read_json(BytesIO(s3.get_object(Bucket="test-bucket", Key=r["key"])["Body"].read()), convert_dates=False)
+                 for r in results]
+        combined = pd.concat(parts, ignore_index=True)
+
+        expected = serial.reset_index(drop=True)
+        assert list(combined["user_id"].astype(str)) == list(expected["user_id"])
+        assert list(combined["timestamp"]) == list(expected["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        assert transformer.timestamp_paths == serial_paths
+        assert combined["device"].equals(expected["device"].astype(object))
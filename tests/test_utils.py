@@ -0,0 +1,78 @@
+import json
+import pandas as pd
+import pyarrow as pa
+import pytest
+from datetime import date, datetime, timezone, timedelta
+from io import BytesIO
+
+from src.etl_pipeline.utils import (
+    iter_json_records, chunked, DataType, FileFormat, current_partition, generate_s3_key, generate_part_key,
+    generate_manifest_key, compact_dtypes, to_processed_arrow, USER_ID_DTYPE,
+)
+
+RECORDS = [{"user_id": f"user_{i}", "metadata": {"location": "München"}} for i in range(25)]
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_records_across_block_boundaries(block_size, indent):
+    body = BytesIO(json.dumps(RECORDS, indent=indent, ensure_ascii=False).encode("utf-8"))
+    assert list(iter_json_records(body, block_size)) == RECORDS
+
+
+@pytest.mark.parametrize("payload", [b'"user_id"', b'[{"user_id": 1}', b'[{"user_id": ', b'{"user_id": 1}\n{"user_'])
+def test_iter_json_records_rejects_malformed_input(payload):
+    with pytest.raises(ValueError):
+        list(iter_json_records(BytesIO(payload), 4))
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 1 << 20])
+def test_iter_json_records_reads_ndjson(block_size):
+    body = BytesIO(("\n".join(json.dumps(r, ensure_ascii=False) for r in RECORDS) + "\n").encode("utf-8"))
+    assert list(iter_json_records(body, block_size)) == RECORDS
+
+
+def test_chunked_yields_bounded_lists():
+    assert [len(c) for c in chunked(range(10), 4)] == [4, 4, 2]
+
+
+@pytest.mark.parametrize("logical_date", [
+    "2024-03-09",
+    "2024-03-09T00:00:00+00:00",
+    date(2024, 3, 9),
+    datetime(2024, 3, 9, 23, 30, tzinfo=timezone.utc),
+    datetime(2024, 3, 10, 1, 30, tzinfo=timezone(timedelta(hours=2))),
+])
+def test_keys_follow_the_logical_date(logical_date):
+    assert current_partition(logical_date) == "2024-03-09"
+    assert generate_s3_key(DataType.RAW, logical_date=logical_date) == "raw/json/2024/03/09/raw_logs.json"
+    assert generate_part_key(DataType.PROCESSED, 2, FileFormat.PARQUET, logical_date) == \
+        "processed/parquet/2024/03/09/processed_logs-00002.parquet"
+    assert generate_manifest_key(DataType.RAW, logical_date=logical_date) == "raw/json/2024/03/09/_manifest.json"
+
+
+def test_keys_default_to_today_utc():
+    today = datetime.now(timezone.utc).strftime("%Y/%m/%d")
+    assert generate_s3_key(DataType.RAW) == f"raw/json/{today}/raw_logs.json"
+
+
+def test_compact_dtypes_survive_the_parquet_round_trip():
+    df = pd.DataFrame({
+        "user_id": [1.0, 2.0, None],
+        "action_type": ["click", "click", "view"],
+        "timestamp": pd.to_datetime(["2025-07-15T10:00:00Z"] * 3, utc=True),
+        "device": ["mobile", None, "mobile"],
+        "location": [None, None, None],
+    })
+    compact = compact_dtypes(df)
+
+    assert compact["user_id"].dtype == USER_ID_DTYPE
+    assert list(compact["user_id"][:2]) == ["1", "2"] and pd.isna(compact["user_id"][2])
+    assert all(isinstance(compact[c].dtype, pd.CategoricalDtype) for c in ("action_type", "device", "location"))
+    assert compact_dtypes(compact) is compact
+
+    table = to_processed_arrow(compact)
+    assert pa.types.is_dictionary(table.schema.field("device").type)
+    restored = compact_dtypes(table.to_pandas())
+    assert restored["device"].tolist()[0] == "mobile" and pd.isna(restored["device"][1])
+    assert restored["action_type"].equals(compact["action_type"])
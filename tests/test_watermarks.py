@@ -0,0 +1,37 @@
+import os
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "test_db")
+
+from src.database.models.etl_watermark import EtlWatermark
+from src.database.watermarks import WatermarkStore
+
+
+@pytest.fixture
+def store():
+    engine = create_engine("sqlite://")
+    EtlWatermark.__table__.create(engine)
+    return WatermarkStore(sessionmaker(bind=engine))
+
+
+def test_get_returns_empty_dict_for_unknown_stage(store):
+    assert store.get("load", "2025-07-15") == {}
+
+
+def test_advance_moves_objects_forward_and_keeps_max_timestamp(store):
+    early = datetime(2025, 7, 15, 10, 0, tzinfo=timezone.utc)
+    late = datetime(2025, 7, 15, 12, 0, tzinfo=timezone.utc)
+
+    store.advance("load", "2025-07-15", last_object="processed_logs-00001.json", max_timestamp=late)
+    store.advance("load", "2025-07-15", last_object="processed_logs-00002.json", max_timestamp=early)
+
+    watermark = store.get("load", "2025-07-15")
+    assert watermark["last_object"] == "processed_logs-00002.json"
+    assert watermark["max_timestamp"].replace(tzinfo=timezone.utc) == late
+    assert store.get("load", "2025-07-16") == {}